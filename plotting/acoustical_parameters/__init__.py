@@ -1,11 +1,21 @@
 """Acoustical parameters"""
-from typing import Optional, Union
+from functools import cached_property
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Union
 
 import numpy as np
+import pandas as pd
 from scipy.signal import find_peaks
 
+from plotting.acoustical_parameters.catalog import (
+    measurement_pattern,
+    parse_recording_name,
+)
+from plotting.acoustical_parameters.filterbank import filter_bands, third_octave_bands
+from plotting.tracing import span, traced
 from plotting.utils import convert_ambisonics_a_to_b
 from plotting.utils import read_aformat
+from plotting.utils import read_from_onset
 
 
 def seconds_to_samples(seconds: float, sample_rate: int) -> int:
@@ -47,29 +57,169 @@ def ms_to_samples(ms: float, sample_rate) -> int:
     return round(ms * sample_rate / 1000)
 
 
-def lateral_fraction_early(bformat_rir: np.ndarray, sample_rate: int) -> float:
-    """Compute the LF_early parameter.
+def onset_indices(direct_sound_arrivals) -> np.ndarray:
+    """Turn direct sound arrivals into sample indices, rounding sub-sample ones.
+
+    Args:
+        direct_sound_arrivals (int | float | Sequence): arrivals in samples, e.g. an
+            output of `get_direct_sound_arrival` with `subsample=True`.
+
+    Returns:
+        np.ndarray: the arrivals rounded to the nearest sample, as integers.
+    """
+    return np.rint(np.asarray(direct_sound_arrivals)).astype(int)
+
+
+class RIRAnalysis:
+    """A RIR together with the intermediate results every parameter needs.
+
+    The direct sound arrival and the cumulative energy of each channel are computed
+    once, the first time a parameter asks for them, so any number of parameters cost a
+    single peak search and a single squaring of every channel they integrate.
 
     Args:
-        bformat_rir (np.ndarray): a B-Format Ambisonics RIR, an array of shape (4, n)
-            channels must be ordered as {W, X, Y, Z}.
+        rir (np.ndarray): an omnidirectional RIR of shape (n,) or a multichannel RIR of
+            shape (channels, n). The onset is searched on the first channel, so B-Format
+            RIRs must be ordered as {W, X, Y, Z}.
         sample_rate (int): the sampling rate of the recording.
+        onset_method (str): how the direct sound arrival is found, see the `method`
+            argument of `get_direct_sound_arrival`.
+        direct_sound_arrival (int, optional): the onset index, when it is already
+            known (e.g. the RIR was read from its onset on with `read_rir_from_onset`).
+            A sub-sample onset is rounded to the nearest sample.
+        file_onset (int): where `rir` starts in the recording it was read from, which
+            `read_rir_from_onset` sets to the onset it cut the recording at.
+    """
+
+    def __init__(
+        self,
+        rir: np.ndarray,
+        sample_rate: int,
+        onset_method: str = "iso3382",
+        direct_sound_arrival: Optional[int] = None,
+        file_onset: int = 0,
+    ):
+        self.rir = np.atleast_2d(rir)
+        self.sample_rate = sample_rate
+        self.onset_method = onset_method
+        self.file_onset = file_onset
+        if direct_sound_arrival is not None:
+            self.__dict__["direct_sound_arrival"] = onset_indices(
+                direct_sound_arrival
+            ).item()
+
+    @cached_property
+    def direct_sound_arrival(self) -> int:
+        """The sample where the direct sound arrives, searched on the first channel."""
+        return get_direct_sound_arrival(
+            self.rir[0, :], self.sample_rate, method=self.onset_method
+        )
+
+    @cached_property
+    def squared(self) -> np.ndarray:
+        """The squared RIR, of shape (channels, n)."""
+        return np.square(self.rir)
+
+    @cached_property
+    def energy(self) -> np.ndarray:
+        """The cumulative energy of every channel, of shape (channels, n + 1)."""
+        with span("cumulative_energy", samples=self.rir.size):
+            energy = np.zeros((self.rir.shape[0], self.rir.shape[1] + 1))
+            np.cumsum(self.squared, axis=-1, dtype=np.float64, out=energy[:, 1:])
+        return energy
+
+    def channel_energy(self, channel: int) -> np.ndarray:
+        """The cumulative energy of one channel, of shape (n + 1,).
+
+        Only the channels a parameter integrates are squared and summed, so LF and DR
+        of a B-Format RIR keep two energy arrays in memory instead of four. The channel
+        is squared in float64 straight into its energy array and summed there in place,
+        so no temporary is allocated whatever the dtype of the RIR, and float32 samples
+        give the same energies as the same values in float64.
+        """
+        if "energy" in self.__dict__:
+            return self.energy[channel]
+        channel_energies = self.__dict__.setdefault("_channel_energies", {})
+        if channel not in channel_energies:
+            with span("cumulative_energy", samples=self.rir.shape[1]):
+                energy = np.zeros(self.rir.shape[1] + 1)
+                np.square(self.rir[channel], out=energy[1:], dtype=np.float64)
+                np.cumsum(energy[1:], out=energy[1:])
+            channel_energies[channel] = energy
+        return channel_energies[channel]
+
+    def integrate(
+        self, channel: int, start: int = 0, stop: Optional[int] = None
+    ) -> float:
+        """Integrate the energy of a channel between two samples counted from the onset.
+
+        Args:
+            channel (int): which channel to integrate.
+            start (int): the first sample after the direct sound arrival.
+            stop (int, optional): one past the last sample after the direct sound
+                arrival. Integrates to the end of the RIR when omitted.
+
+        Returns:
+            float: the energy in the window, clipped to the RIR like a slice would be.
+        """
+        last = self.rir.shape[1]
+        onset = self.direct_sound_arrival
+        start = min(onset + start, last)
+        stop = last if stop is None else min(max(onset + stop, start), last)
+        energy = self.channel_energy(channel)
+        return energy[stop] - energy[start]
+
+
+def as_rir_analysis(
+    rir: Union[np.ndarray, RIRAnalysis], sample_rate: Optional[int] = None
+) -> RIRAnalysis:
+    """Wrap a RIR in a `RIRAnalysis`, unless it already is one.
+
+    Args:
+        rir (np.ndarray | RIRAnalysis): the RIR, as described in `RIRAnalysis`.
+        sample_rate (int, optional): the sampling rate of the recording. Required
+            unless `rir` is already a `RIRAnalysis`.
+
+    Returns:
+        RIRAnalysis: the analysis for `rir`.
+    """
+    if isinstance(rir, RIRAnalysis):
+        return rir
+    if sample_rate is None:
+        raise ValueError("A sample rate is required to analyse a raw RIR")
+    return RIRAnalysis(rir, sample_rate)
+
+
+@traced()
+def lateral_fraction_early(
+    bformat_rir: Union[np.ndarray, RIRAnalysis],
+    sample_rate: Optional[int] = None,
+    lateral_channel: int = 2,
+) -> float:
+    """Compute the LF_early parameter.
+
+    Args:
+        bformat_rir (np.ndarray | RIRAnalysis): a B-Format Ambisonics RIR, an array of
+            shape (4, n) or its `RIRAnalysis`; channels must be ordered as {W, X, Y, Z}.
+        sample_rate (int, optional): the sampling rate of the recording. Not needed
+            when `bformat_rir` is a `RIRAnalysis`.
+        lateral_channel (int): which channel holds Y. Convert ACN-ordered Ambisonics,
+            such as `encode_ambisonics` output, with `utils.ambisonics_to_bformat`
+            rather than pointing this at its Y channel, which is scaled differently.
 
     Returns:
         float: the LF_early result in dB.
     """
+    analysis = as_rir_analysis(bformat_rir, sample_rate)
 
     # Integration limits
-    rir = bformat_rir[
-        :, get_direct_sound_arrival(bformat_rir[0, :], sample_rate) :
-    ].copy()
-    samples_5ms = ms_to_samples(5, sample_rate)
-    samples_80ms = ms_to_samples(80, sample_rate)
+    samples_5ms = ms_to_samples(5, analysis.sample_rate)
+    samples_80ms = ms_to_samples(80, analysis.sample_rate)
 
     # Integrate channel Y (lateral) between 5 and 80 ms
-    lateral_portion = np.power(rir[2, samples_5ms:samples_80ms], 2).sum().squeeze()
+    lateral_portion = analysis.integrate(lateral_channel, samples_5ms, samples_80ms)
     # Integrate channel W (omni) between 0 and 80 ms
-    omni_portion = np.power(rir[0, 0:samples_80ms], 2).sum().squeeze()
+    omni_portion = analysis.integrate(0, 0, samples_80ms)
     if np.isclose(omni_portion, 0.0, 1e-7):
         raise ValueError("Omni portion {} is too close to 0.0".format(omni_portion))
 
@@ -80,28 +230,35 @@ def lateral_fraction_early(bformat_rir: np.ndarray, sample_rate: int) -> float:
     return ratio
 
 
-def lateral_fraction_late(bformat_rir: np.ndarray, sample_rate: int) -> float:
+@traced()
+def lateral_fraction_late(
+    bformat_rir: Union[np.ndarray, RIRAnalysis],
+    sample_rate: Optional[int] = None,
+    lateral_channel: int = 2,
+) -> float:
     """Compute the LF_late parameter.
 
     Args:
-        bformat_rir (np.ndarray): a B-Format Ambisonics RIR, an array of shape (4, n)
-            channels must be ordered as {W, X, Y, Z}.
-        sample_rate (int): the sampling rate of the recording.
+        bformat_rir (np.ndarray | RIRAnalysis): a B-Format Ambisonics RIR, an array of
+            shape (4, n) or its `RIRAnalysis`; channels must be ordered as {W, X, Y, Z}.
+        sample_rate (int, optional): the sampling rate of the recording. Not needed
+            when `bformat_rir` is a `RIRAnalysis`.
+        lateral_channel (int): which channel holds Y. Convert ACN-ordered Ambisonics,
+            such as `encode_ambisonics` output, with `utils.ambisonics_to_bformat`
+            rather than pointing this at its Y channel, which is scaled differently.
 
     Returns:
         float: the LF_late result in dB.
     """
+    analysis = as_rir_analysis(bformat_rir, sample_rate)
 
     # Integration limits
-    rir = bformat_rir.copy()[
-        :, get_direct_sound_arrival(bformat_rir[0, :], sample_rate) :
-    ]
-    samples_80ms = ms_to_samples(80, sample_rate)
+    samples_80ms = ms_to_samples(80, analysis.sample_rate)
 
     # Integrate channel Y (lateral) from 80 ms on
-    lateral_portion = np.power(rir[2, samples_80ms:], 2).sum()
+    lateral_portion = analysis.integrate(lateral_channel, samples_80ms)
     # Integrate channel W (omni) from 0 ms on
-    omni_portion = np.power(rir[0, :], 2).sum()
+    omni_portion = analysis.integrate(0)
     if np.isclose(omni_portion, 0.0, 1e-7):
         raise ValueError("Omni portion {} is too close to 0.0".format(omni_portion))
 
@@ -112,38 +269,38 @@ def lateral_fraction_late(bformat_rir: np.ndarray, sample_rate: int) -> float:
     return ratio
 
 
+@traced()
 def direct_reverberant_ratio(
-    omni_rir: np.ndarray,
-    sample_rate: int,
+    omni_rir: Union[np.ndarray, RIRAnalysis],
+    sample_rate: Optional[int] = None,
     limit_integration_to_seconds: Optional[float] = 2,
 ) -> float:
     """Compute the DR parameter (direct-to-reverberant ratio).
 
     Args:
-        omni_rir (np.ndarray): an omnidirectional RIR, an array of shape (n,).
-        sample_rate (int): the sampling rate of the recording.
+        omni_rir (np.ndarray | RIRAnalysis): an omnidirectional RIR, an array of shape
+            (n,), or a `RIRAnalysis` whose first channel is omnidirectional.
+        sample_rate (int, optional): the sampling rate of the recording. Not needed
+            when `omni_rir` is a `RIRAnalysis`.
 
     Returns:
         float: the DR result in dB.
     """
+    analysis = as_rir_analysis(omni_rir, sample_rate)
 
     # Integration limits
-    signal = omni_rir.copy()[
-        get_direct_sound_arrival(omni_rir, sample_rate) :
-    ]  # Trim to direct sound
-    samples_2ms = ms_to_samples(2, sample_rate)
+    samples_2ms = ms_to_samples(2, analysis.sample_rate)
 
     # Direct sound: integrate between 0 and 2 ms
-    direct_portion = np.power(signal[:samples_2ms], 2).sum()
+    direct_portion = analysis.integrate(0, 0, samples_2ms)
     # Reverberant sound: integrate from 2 ms on
-    reverberant_portion = np.power(
-        signal[samples_2ms:]
+    reverberant_portion = analysis.integrate(
+        0,
+        samples_2ms,
+        None
         if limit_integration_to_seconds is None
-        else signal[
-            samples_2ms : seconds_to_samples(limit_integration_to_seconds, sample_rate)
-        ],
-        2,
-    ).sum()
+        else seconds_to_samples(limit_integration_to_seconds, analysis.sample_rate),
+    )
 
     if np.isclose(reverberant_portion, 0.0, 1e-7):
         raise ValueError(
@@ -159,17 +316,756 @@ def direct_reverberant_ratio(
     return 10 * np.log10(ratio)
 
 
+def stack_rirs(rirs: Union[np.ndarray, List[np.ndarray]]) -> np.ndarray:
+    """Stack several RIRs along a new first axis, zero-padding the ragged ones.
+
+    Zero-padding does not change any energy integral, so the stacked array yields the
+    same parameters as each RIR on its own.
+
+    Args:
+        rirs (np.ndarray | List[np.ndarray]): an array of shape (N, ..., n) or a list
+            of N arrays of shape (..., n_i) whose leading dimensions match.
+
+    Returns:
+        np.ndarray: an array of shape (N, ..., max(n_i)).
+    """
+    if isinstance(rirs, np.ndarray):
+        return rirs
+    longest = max(rir.shape[-1] for rir in rirs)
+    stacked = np.zeros((len(rirs),) + rirs[0].shape[:-1] + (longest,))
+    for i, rir in enumerate(rirs):
+        stacked[i, ..., : rir.shape[-1]] = rir
+    return stacked
+
+
+def cumulative_energy(rirs: np.ndarray) -> np.ndarray:
+    """Compute the running energy of one or more RIRs along their last axis.
+
+    The result has one more sample than the input and starts at 0, so the energy
+    between samples `start` and `stop` is `energy[..., stop] - energy[..., start]`.
+
+    Args:
+        rirs (np.ndarray): an array of shape (..., n).
+
+    Returns:
+        np.ndarray: an array of shape (..., n + 1).
+    """
+    energy = np.zeros(rirs.shape[:-1] + (rirs.shape[-1] + 1,))
+    np.cumsum(np.square(rirs), axis=-1, out=energy[..., 1:])
+    return energy
+
+
+def window_energy(
+    energy: np.ndarray,
+    start: Union[int, np.ndarray],
+    stop: Union[int, np.ndarray],
+) -> np.ndarray:
+    """Look up the energy between `start` and `stop` in a cumulative-energy array.
+
+    Limits are clipped to the signal length like a slice would be, and a window whose
+    `stop` falls before its `start` integrates to 0.
+
+    Args:
+        energy (np.ndarray): an output of `cumulative_energy`, of shape (N, n + 1).
+        start (int | np.ndarray): the first sample of each window, of shape (N,).
+        stop (int | np.ndarray): one past the last sample of each window, of shape (N,).
+
+    Returns:
+        np.ndarray: the energy of each window, of shape (N,).
+    """
+    last = energy.shape[-1] - 1
+    start = np.clip(np.broadcast_to(start, energy.shape[:1]), 0, last)
+    stop = np.clip(np.broadcast_to(stop, energy.shape[:1]), start, last)
+    rows = np.arange(energy.shape[0])
+    return energy[rows, stop] - energy[rows, start]
+
+
+def lateral_fraction_and_dr_batch(
+    bformat_rirs: Union[np.ndarray, List[np.ndarray]],
+    sample_rate: int,
+    direct_sound_arrivals: Optional[Sequence[int]] = None,
+    limit_integration_to_seconds: Optional[float] = 2,
+    lateral_channel: int = 2,
+) -> Dict[str, np.ndarray]:
+    """Compute LF_early, LF_late and DR for many B-Format RIRs at once.
+
+    Every parameter is looked up in a single cumulative-energy array of the W and Y
+    channels, so the results match `lateral_fraction_early`, `lateral_fraction_late`
+    and `direct_reverberant_ratio` up to floating-point rounding.
+
+    Args:
+        bformat_rirs (np.ndarray | List[np.ndarray]): an array of shape (N, 4, n) or a
+            list of N arrays of shape (4, n_i); channels must be ordered as {W, X, Y, Z}.
+        sample_rate (int): the sampling rate of the recordings.
+        direct_sound_arrivals (Sequence[int], optional): the onset index of each RIR.
+            Detected on the W channel with the ISO 3382-1 method of
+            `get_direct_sound_arrival` when omitted.
+        limit_integration_to_seconds (float, optional): where the reverberant part of
+            DR stops, counted from the direct sound. `None` integrates to the end.
+        lateral_channel (int): which channel holds Y, see `lateral_fraction_early`.
+
+    Returns:
+        Dict[str, np.ndarray]: arrays of shape (N,) under the keys "lf_early",
+            "lf_late" and "dr_ratio".
+    """
+    bformat_rirs = stack_rirs(bformat_rirs)
+    if direct_sound_arrivals is None:
+        direct_sound_arrivals = get_direct_sound_arrival(
+            bformat_rirs[:, 0, :], sample_rate
+        )
+    onsets = onset_indices(direct_sound_arrivals)
+    samples_2ms = ms_to_samples(2, sample_rate)
+    samples_5ms = ms_to_samples(5, sample_rate)
+    samples_80ms = ms_to_samples(80, sample_rate)
+    end = bformat_rirs.shape[-1]
+    reverberant_end = (
+        end
+        if limit_integration_to_seconds is None
+        else onsets + seconds_to_samples(limit_integration_to_seconds, sample_rate)
+    )
+
+    omni_energy = cumulative_energy(bformat_rirs[:, 0, :])
+    lateral_energy = cumulative_energy(bformat_rirs[:, lateral_channel, :])
+
+    omni_early = window_energy(omni_energy, onsets, onsets + samples_80ms)
+    omni_total = window_energy(omni_energy, onsets, end)
+    _raise_if_close_to_zero(omni_early, "Omni portion")
+    _raise_if_close_to_zero(omni_total, "Omni portion")
+    lf_early = (
+        window_energy(lateral_energy, onsets + samples_5ms, onsets + samples_80ms)
+        / omni_early
+    )
+    lf_late = window_energy(lateral_energy, onsets + samples_80ms, end) / omni_total
+
+    direct_portion = window_energy(omni_energy, onsets, onsets + samples_2ms)
+    reverberant_portion = window_energy(
+        omni_energy, onsets + samples_2ms, reverberant_end
+    )
+    _raise_if_close_to_zero(reverberant_portion, "Reverberant portion")
+    ratio = direct_portion / reverberant_portion
+    dr_ratio = np.full(ratio.shape, -np.inf)
+    audible = ~np.isclose(ratio, 0.0, 1e-7)
+    dr_ratio[audible] = 10 * np.log10(ratio[audible])
+
+    return {"lf_early": lf_early, "lf_late": lf_late, "dr_ratio": dr_ratio}
+
+
+def _raise_if_close_to_zero(portions: np.ndarray, name: str) -> None:
+    close_to_zero = np.isclose(portions, 0.0, 1e-7)
+    if close_to_zero.any():
+        raise ValueError(
+            "{} is too close to 0.0 for RIRs {}".format(
+                name, np.flatnonzero(close_to_zero).tolist()
+            )
+        )
+
+
+# Window boundary -> the value LF_early, LF_late and DR use, in ms; all but the
+# pre-roll are counted from the onset
+lf_dr_window_boundaries = {
+    "pre_roll_ms": 1,
+    "lf_early_start_ms": 5,
+    "lf_early_stop_ms": 80,
+    "lf_late_start_ms": 80,
+    "dr_direct_stop_ms": 2,
+    "dr_reverberant_stop_ms": 2000,
+}
+
+
+def sweep_lf_and_dr(
+    bformat_rirs: Union[np.ndarray, List[np.ndarray]],
+    sample_rate: int,
+    grid: Mapping[str, Union[float, Sequence[float]]],
+    threshold_crossings: Optional[Sequence[int]] = None,
+    lateral_channel: Optional[int] = 2,
+) -> Dict[str, np.ndarray]:
+    """Compute LF_early, LF_late and DR of many RIRs for every combination of windows.
+
+    Every boundary of `lf_dr_window_boundaries` may take a list of values; the results
+    cover their Cartesian product. The W and Y channels are squared and summed once,
+    and every window is then two lookups in those cumulative-energy arrays, so a sweep
+    of thousands of windows costs little more than a single evaluation. Each parameter
+    is only evaluated over the boundaries it depends on and broadcast over the rest.
+
+    With the values of `lf_dr_window_boundaries`, the results match
+    `lateral_fraction_and_dr_batch`. Windows whose denominator integrates to (nearly)
+    0, e.g. empty ones, give NaN instead of raising.
+
+    Args:
+        bformat_rirs (np.ndarray | List[np.ndarray]): an array of shape (N, 4, n) or a
+            list of N arrays of shape (4, n_i); channels must be ordered as {W, X, Y, Z}.
+            Omnidirectional RIRs of shape (N, 1, n) are enough when `lateral_channel`
+            is None.
+        sample_rate (int): the sampling rate of the recordings.
+        grid (Mapping[str, float | Sequence[float]]): values of the boundaries to
+            sweep, by their name in `lf_dr_window_boundaries`; the others keep their
+            value there. `np.inf` as "dr_reverberant_stop_ms" integrates to the end.
+        threshold_crossings (Sequence[int], optional): where each RIR first comes
+            within 20 dB of its maximum, i.e. its onset before the pre-roll. Detected
+            on the W channel with `detect_onset_iso3382` when omitted.
+        lateral_channel (int, optional): which channel holds Y, see
+            `lateral_fraction_early`; None only computes DR.
+
+    Returns:
+        Dict[str, np.ndarray]: "lf_early", "lf_late" (unless `lateral_channel` is None)
+            and "dr_ratio", each of shape (N, B_1, ..., B_6) with one axis per boundary
+            in the order of `lf_dr_window_boundaries`, of length 1 for those not swept.
+    """
+    unknown = set(grid) - set(lf_dr_window_boundaries)
+    if unknown:
+        raise ValueError("Unknown window boundaries {}".format(sorted(unknown)))
+    bformat_rirs = stack_rirs(bformat_rirs)
+    if threshold_crossings is None:
+        threshold_crossings = detect_onset_iso3382(
+            bformat_rirs[:, 0, :], sample_rate, pre_roll_ms=0
+        )
+    crossings = np.asarray(threshold_crossings, dtype=int)
+    count = bformat_rirs.shape[0]
+    end = bformat_rirs.shape[-1]
+
+    # One broadcastable axis per boundary, after the RIR axis
+    boundaries = {}
+    for axis, (name, default) in enumerate(lf_dr_window_boundaries.items(), start=1):
+        values = np.atleast_1d(np.asarray(grid.get(name, default), dtype=float))
+        shape = [1] * (len(lf_dr_window_boundaries) + 1)
+        shape[axis] = values.size
+        milliseconds = values.reshape(shape)
+        finite = np.isfinite(milliseconds)
+        samples = np.where(
+            finite,
+            np.round(np.where(finite, milliseconds, 0) * sample_rate / 1000),
+            end,
+        ).astype(int)
+        boundaries[name] = samples
+    crossings = crossings.reshape((count,) + (1,) * len(lf_dr_window_boundaries))
+    onsets = np.maximum(crossings - boundaries["pre_roll_ms"], 0)
+    rows = np.arange(count).reshape(crossings.shape)
+
+    def energy_between(energy: np.ndarray, start, stop) -> np.ndarray:
+        # Like window_energy, with windows broadcast over any number of axes
+        start = np.clip(start, 0, end)
+        stop = np.clip(stop, start, end)
+        return energy[rows, stop] - energy[rows, start]
+
+    def ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(
+                np.isclose(denominator, 0.0, 1e-7), np.nan, numerator / denominator
+            )
+
+    full_shape = (count,) + tuple(samples.size for samples in boundaries.values())
+    results = {}
+    omni_energy = cumulative_energy(bformat_rirs[:, 0, :])
+    if lateral_channel is not None:
+        lateral_energy = cumulative_energy(bformat_rirs[:, lateral_channel, :])
+        early_stop = onsets + boundaries["lf_early_stop_ms"]
+        results["lf_early"] = ratio(
+            energy_between(
+                lateral_energy, onsets + boundaries["lf_early_start_ms"], early_stop
+            ),
+            energy_between(omni_energy, onsets, early_stop),
+        )
+        results["lf_late"] = ratio(
+            energy_between(
+                lateral_energy, onsets + boundaries["lf_late_start_ms"], end
+            ),
+            energy_between(omni_energy, onsets, end),
+        )
+
+    direct_stop = onsets + boundaries["dr_direct_stop_ms"]
+    dr_ratio = ratio(
+        energy_between(omni_energy, onsets, direct_stop),
+        energy_between(
+            omni_energy,
+            direct_stop,
+            np.minimum(onsets + boundaries["dr_reverberant_stop_ms"], end),
+        ),
+    )
+    audible = ~np.isclose(dr_ratio, 0.0, 1e-7)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        results["dr_ratio"] = np.where(
+            audible, 10 * np.log10(np.where(audible, dr_ratio, 1)), -np.inf
+        )
+    return {
+        name: np.broadcast_to(values, full_shape).copy()
+        for name, values in results.items()
+    }
+
+
+def sweep_to_dataframe(
+    sweep: Dict[str, np.ndarray], grid: Mapping[str, Union[float, Sequence[float]]]
+) -> pd.DataFrame:
+    """Lay the output of `sweep_lf_and_dr` out as one row per RIR and window set.
+
+    Args:
+        sweep (Dict[str, np.ndarray]): an output of `sweep_lf_and_dr`.
+        grid (Mapping[str, float | Sequence[float]]): the grid it was computed for.
+
+    Returns:
+        pd.DataFrame: the index of the RIR under "rir", the value of every boundary
+            of `lf_dr_window_boundaries` and one column per parameter.
+    """
+    axes = [np.arange(next(iter(sweep.values())).shape[0])] + [
+        np.atleast_1d(grid.get(name, default))
+        for name, default in lf_dr_window_boundaries.items()
+    ]
+    columns = np.meshgrid(*axes, indexing="ij")
+    return pd.DataFrame(
+        {
+            "rir": columns[0].ravel(),
+            **{
+                name: column.ravel()
+                for name, column in zip(lf_dr_window_boundaries, columns[1:])
+            },
+            **{name: values.ravel() for name, values in sweep.items()},
+        }
+    )
+
+
+# Stage parameter name -> reflected window in ms after the direct sound
+stage_parameter_windows = {
+    "St1": (20, 100),
+    "St2": (20, 200),
+    "St_late": (100, 1000),
+}
+# Direct window every stage parameter is referred to, in ms after the direct sound
+stage_direct_window = (0, 10)
+
+
+def stage_parameters(
+    omni_rirs: Union[np.ndarray, List[np.ndarray]],
+    sample_rate: int,
+    bands: Sequence[int] = third_octave_bands,
+    fraction: int = 3,
+    direct_sound_arrivals: Optional[Sequence[int]] = None,
+    parameters: Sequence[str] = tuple(stage_parameter_windows),
+) -> Dict[str, np.ndarray]:
+    """Compute the stage parameters of every band of many RIRs at once.
+
+    Each parameter is the ratio, in dB, between the energy in its reflected window (see
+    `stage_parameter_windows`) and the energy in the first 10 ms after the direct
+    sound. All windows are looked up in a single cumulative-energy array per band.
+
+    Args:
+        omni_rirs (np.ndarray | List[np.ndarray]): omnidirectional RIRs, an array of
+            shape (N, n) or a list of N arrays of shape (n_i,).
+        sample_rate (int): the sampling rate of the recordings.
+        bands (Sequence[int]): the nominal centre frequency of each band.
+        fraction (int): 1 for octave bands, 3 for third-octave bands.
+        direct_sound_arrivals (Sequence[int], optional): the onset index of each RIR.
+            Detected on the broadband RIRs with `get_direct_sound_arrival` when
+            omitted.
+        parameters (Sequence[str]): which of `stage_parameter_windows` to compute.
+
+    Returns:
+        Dict[str, np.ndarray]: arrays of shape (N, bands) under each name in
+            `parameters`.
+    """
+    omni_rirs = stack_rirs(omni_rirs)
+    if direct_sound_arrivals is None:
+        direct_sound_arrivals = get_direct_sound_arrival(omni_rirs, sample_rate)
+    onsets = np.repeat(onset_indices(direct_sound_arrivals), len(bands))
+
+    band_rirs = filter_bands(omni_rirs, sample_rate, bands, fraction)
+    energy = cumulative_energy(band_rirs.reshape(-1, band_rirs.shape[-1]))
+    del band_rirs
+
+    def energy_between(start_ms: float, stop_ms: float) -> np.ndarray:
+        return window_energy(
+            energy,
+            onsets + ms_to_samples(start_ms, sample_rate),
+            onsets + ms_to_samples(stop_ms, sample_rate),
+        )
+
+    direct_portion = energy_between(*stage_direct_window)
+    results = {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for name in parameters:
+            reflected_portion = energy_between(*stage_parameter_windows[name])
+            results[name] = (10 * np.log10(reflected_portion / direct_portion)).reshape(
+                omni_rirs.shape[0], len(bands)
+            )
+    return results
+
+
+def st1(
+    omni_rirs: Union[np.ndarray, List[np.ndarray]], sample_rate: int, **kwargs
+) -> np.ndarray:
+    """Compute St1 (20-100 ms over 0-10 ms), see `stage_parameters`."""
+    parameters = stage_parameters(omni_rirs, sample_rate, parameters=("St1",), **kwargs)
+    return parameters["St1"]
+
+
+def st2(
+    omni_rirs: Union[np.ndarray, List[np.ndarray]], sample_rate: int, **kwargs
+) -> np.ndarray:
+    """Compute St2 (20-200 ms over 0-10 ms), see `stage_parameters`."""
+    parameters = stage_parameters(omni_rirs, sample_rate, parameters=("St2",), **kwargs)
+    return parameters["St2"]
+
+
+def st_late(
+    omni_rirs: Union[np.ndarray, List[np.ndarray]], sample_rate: int, **kwargs
+) -> np.ndarray:
+    """Compute St_late (100-1000 ms over 0-10 ms), see `stage_parameters`."""
+    parameters = stage_parameters(
+        omni_rirs, sample_rate, parameters=("St_late",), **kwargs
+    )
+    return parameters["St_late"]
+
+
+def stage_parameters_to_sheet(
+    parameters: Dict[str, np.ndarray],
+    bands: Sequence[int],
+    measurements: pd.DataFrame,
+) -> pd.DataFrame:
+    """Lay the per-band stage parameters out like the "ST param" sheet of data.xlsx.
+
+    Args:
+        parameters (Dict[str, np.ndarray]): an output of `stage_parameters`.
+        bands (Sequence[int]): the centre frequency of each band, used as column name.
+        measurements (pd.DataFrame): N rows describing each RIR, e.g. with the
+            "Medición", "Posición", "Dist a fuente" and "Integration time" columns,
+            as `stage_parameters_sheet` fills them.
+
+    Returns:
+        pd.DataFrame: one row per RIR and parameter, with the `measurements` columns,
+            the parameter name under "Frq.band [Hz]", one column per band and the band
+            average.
+    """
+    rows = []
+    for name, values in parameters.items():
+        band_columns = pd.DataFrame(
+            values, columns=list(bands), index=measurements.index
+        )
+        band_columns["Promedios"] = band_columns.mean(axis=1)
+        rows.append(
+            pd.concat(
+                [measurements.assign(**{"Frq.band [Hz]": name}), band_columns], axis=1
+            )
+        )
+    return pd.concat(rows, ignore_index=True)
+
+
+def read_recording_groups(
+    file_paths: Sequence[Union[str, Path]],
+    seconds_after_onset: Optional[float] = None,
+    integration_time_column: str = "Integration time",
+) -> Dict[tuple, Tuple[List[RIRAnalysis], pd.DataFrame]]:
+    """Read many omnidirectional recordings from their onsets, grouped by variant.
+
+    Recordings of each integration-time variant (the 10/100/350 ms in
+    "..._Subj_10ms.wav") and sampling rate are grouped, so that each group can be
+    computed in a single call.
+
+    Args:
+        file_paths (Sequence[str | Path]): the recordings, named as in the campaign
+            (see `catalog.parse_recording_name`).
+        seconds_after_onset (float, optional): see `read_rir_from_onset`.
+        integration_time_column (str): the name of the integration time column.
+
+    Returns:
+        Dict[tuple, Tuple[List[RIRAnalysis], pd.DataFrame]]: the analyses of each
+            (integration time, sample rate) group, 0 standing for recordings without
+            one, and a row per analysis with the measurement under "Medición", the
+            position under "Posición" and the variant under `integration_time_column`.
+    """
+    groups: Dict[tuple, List[RIRAnalysis]] = {}
+    measurements: Dict[tuple, List[dict]] = {}
+    for file_path in map(Path, file_paths):
+        parsed = parse_recording_name(file_path.name)
+        analysis = read_rir_from_onset(file_path, seconds_after_onset)
+        match = measurement_pattern.match(file_path.parent.name)
+        key = (parsed["integration_time"] or 0, analysis.sample_rate)
+        groups.setdefault(key, []).append(analysis)
+        measurements.setdefault(key, []).append(
+            {
+                "Medición": match.group(1) if match else file_path.parent.name,
+                "Posición": parsed["position_id"],
+                integration_time_column: parsed["integration_time"],
+            }
+        )
+    return {
+        key: (groups[key], pd.DataFrame(measurements[key])) for key in sorted(groups)
+    }
+
+
+def stage_parameters_sheet(
+    file_paths: Sequence[Union[str, Path]],
+    bands: Sequence[int] = third_octave_bands,
+    fraction: int = 3,
+) -> pd.DataFrame:
+    """Compute the "ST param" sheet of many omnidirectional recordings.
+
+    Every recording is read from its onset to the end of the latest window of
+    `stage_parameter_windows`, and the recordings of each integration-time variant
+    (the 10/100/350 ms in "..._Subj_10ms.wav") are computed together in a single call
+    to `stage_parameters`.
+
+    Args:
+        file_paths (Sequence[str | Path]): the recordings, named as in the campaign
+            (see `catalog.parse_recording_name`).
+        bands (Sequence[int]): the nominal centre frequency of each band.
+        fraction (int): 1 for octave bands, 3 for third-octave bands.
+
+    Returns:
+        pd.DataFrame: the output of `stage_parameters_to_sheet`, with the measurement
+            under "Medición", the position under "Posición" and the variant under
+            "Integration time" (empty for recordings without one), sorted by
+            integration time.
+    """
+    seconds_after_onset = (
+        max(stop for _, stop in stage_parameter_windows.values()) / 1000
+    )
+    sheets = []
+    for (_, sample_rate), (analyses, measurements) in read_recording_groups(
+        file_paths, seconds_after_onset
+    ).items():
+        parameters = stage_parameters(
+            [analysis.rir[0] for analysis in analyses],
+            sample_rate,
+            bands,
+            fraction,
+            direct_sound_arrivals=np.zeros(len(analyses), dtype=int),
+        )
+        sheets.append(stage_parameters_to_sheet(parameters, bands, measurements))
+    sheet = pd.concat(sheets, ignore_index=True)
+    sheet["Integration time"] = sheet["Integration time"].astype("Int64")
+    return sheet
+
+
+def read_rir_from_onset(
+    file_path: Union[str, Path],
+    seconds_after_onset: Optional[float] = None,
+    head_seconds: float = 1.0,
+    onset_method: str = "iso3382",
+    dtype: type = np.float64,
+) -> RIRAnalysis:
+    """Read only the part of a RIR the parameters integrate over.
+
+    The onset is searched in the first `head_seconds` of the recording, and only the
+    `seconds_after_onset` that follow it are decoded. DR needs 2 s after the onset;
+    LF_late integrates to the end of the RIR, so it needs `None`.
+
+    Args:
+        file_path (str | Path): the recording, omnidirectional or with the omni (W)
+            channel first.
+        seconds_after_onset (float, optional): how much to read from the onset on.
+            Reads to the end when omitted.
+        head_seconds (float): how much of the recording is decoded to search the onset.
+        onset_method (str): see the `method` argument of `get_direct_sound_arrival`.
+        dtype (type): the dtype the samples are decoded to, np.float64 or np.float32.
+
+    Returns:
+        RIRAnalysis: the analysis of the RIR from its onset on. Its
+            `direct_sound_arrival` is 0; the onset within the file is kept in
+            `file_onset`.
+    """
+    signal, sample_rate, onset = read_from_onset(
+        file_path,
+        lambda head, head_sample_rate: get_direct_sound_arrival(
+            head, head_sample_rate, method=onset_method
+        ),
+        seconds_after_onset,
+        head_seconds,
+        dtype,
+    )
+    return RIRAnalysis(
+        signal, sample_rate, onset_method, direct_sound_arrival=0, file_onset=onset
+    )
+
+
+def rir_from_onset(
+    signals: np.ndarray,
+    sample_rate: int,
+    seconds_after_onset: Optional[float] = None,
+    head_seconds: float = 1.0,
+    onset_method: str = "iso3382",
+) -> RIRAnalysis:
+    """Do what `read_rir_from_onset` does on a recording that is already decoded.
+
+    The onset is searched in float64 on the head of the first channel, as when
+    reading the file, and the analysis gets a view of `signals` from the onset on, so
+    a memory-mapped recording is not copied.
+
+    Args:
+        signals (np.ndarray): the recording, of shape (n,) or (channels, n) with the
+            omni (W) channel first.
+        sample_rate (int): its sampling rate.
+        seconds_after_onset (float, optional): how much to keep from the onset on.
+            Keeps everything when omitted.
+        head_seconds (float): how much of the recording the onset is searched in.
+        onset_method (str): see the `method` argument of `get_direct_sound_arrival`.
+
+    Returns:
+        RIRAnalysis: the analysis of the RIR from its onset on, like the output of
+            `read_rir_from_onset`.
+    """
+    signals = np.atleast_2d(signals)
+    head = np.asarray(signals[0, : round(head_seconds * sample_rate)], dtype=np.float64)
+    onset = onset_indices(
+        get_direct_sound_arrival(head, sample_rate, method=onset_method)
+    ).item()
+    stop = (
+        None
+        if seconds_after_onset is None
+        else onset + round(seconds_after_onset * sample_rate)
+    )
+    return RIRAnalysis(
+        signals[:, onset:stop],
+        sample_rate,
+        onset_method,
+        direct_sound_arrival=0,
+        file_onset=onset,
+    )
+
+
+@traced()
 def get_direct_sound_arrival(
-    rir: np.ndarray, sample_rate: int, as_milliseconds: bool = False
-) -> Union[float, int]:
-    direct_sound_index = max(0, find_peaks(rir)[0][0] - ms_to_samples(1, sample_rate))
+    rir: Union[np.ndarray, RIRAnalysis],
+    sample_rate: Optional[int] = None,
+    as_milliseconds: bool = False,
+    method: str = "iso3382",
+    threshold_db: float = 20,
+    subsample: bool = False,
+    pre_roll_ms: float = 1,
+    head_seconds: Optional[float] = 1.0,
+) -> Union[float, int, np.ndarray]:
+    """Find where the direct sound arrives, keeping some pre-roll before it.
+
+    Args:
+        rir (np.ndarray | RIRAnalysis): an omnidirectional RIR of shape (n,), a batch
+            of them of shape (N, n), or a `RIRAnalysis` (which already knows its onset).
+        sample_rate (int, optional): the sampling rate of the recording. Not needed
+            when `rir` is a `RIRAnalysis`.
+        as_milliseconds (bool): return the arrival in milliseconds instead of samples.
+        method (str): "iso3382" takes the first sample within `threshold_db` of the
+            global maximum, as in ISO 3382-1. "first_peak" takes the first peak found
+            by `scipy.signal.find_peaks`, which reproduces results computed before
+            the ISO 3382-1 detector existed; it only accepts a single RIR.
+        threshold_db (float): how far below the maximum the onset may be, in dB.
+        subsample (bool): interpolate the threshold crossing between samples. Only
+            available for the "iso3382" method. The fractional arrival is rounded
+            wherever it is used as an index, see `onset_indices`.
+        pre_roll_ms (float): how long before the detected arrival the onset is put.
+        head_seconds (float, optional): how much of the start of the RIR the
+            "iso3382" method searches, see `detect_onset_iso3382`.
+
+    Returns:
+        int | float | np.ndarray: the arrival of each RIR, in samples or milliseconds.
+    """
+    if isinstance(rir, RIRAnalysis):
+        return (
+            samples_to_ms(rir.direct_sound_arrival, rir.sample_rate)
+            if as_milliseconds
+            else rir.direct_sound_arrival
+        )
+    if method == "iso3382":
+        direct_sound_index = detect_onset_iso3382(
+            rir,
+            sample_rate,
+            threshold_db=threshold_db,
+            subsample=subsample,
+            pre_roll_ms=pre_roll_ms,
+            head_seconds=head_seconds,
+        )
+    elif method == "first_peak":
+        if subsample:
+            raise ValueError("The first_peak method has no sub-sample mode")
+        direct_sound_index = max(
+            0, find_peaks(rir)[0][0] - ms_to_samples(pre_roll_ms, sample_rate)
+        )
+    else:
+        raise ValueError("Unknown direct sound arrival method {}".format(method))
     return (
-        samples_to_ms(get_direct_sound_arrival(rir, sample_rate), sample_rate)
+        samples_to_ms(direct_sound_index, sample_rate)
         if as_milliseconds
         else direct_sound_index
     )
 
 
+def detect_onset_iso3382(
+    rirs: np.ndarray,
+    sample_rate: int,
+    threshold_db: float = 20,
+    subsample: bool = False,
+    chunk_size: int = 4096,
+    pre_roll_ms: float = 1,
+    head_seconds: Optional[float] = 1.0,
+) -> Union[float, int, np.ndarray]:
+    """Find the ISO 3382-1 onset of one or more RIRs, minus some pre-roll.
+
+    The onset is the first sample whose energy is within `threshold_db` of the maximum.
+    Both the maximum and the crossing are searched in the first `head_seconds`, the
+    same head `read_rir_from_onset` decodes. RIRs whose rest peaks higher than their
+    head, where the direct sound arrives after the head, fall back to a search of the
+    whole RIR. RIRs are searched in chunks of `chunk_size` samples and the search stops
+    as soon as every RIR has crossed its threshold.
+
+    Args:
+        rirs (np.ndarray): an omnidirectional RIR of shape (n,) or a batch of shape
+            (N, n).
+        sample_rate (int): the sampling rate of the recordings.
+        threshold_db (float): how far below the maximum the onset may be, in dB.
+        subsample (bool): linearly interpolate the energy between the last sample
+            below the threshold and the first one above it.
+        chunk_size (int): how many samples are searched at a time.
+        pre_roll_ms (float): how long before the threshold crossing the onset is put.
+        head_seconds (float, optional): how much of the start of each RIR is
+            searched first. The whole RIR is when None.
+
+    Returns:
+        int | float | np.ndarray: the onset of each RIR in samples, as a scalar for a
+            single RIR or an array of shape (N,) for a batch. Sub-sample onsets are
+            floats; `onset_indices` rounds them to indices.
+    """
+    single_rir = rirs.ndim == 1
+    rirs = np.atleast_2d(rirs)
+    head_length = (
+        rirs.shape[-1]
+        if head_seconds is None
+        else seconds_to_samples(head_seconds, sample_rate)
+    )
+    peaks = np.max(np.abs(rirs[:, :head_length]), axis=-1)
+    if head_length < rirs.shape[-1]:
+        rest = rirs[:, head_length:]
+        rest_peaks = np.maximum(rest.max(axis=-1), -rest.min(axis=-1))
+        if np.any(rest_peaks > peaks):
+            peaks = np.maximum(peaks, rest_peaks)
+            head_length = rirs.shape[-1]
+    rirs = rirs[:, :head_length]
+    rows = np.arange(rirs.shape[0])
+    thresholds = np.square(peaks) * 10 ** (-threshold_db / 10)
+
+    crossings = np.zeros(rirs.shape[0], dtype=int)
+    pending = rows
+    for start in range(0, rirs.shape[-1], chunk_size):
+        reached = (
+            np.square(rirs[pending, start : start + chunk_size])
+            >= thresholds[pending, None]
+        )
+        found = reached.any(axis=-1)
+        crossings[pending[found]] = start + reached[found].argmax(axis=-1)
+        pending = pending[~found]
+        if pending.size == 0:
+            break
+
+    onsets = crossings.astype(float) if subsample else crossings
+    if subsample:
+        previous = np.maximum(crossings - 1, 0)
+        energy_before = np.square(rirs[rows, previous])
+        energy_after = np.square(rirs[rows, crossings])
+        rise = energy_after - energy_before
+        interpolable = (crossings > 0) & (rise > 0)
+        onsets[interpolable] = previous[interpolable] + (
+            (thresholds - energy_before)[interpolable] / rise[interpolable]
+        )
+    onsets = np.maximum(onsets - ms_to_samples(pre_roll_ms, sample_rate), 0)
+    if single_rir:
+        return onsets[0].item()
+    return onsets
+
+
 if __name__ == "__main__":
     aformat_rirs, sample_rate = read_aformat(
         [
@@ -0,0 +1,321 @@
+"""A persistent SQLite catalog of the recordings of a measurement campaign."""
+import os
+from pathlib import Path
+import re
+import sqlite3
+from typing import Dict, List, Optional, Tuple, Union
+
+from soundfile import info as sf_info
+
+# e.g. "Earthworks 10-03_Subj_10ms.wav", "Soundfield 2-01.WAV" or
+# "Toma Earthworks 10-03 (2).wav"; searched anywhere in the name, like the substring
+# test run.py used before the catalog
+recording_name_pattern = re.compile(
+    r"(?P<mic_type>earthworks|soundfield)\s*(?P<mic_number>[0-9]+)"
+    r"-(?P<position_id>[0-9]{1,2})(?![0-9]).*\.wav$",
+    re.IGNORECASE,
+)
+measurement_pattern = re.compile(r".*medicion([0-9]+)")
+integration_time_pattern = re.compile(r"(?<![0-9])(?P<integration_time>[0-9]+)ms")
+
+# SoundField capsule number -> capsule name, in A-format order
+soundfield_capsules = {
+    1: "front_left_up",
+    2: "front_right_down",
+    3: "back_left_down",
+    4: "back_right_up",
+}
+
+# Bumped whenever parse_recording_name changes, so catalogs indexed with an older
+# version are indexed anew instead of keeping the old parse of unchanged files
+naming_version = 2
+
+catalog_columns = (
+    "path",
+    "campaign",
+    "directory",
+    "filename",
+    "measurement_id",
+    "mic_type",
+    "mic_number",
+    "capsule",
+    "position_id",
+    "integration_time",
+    "sample_rate",
+    "frames",
+    "channels",
+    "size",
+    "mtime_ns",
+)
+
+catalog_schema = """
+CREATE TABLE IF NOT EXISTS recordings (
+    path TEXT PRIMARY KEY,
+    campaign TEXT NOT NULL,
+    directory TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    measurement_id TEXT,
+    mic_type TEXT,
+    mic_number INTEGER,
+    capsule TEXT,
+    position_id TEXT,
+    integration_time INTEGER,
+    sample_rate INTEGER,
+    frames INTEGER,
+    channels INTEGER,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS recordings_by_campaign
+    ON recordings (campaign, mic_type, directory);
+"""
+
+
+def parse_integration_time(string: str) -> Optional[int]:
+    """Find the integration-time variant, e.g. the 10 in "..._Subj_10ms.wav".
+
+    Args:
+        string (str): a file name or path.
+
+    Returns:
+        int | None: the integration time in ms, or None if the string has none.
+    """
+    match = integration_time_pattern.search(string)
+    if match is None:
+        return None
+    return int(match.group("integration_time"))
+
+
+def parse_recording_name(filename: str) -> Dict[str, Optional[Union[str, int]]]:
+    """Split a recording file name into its microphone, capsule and position.
+
+    Args:
+        filename (str): the name of the file, without directories.
+
+    Returns:
+        Dict[str, str | int | None]: the lower-case mic type, mic number, SoundField
+            capsule name, position id and integration time; None where the name does
+            not follow the campaign naming.
+    """
+    parsed = {
+        "mic_type": None,
+        "mic_number": None,
+        "capsule": None,
+        "position_id": None,
+        "integration_time": parse_integration_time(filename),
+    }
+    match = recording_name_pattern.search(filename)
+    if match is None:
+        return parsed
+    parsed["mic_type"] = match.group("mic_type").lower()
+    parsed["mic_number"] = int(match.group("mic_number"))
+    parsed["position_id"] = match.group("position_id")
+    if parsed["mic_type"] == "soundfield":
+        parsed["capsule"] = soundfield_capsules.get(parsed["mic_number"])
+    return parsed
+
+
+class MeasurementCatalog:
+    """The recordings of one or more campaigns, indexed once in an SQLite database.
+
+    `update` only opens the files that are new or whose size or modification time
+    changed since the last scan, and forgets the ones that disappeared, so rescanning
+    an unchanged campaign costs one `stat` per file.
+
+    Args:
+        path (Path): the database file, created when missing.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.connection = sqlite3.connect(str(self.path))
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(catalog_schema)
+        (version,) = self.connection.execute("PRAGMA user_version").fetchone()
+        if version < naming_version:
+            with self.connection:
+                self.connection.execute("DELETE FROM recordings")
+                self.connection.execute(
+                    "PRAGMA user_version = {:d}".format(naming_version)
+                )
+
+    def __enter__(self) -> "MeasurementCatalog":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def update(self, campaign_directory: Path) -> Tuple[int, int, int]:
+        """Scan a campaign and bring its entries up to date.
+
+        Like the original walk of run.py, files directly inside the campaign directory
+        are skipped: every measurement lives in a subdirectory. Files that do not follow
+        the recording naming are warned about once, when they are indexed.
+
+        Args:
+            campaign_directory (Path): the directory with one subdirectory per
+                measurement.
+
+        Returns:
+            Tuple[int, int, int]: how many files were indexed anew, left untouched and
+                removed.
+        """
+        campaign = str(Path(campaign_directory).resolve())
+        known = {
+            row["path"]: (row["size"], row["mtime_ns"])
+            for row in self.connection.execute(
+                "SELECT path, size, mtime_ns FROM recordings WHERE campaign = ?",
+                (campaign,),
+            )
+        }
+        seen = set()
+        changed = []
+        for directory, _, filenames in os.walk(campaign):
+            if directory == campaign:
+                continue
+            measurement_id = None
+            for filename in filenames:
+                if not filename.lower().endswith(".wav"):
+                    continue
+                path = os.path.join(directory, filename)
+                stat = os.stat(path)
+                seen.add(path)
+                if known.get(path) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                if measurement_id is None:
+                    measurement_id = self._measurement_id(directory)
+                audio_info = sf_info(path)
+                changed.append(
+                    {
+                        "path": path,
+                        "campaign": campaign,
+                        "directory": directory,
+                        "filename": filename,
+                        "measurement_id": measurement_id,
+                        **parse_recording_name(filename),
+                        "sample_rate": audio_info.samplerate,
+                        "frames": audio_info.frames,
+                        "channels": audio_info.channels,
+                        "size": stat.st_size,
+                        "mtime_ns": stat.st_mtime_ns,
+                    }
+                )
+        removed = [(path,) for path in known if path not in seen]
+        for entry in sorted(changed, key=lambda entry: entry["path"]):
+            if entry["mic_type"] is None:
+                print(
+                    "WARNING: {} does not follow the recording naming and will not be "
+                    "analysed".format(entry["path"])
+                )
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO recordings ({}) VALUES ({})".format(
+                    ", ".join(catalog_columns),
+                    ", ".join(":" + column for column in catalog_columns),
+                ),
+                changed,
+            )
+            self.connection.executemany(
+                "DELETE FROM recordings WHERE path = ?", removed
+            )
+        return len(changed), len(seen) - len(changed), len(removed)
+
+    @staticmethod
+    def _measurement_id(directory: str) -> str:
+        match = measurement_pattern.match(directory)
+        if match is None:
+            print("WARNING: could not find numbers in string {}".format(directory))
+            return directory
+        return match.group(1)
+
+    def recordings(
+        self, campaign_directory: Optional[Path] = None, **filters
+    ) -> List[sqlite3.Row]:
+        """Query catalog entries, ordered by directory and file name.
+
+        Args:
+            campaign_directory (Path, optional): only return files of this campaign.
+            **filters: column values to match, e.g. `mic_type="earthworks"` or
+                `integration_time=10`.
+
+        Returns:
+            List[sqlite3.Row]: the matching entries, with the columns of
+                `catalog_columns`.
+        """
+        for column in filters:
+            if column not in catalog_columns:
+                raise ValueError("Unknown catalog column {}".format(column))
+        if campaign_directory is not None:
+            filters["campaign"] = str(Path(campaign_directory).resolve())
+        where = " AND ".join("{} = :{}".format(column, column) for column in filters)
+        return self.connection.execute(
+            "SELECT * FROM recordings {} ORDER BY directory, filename".format(
+                "WHERE " + where if where else ""
+            ),
+            filters,
+        ).fetchall()
+
+    def aformat_groups(self, campaign_directory: Optional[Path] = None) -> List[dict]:
+        """Group the SoundField capsule files of every position into A-format sets.
+
+        Capsules are grouped by directory, position and integration time, so every
+        integration-time variant of a position is a group of its own. Positions
+        missing a capsule are left out with a warning.
+
+        Args:
+            campaign_directory (Path, optional): only return groups of this campaign.
+
+        Returns:
+            List[dict]: for each position and integration time, in directory order,
+                its "measurement_id" (the position id, as run.py has always used it),
+                its "directory", "integration_time" and "files" (a set of file names),
+                and the path of each capsule under its name in `soundfield_capsules`.
+
+        Raises:
+            ValueError: if a group has two files for the same capsule.
+        """
+        groups = {}
+        for row in self.recordings(campaign_directory, mic_type="soundfield"):
+            if row["capsule"] is None:
+                continue
+            group = groups.setdefault(
+                (row["directory"], row["position_id"], row["integration_time"]),
+                {
+                    "measurement_id": row["position_id"],
+                    "directory": row["directory"],
+                    "integration_time": row["integration_time"],
+                    "files": set(),
+                },
+            )
+            if row["capsule"] in group:
+                raise ValueError(
+                    "Position {} in {} has two {} capsules: {} and {}".format(
+                        row["position_id"],
+                        row["directory"],
+                        row["capsule"],
+                        group[row["capsule"]].name,
+                        row["filename"],
+                    )
+                )
+            group["files"].add(row["filename"])
+            group[row["capsule"]] = Path(row["path"])
+
+        complete = []
+        for (directory, position_id, _), group in groups.items():
+            missing = [
+                capsule
+                for capsule in soundfield_capsules.values()
+                if capsule not in group
+            ]
+            if missing:
+                print(
+                    "WARNING: position {} in {} lacks capsules {}".format(
+                        position_id, directory, missing
+                    )
+                )
+                continue
+            complete.append(group)
+        return complete
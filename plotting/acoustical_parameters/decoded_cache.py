@@ -0,0 +1,186 @@
+"""Decoded recordings kept as float32 .npy files, memory-mapped by later runs."""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import soundfile as sf
+
+from plotting.tracing import span
+from plotting.utils import (
+    aformat_to_bformat_matrix,
+    convert_ambisonics_a_to_b_batch,
+    read_aformat,
+)
+
+
+class DecodedCache:
+    """PCM decoded once per source file content, for any number of later analyses.
+
+    An Earthworks file is stored whole, as its (channels, n) samples; an A-format group
+    is stored after its conversion to B-format, as (4, n) W, X, Y, Z signals. Entries
+    are named after a hash of the content of their sources (and, for B-format, of the
+    conversion matrix), so renaming or copying an archive keeps its entries and editing
+    a file makes a new one. Loads are memory maps: nothing is decoded or copied, and
+    worker processes analysing the same entry share its pages.
+
+    Samples are stored in float32, which holds 16- and 24-bit PCM and float WAV
+    exactly; B-format signals are rounded to float32 after a float64 conversion.
+
+    Content hashes are remembered in hashes.jsonl by path, size and modification time,
+    so unchanged files are hashed once.
+
+    Args:
+        directory (Path): where the entries live, created when missing.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.hashes_path = self.directory / "hashes.jsonl"
+        self.hashes: Dict[Tuple[str, int, int], str] = {}
+        if self.hashes_path.exists():
+            with open(self.hashes_path) as hashes_file:
+                for line in hashes_file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.hashes[
+                        entry["path"], entry["size"], entry["mtime_ns"]
+                    ] = entry["sha256"]
+
+    def source_hash(self, file_path: Union[str, Path]) -> str:
+        """Hash the content of a source file, or recall its hash.
+
+        Args:
+            file_path (str | Path): the file.
+
+        Returns:
+            str: the hex SHA-256 of its content.
+        """
+        file_path = str(Path(file_path).resolve())
+        stat = os.stat(file_path)
+        memo_key = (file_path, stat.st_size, stat.st_mtime_ns)
+        if memo_key not in self.hashes:
+            digest = hashlib.sha256()
+            with open(file_path, "rb") as source_file:
+                for block in iter(lambda: source_file.read(1 << 20), b""):
+                    digest.update(block)
+            self.hashes[memo_key] = digest.hexdigest()
+            line = json.dumps(
+                {
+                    "path": file_path,
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "sha256": self.hashes[memo_key],
+                }
+            )
+            with open(self.hashes_path, "a") as hashes_file:
+                hashes_file.write(line + "\n")
+        return self.hashes[memo_key]
+
+    def load(self, key: str) -> Optional[Tuple[np.ndarray, int]]:
+        """Memory-map an entry.
+
+        Args:
+            key (str): the name of the entry.
+
+        Returns:
+            Tuple[np.ndarray, int] | None: its read-only (channels, n) samples and
+                their sample rate, or None if there is no such entry.
+        """
+        samples_path = self.directory / (key + ".npy")
+        try:
+            with open(self.directory / (key + ".json")) as metadata_file:
+                metadata = json.load(metadata_file)
+            samples = np.load(samples_path, mmap_mode="r")
+        except FileNotFoundError:
+            return None
+        return samples, metadata["sample_rate"]
+
+    def store(
+        self, key: str, samples: np.ndarray, sample_rate: int, sources: Sequence[str]
+    ) -> Tuple[np.ndarray, int]:
+        """Write an entry in float32 and memory-map it back.
+
+        Files are written under temporary names and renamed into place, so processes
+        storing the same entry at once, or a run interrupted while storing, never leave
+        a partial one behind.
+
+        Args:
+            key (str): the name of the entry.
+            samples (np.ndarray): the (channels, n) samples.
+            sample_rate (int): their sample rate.
+            sources (Sequence[str]): the files they come from, kept for reference.
+
+        Returns:
+            Tuple[np.ndarray, int]: the output of `load` for the new entry.
+        """
+        suffix = ".{}.tmp".format(os.getpid())
+        samples_path = self.directory / (key + ".npy")
+        with open(str(samples_path) + suffix, "wb") as samples_file:
+            np.save(samples_file, np.ascontiguousarray(samples, dtype=np.float32))
+        os.replace(str(samples_path) + suffix, samples_path)
+        metadata_path = self.directory / (key + ".json")
+        with open(str(metadata_path) + suffix, "w") as metadata_file:
+            json.dump(
+                {"sample_rate": sample_rate, "sources": list(sources)}, metadata_file
+            )
+        os.replace(str(metadata_path) + suffix, metadata_path)
+        return self.load(key)
+
+    def recording(self, file_path: Union[str, Path]) -> Tuple[np.ndarray, int]:
+        """The samples of a file, decoded and stored the first time they are asked for.
+
+        Args:
+            file_path (str | Path): the recording.
+
+        Returns:
+            Tuple[np.ndarray, int]: its memory-mapped (channels, n) samples and sample
+                rate.
+        """
+        key = self.source_hash(file_path)
+        with span("load_decoded", file=str(file_path)) as counters:
+            loaded = self.load(key)
+            if loaded is None:
+                samples, sample_rate = sf.read(
+                    str(file_path), dtype=np.float32, always_2d=True
+                )
+                loaded = self.store(key, samples.T, sample_rate, [str(file_path)])
+            counters["samples"] = loaded[0].size
+        return loaded
+
+    def bformat(self, capsule_paths: List[Union[str, Path]]) -> Tuple[np.ndarray, int]:
+        """The B-format signals of an A-format group, converted the first time they
+        are asked for.
+
+        Args:
+            capsule_paths (List[str | Path]): one file per capsule, in the order
+                `convert_ambisonics_a_to_b_batch` expects.
+
+        Returns:
+            Tuple[np.ndarray, int]: the memory-mapped (4, n) W, X, Y, Z signals and
+                their sample rate.
+        """
+        digest = hashlib.sha256(aformat_to_bformat_matrix.tobytes())
+        for capsule_path in capsule_paths:
+            digest.update(self.source_hash(capsule_path).encode())
+        key = "bformat-" + digest.hexdigest()
+        with span("load_decoded", file=str(capsule_paths[0])) as counters:
+            loaded = self.load(key)
+            if loaded is None:
+                aformat_signals, sample_rate = read_aformat(list(capsule_paths))
+                bformat_signals = convert_ambisonics_a_to_b_batch(
+                    aformat_signals, out=aformat_signals
+                )
+                loaded = self.store(
+                    key,
+                    bformat_signals,
+                    sample_rate,
+                    [str(capsule_path) for capsule_path in capsule_paths],
+                )
+            counters["samples"] = loaded[0].size
+        return loaded
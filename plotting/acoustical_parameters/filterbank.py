@@ -0,0 +1,216 @@
+"""Octave and third-octave band filter banks (IEC 61260) for band-wise parameters."""
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.signal import butter, decimate, sosfilt
+
+# Nominal centre frequencies, labelled as in the data.xlsx sheets
+third_octave_bands = (
+    50,
+    63,
+    80,
+    100,
+    125,
+    160,
+    200,
+    250,
+    315,
+    400,
+    500,
+    630,
+    800,
+    1000,
+    1300,
+    1600,
+    2000,
+    2500,
+    3200,
+    4000,
+    5000,
+    6300,
+    8000,
+    10000,
+    12500,
+)
+octave_bands = (63, 125, 250, 500, 1000, 2000, 4000, 8000)
+
+OCTAVE_RATIO = 10 ** (3 / 10)
+
+
+def exact_centre_frequency(nominal_frequency: float, fraction: int = 3) -> float:
+    """Compute the exact base-10 mid-band frequency closest to a nominal one.
+
+    Args:
+        nominal_frequency (float): the nominal centre frequency, e.g. 1300 or 3200.
+        fraction (int): 1 for octave bands, 3 for third-octave bands.
+
+    Returns:
+        float: the exact mid-band frequency in Hz.
+    """
+    band_index = round(
+        fraction * np.log10(nominal_frequency / 1000) / np.log10(OCTAVE_RATIO)
+    )
+    return 1000 * OCTAVE_RATIO ** (band_index / fraction)
+
+
+def band_edges(nominal_frequency: float, fraction: int = 3) -> Tuple[float, float]:
+    """Compute the lower and upper edge frequencies of a band.
+
+    Args:
+        nominal_frequency (float): the nominal centre frequency.
+        fraction (int): 1 for octave bands, 3 for third-octave bands.
+
+    Returns:
+        Tuple[float, float]: the lower and upper edge frequencies in Hz.
+    """
+    centre = exact_centre_frequency(nominal_frequency, fraction)
+    half_band = OCTAVE_RATIO ** (1 / (2 * fraction))
+    return centre / half_band, centre * half_band
+
+
+@lru_cache(maxsize=None)
+def design_filter_bank(
+    sample_rate: float,
+    bands: Tuple[int, ...] = third_octave_bands,
+    fraction: int = 3,
+    order: int = 3,
+) -> np.ndarray:
+    """Design the Butterworth band-pass filters of a bank, once per configuration.
+
+    Args:
+        sample_rate (float): the sampling rate the filters run at.
+        bands (Tuple[int, ...]): the nominal centre frequency of each band.
+        fraction (int): 1 for octave bands, 3 for third-octave bands.
+        order (int): the order of the low-pass prototype of each band-pass filter.
+
+    Returns:
+        np.ndarray: second-order sections of shape (bands, order, 6).
+    """
+    sections = []
+    for band in bands:
+        lower, upper = band_edges(band, fraction)
+        if upper >= sample_rate / 2:
+            raise ValueError(
+                "Band {} Hz does not fit below the Nyquist frequency of {} Hz".format(
+                    band, sample_rate / 2
+                )
+            )
+        sections.append(
+            butter(
+                order, (lower, upper), btype="bandpass", fs=sample_rate, output="sos"
+            )
+        )
+    return np.stack(sections)
+
+
+def filter_bands(
+    rirs: np.ndarray,
+    sample_rate: float,
+    bands: Sequence[int] = third_octave_bands,
+    fraction: int = 3,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Split one or more RIRs into frequency bands.
+
+    Every band is filtered over the whole stack in a single call. Passing a float32
+    `out` buffer halves the memory of the result and lets it be reused across calls.
+
+    Args:
+        rirs (np.ndarray): the RIRs, an array of shape (..., n), e.g. (N, channels, n).
+        sample_rate (float): the sampling rate of the recordings.
+        bands (Sequence[int]): the nominal centre frequency of each band.
+        fraction (int): 1 for octave bands, 3 for third-octave bands.
+        out (np.ndarray, optional): where to write the result, of shape
+            (..., bands, n). A new float64 array is allocated when omitted.
+
+    Returns:
+        np.ndarray: the band-filtered RIRs, of shape (..., bands, n).
+    """
+    filter_bank = design_filter_bank(sample_rate, tuple(bands), fraction)
+    output_shape = rirs.shape[:-1] + (len(bands), rirs.shape[-1])
+    if out is None:
+        out = np.empty(output_shape)
+    elif out.shape != output_shape:
+        raise ValueError(
+            "Expected an output buffer of shape {}, not {}".format(
+                output_shape, out.shape
+            )
+        )
+    for i, sos in enumerate(filter_bank):
+        out[..., i, :] = sosfilt(sos, rirs, axis=-1)
+    return out
+
+
+def decimation_stages(
+    sample_rate: float,
+    bands: Sequence[int] = third_octave_bands,
+    fraction: int = 3,
+    oversampling: float = 8,
+) -> Dict[int, Tuple[int, ...]]:
+    """Group bands by how many times the signal can be halved before filtering them.
+
+    A band may run at `sample_rate / 2 ** k` as long as the Nyquist frequency of that
+    rate stays `oversampling` times above the upper edge of the band.
+
+    Args:
+        sample_rate (float): the sampling rate of the recordings.
+        bands (Sequence[int]): the nominal centre frequency of each band.
+        fraction (int): 1 for octave bands, 3 for third-octave bands.
+        oversampling (float): how far above the upper band edge the Nyquist frequency
+            must stay.
+
+    Returns:
+        Dict[int, Tuple[int, ...]]: the bands filtered after each number of halvings.
+    """
+    stages = {}
+    for band in bands:
+        _, upper = band_edges(band, fraction)
+        halvings = max(
+            0, int(np.floor(np.log2(sample_rate / (2 * oversampling * upper))))
+        )
+        stages[halvings] = stages.get(halvings, ()) + (band,)
+    return stages
+
+
+def filter_bands_multirate(
+    rirs: np.ndarray,
+    sample_rate: float,
+    bands: Sequence[int] = third_octave_bands,
+    fraction: int = 3,
+    oversampling: float = 8,
+) -> List[Tuple[Tuple[int, ...], float, np.ndarray]]:
+    """Split one or more RIRs into frequency bands, filtering low bands at lower rates.
+
+    The RIRs are halved in octave stages with a zero-phase anti-aliasing filter, so
+    every decimated signal stays aligned in time with the original, and each band is
+    filtered at the lowest rate `decimation_stages` allows for it.
+
+    Args:
+        rirs (np.ndarray): the RIRs, an array of shape (..., n).
+        sample_rate (float): the sampling rate of the recordings.
+        bands (Sequence[int]): the nominal centre frequency of each band.
+        fraction (int): 1 for octave bands, 3 for third-octave bands.
+        oversampling (float): see `decimation_stages`.
+
+    Returns:
+        List[Tuple[Tuple[int, ...], float, np.ndarray]]: for each stage, the bands it
+            holds, its sampling rate and the band-filtered RIRs of shape
+            (..., bands in the stage, n / 2 ** stage).
+    """
+    stages = decimation_stages(sample_rate, bands, fraction, oversampling)
+    filtered = []
+    signal = rirs
+    for halvings in range(max(stages) + 1):
+        if halvings > 0:
+            signal = decimate(signal, 2, axis=-1)
+        if halvings in stages:
+            stage_rate = sample_rate / 2**halvings
+            filtered.append(
+                (
+                    stages[halvings],
+                    stage_rate,
+                    filter_bands(signal, stage_rate, stages[halvings], fraction),
+                )
+            )
+    return filtered
@@ -0,0 +1,144 @@
+"""Interaural cross-correlation (IACC) and the ASW/LEV globals from binaural RIRs."""
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.fft import irfft, next_fast_len, rfft
+
+from plotting.acoustical_parameters import (
+    get_direct_sound_arrival,
+    ms_to_samples,
+    onset_indices,
+)
+from plotting.acoustical_parameters.filterbank import filter_bands, octave_bands
+
+# Window name -> (start, stop) in ms after the direct sound; None runs to the end
+iacc_windows = {
+    "IACCe": (0, 80),
+    "IACCl": (80, None),
+    "IACC": (0, None),
+}
+
+# Bands averaged into the ASW and LEV globals, as in data/ASW.csv and data/LEV.csv
+asw_lev_bands = (500, 1000, 2000)
+
+
+def extract_windows(rirs: np.ndarray, starts: np.ndarray, length: int) -> np.ndarray:
+    """Cut a window of the same length out of every RIR, each at its own start.
+
+    Samples past the end of a RIR are zero.
+
+    Args:
+        rirs (np.ndarray): an array of shape (N, ..., n).
+        starts (np.ndarray): the first sample of each window, of shape (N,).
+        length (int): how many samples each window has.
+
+    Returns:
+        np.ndarray: the windows, of shape (N, ..., length).
+    """
+    indices = starts[:, None] + np.arange(length)
+    valid = indices < rirs.shape[-1]
+    indices = np.where(valid, indices, 0)
+    expand = (slice(None),) + (None,) * (rirs.ndim - 2) + (slice(None),)
+    windows = np.take_along_axis(rirs, indices[expand], axis=-1)
+    windows *= valid[expand]
+    return windows
+
+
+def interaural_cross_correlation(
+    left: np.ndarray, right: np.ndarray, max_lag: int
+) -> np.ndarray:
+    """Compute the normalised interaural cross-correlation function with FFTs.
+
+    Args:
+        left (np.ndarray): left-ear windows, an array of shape (..., n).
+        right (np.ndarray): right-ear windows, of the same shape as `left`.
+        max_lag (int): the largest lag, in samples, on either side.
+
+    Returns:
+        np.ndarray: the IACF for lags -max_lag to max_lag, of shape
+            (..., 2 * max_lag + 1).
+    """
+    fft_length = next_fast_len(left.shape[-1] + max_lag)
+    correlation = irfft(
+        np.conj(rfft(left, fft_length)) * rfft(right, fft_length), fft_length
+    )
+    lags = np.concatenate(
+        (correlation[..., fft_length - max_lag :], correlation[..., : max_lag + 1]),
+        axis=-1,
+    )
+    norm = np.sqrt(np.sum(np.square(left), -1) * np.sum(np.square(right), -1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return lags / norm[..., None]
+
+
+def iacc(
+    binaural_rirs: np.ndarray,
+    sample_rate: int,
+    bands: Sequence[int] = octave_bands,
+    fraction: int = 1,
+    direct_sound_arrivals: Optional[Sequence[int]] = None,
+    max_lag_ms: float = 1,
+) -> Dict[str, np.ndarray]:
+    """Compute the early, late and full IACC of every band of many binaural RIRs.
+
+    Args:
+        binaural_rirs (np.ndarray): binaural RIRs, an array of shape (N, 2, n) with the
+            left ear first.
+        sample_rate (int): the sampling rate of the recordings.
+        bands (Sequence[int]): the nominal centre frequency of each band.
+        fraction (int): 1 for octave bands, 3 for third-octave bands.
+        direct_sound_arrivals (Sequence[int], optional): the onset index of each RIR.
+            Taken as the earliest `get_direct_sound_arrival` of both ears when
+            omitted.
+        max_lag_ms (float): the largest interaural lag, in milliseconds.
+
+    Returns:
+        Dict[str, np.ndarray]: arrays of shape (N, bands) under the keys of
+            `iacc_windows`.
+    """
+    if direct_sound_arrivals is None:
+        direct_sound_arrivals = np.min(
+            get_direct_sound_arrival(
+                binaural_rirs.reshape(-1, binaural_rirs.shape[-1]), sample_rate
+            ).reshape(binaural_rirs.shape[:2]),
+            axis=-1,
+        )
+    onsets = onset_indices(direct_sound_arrivals)
+    max_lag = ms_to_samples(max_lag_ms, sample_rate)
+
+    # (N, 2, bands, n)
+    band_rirs = filter_bands(binaural_rirs, sample_rate, bands, fraction)
+    results = {}
+    for name, (start_ms, stop_ms) in iacc_windows.items():
+        starts = onsets + ms_to_samples(start_ms, sample_rate)
+        length = (
+            band_rirs.shape[-1] - int(starts.min())
+            if stop_ms is None
+            else ms_to_samples(stop_ms - start_ms, sample_rate)
+        )
+        windows = extract_windows(band_rirs, starts, length)
+        iacf = interaural_cross_correlation(windows[:, 0], windows[:, 1], max_lag)
+        results[name] = np.max(np.abs(iacf), axis=-1)
+    return results
+
+
+def apparent_source_width_and_envelopment(
+    iacc_results: Dict[str, np.ndarray], bands: Sequence[int] = octave_bands
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Derive ASW and LEV the way data/ASW.csv and data/LEV.csv define them.
+
+    Both are the mean over the 500 Hz, 1 kHz and 2 kHz octaves, of IACCe for ASW and of
+    IACCl for LEV.
+
+    Args:
+        iacc_results (Dict[str, np.ndarray]): an output of `iacc`.
+        bands (Sequence[int]): the bands `iacc_results` was computed for.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: the ASW and LEV of each RIR, of shape (N,).
+    """
+    columns = [list(bands).index(band) for band in asw_lev_bands]
+    return (
+        iacc_results["IACCe"][:, columns].mean(axis=-1),
+        iacc_results["IACCl"][:, columns].mean(axis=-1),
+    )
@@ -0,0 +1,238 @@
+"""Fit the analysis of a campaign into a memory budget, from the frame counts in its
+catalog."""
+from typing import Iterable, Mapping, Optional
+
+import numpy as np
+
+from plotting.tracing import rss_bytes
+
+# What run.py decodes of an Earthworks file: the head the onset is searched in, then
+# the window DR integrates over from the onset on
+head_seconds = 1
+seconds_after_onset = 2
+# The shortest A-format read window that still holds the 2 s after an onset found
+# anywhere in the head
+minimum_window_seconds = head_seconds + seconds_after_onset
+# Samples converted from A- to B-format at a time, see convert_ambisonics_a_to_b_batch
+conversion_block_size = 65536
+# Memory of a worker before it reads anything, when it cannot be measured
+default_baseline_bytes = 150 * 2**20
+# Share of the budget left for allocator slack and tracemalloc's own bookkeeping
+headroom = 0.05
+
+
+def omni_bytes(frames: int, channels: int, sample_rate: int, itemsize: int):
+    """Estimate the memory the parameters of one Earthworks file take.
+
+    Args:
+        frames (int): the length of the file.
+        channels (int): how many channels it has.
+        sample_rate (int): its sampling rate.
+        itemsize (int): the bytes of a decoded sample, 8 for float64 and 4 for float32.
+
+    Returns:
+        Tuple[int, int]: the peak bytes while the file is read and analysed, and the
+            bytes of its decoded window, which is what waits in a read-ahead buffer.
+    """
+    head = min(frames, head_seconds * sample_rate) * channels * itemsize
+    window = min(frames, seconds_after_onset * sample_rate)
+    decoded = window * channels * itemsize
+    # Reading holds the head and the window; DR keeps the float64 cumulative energy of
+    # the first channel, after the onset search took its absolute value
+    analysis = max(window * itemsize, (window + 1) * 8)
+    return decoded + max(head, analysis), decoded + head
+
+
+def ambi_bytes(
+    frames: int, sample_rate: int, itemsize: int, max_seconds: Optional[float] = None
+):
+    """Estimate the memory the parameters of one A-format group take.
+
+    Args:
+        frames (int): the length of each capsule file.
+        sample_rate (int): their sampling rate.
+        itemsize (int): the bytes of a decoded sample, 8 for float64 and 4 for float32.
+        max_seconds (float, optional): how much of the start of each file is read.
+
+    Returns:
+        Tuple[int, int]: the peak bytes while the group is read and analysed, and the
+            bytes of its decoded capsules, which is what waits in a read-ahead buffer.
+    """
+    if max_seconds is not None:
+        frames = min(frames, round(max_seconds * sample_rate))
+    decoded = 4 * frames * itemsize
+    # The conversion to B-format runs in place block by block and the onset search
+    # takes the absolute value of W; then LF and DR keep the float64 cumulative energy
+    # of W and Y
+    conversion = 4 * min(frames, conversion_block_size) * itemsize
+    analysis = max(conversion, frames * itemsize, 2 * (frames + 1) * 8)
+    return decoded + analysis, decoded
+
+
+class ExecutionPlan:
+    """How run.py processes a campaign within a memory budget.
+
+    Args:
+        processes (int): worker processes; 1 analyses in the main process.
+        prefetch_depth (int): recordings each worker reads ahead.
+        dtype (type): np.float64 or np.float32, the precision samples are decoded to.
+        max_seconds (float, optional): how much of each A-format file is read, None
+            for all of it.
+        estimated_bytes (int): the expected peak RSS of all processes together.
+        max_bytes (int): the budget.
+        worker_bytes (int): the expected peak RSS of one worker.
+    """
+
+    def __init__(
+        self,
+        processes: int,
+        prefetch_depth: int,
+        dtype: type,
+        max_seconds: Optional[float],
+        estimated_bytes: int,
+        max_bytes: int,
+        worker_bytes: int,
+    ):
+        self.processes = processes
+        self.prefetch_depth = prefetch_depth
+        self.dtype = dtype
+        self.max_seconds = max_seconds
+        self.estimated_bytes = estimated_bytes
+        self.max_bytes = max_bytes
+        self.worker_bytes = worker_bytes
+
+    def describe(self) -> str:
+        description = (
+            "Memory plan: {} process(es), read-ahead {}, {} samples, {}; "
+            "estimated peak {:.0f} MB of {:.0f} MB".format(
+                self.processes,
+                self.prefetch_depth,
+                np.dtype(self.dtype).name,
+                "whole files"
+                if self.max_seconds is None
+                else "A-format files cut at {:.2f} s".format(self.max_seconds),
+                self.estimated_bytes / 2**20,
+                self.max_bytes / 2**20,
+            )
+        )
+        if self.max_seconds is not None:
+            description += (
+                "\nWARNING: LF_late integrates the A-format RIRs only up to {:.2f} s "
+                "to fit the budget".format(self.max_seconds)
+            )
+        return description
+
+
+def plan_execution(
+    recordings: Iterable[Mapping],
+    max_bytes: int,
+    processes: int,
+    prefetch_depth: int,
+    baseline_bytes: Optional[int] = None,
+) -> ExecutionPlan:
+    """Choose workers, read-ahead, precision and read window to fit a memory budget.
+
+    Each worker holds the recording it analyses and the ones it reads ahead, so the
+    largest recording of the campaign sets what a worker needs; every process also
+    holds `baseline_bytes` of interpreter and libraries, and 5% of the budget is kept
+    as headroom. Exact float64 results are
+    kept whenever they allow the requested number of workers, first with and then
+    without read-ahead. Otherwise float32 samples (the energy sums stay in float64, so
+    results move by about 1e-7 relative) are used if they allow more workers. Only
+    when not even one worker fits are the A-format files cut short, which changes
+    LF_late.
+
+    Args:
+        recordings (Iterable[Mapping]): catalog entries, with the "mic_type", "frames",
+            "channels" and "sample_rate" of each file, as `MeasurementCatalog.recordings`
+            returns them.
+        max_bytes (int): the budget for the peak RSS of all processes together.
+        processes (int): the most worker processes to use.
+        prefetch_depth (int): how many recordings each worker should read ahead.
+        baseline_bytes (int, optional): the memory of a process before it reads any
+            recording. Defaults to the current RSS of this process.
+
+    Returns:
+        ExecutionPlan: the plan.
+    """
+    if baseline_bytes is None:
+        baseline_bytes = rss_bytes() or default_baseline_bytes
+    usable_bytes = int(max_bytes * (1 - headroom))
+    omni_files = []
+    capsule_files = []
+    for row in recordings:
+        shape = (row["frames"], row["channels"], row["sample_rate"])
+        if row["mic_type"] == "earthworks":
+            omni_files.append(shape)
+        elif row["mic_type"] == "soundfield":
+            capsule_files.append(shape)
+
+    def worker_bytes(dtype: type, depth: int, max_seconds: Optional[float]) -> int:
+        itemsize = np.dtype(dtype).itemsize
+        costs = [omni_bytes(*shape, itemsize) for shape in omni_files] + [
+            ambi_bytes(frames, sample_rate, itemsize, max_seconds)
+            for frames, _, sample_rate in capsule_files
+        ]
+        if not costs:
+            return baseline_bytes
+        working = max(cost[0] for cost in costs)
+        buffered = max(cost[1] for cost in costs)
+        return baseline_bytes + working + depth * buffered
+
+    def fitting_processes(per_worker: int) -> int:
+        # One process analyses in place; a pool adds workers to the main process
+        if per_worker > usable_bytes:
+            return 0
+        workers = (usable_bytes - baseline_bytes) // per_worker
+        return max(1, min(processes, workers))
+
+    def total_bytes(workers: int, per_worker: int) -> int:
+        return per_worker if workers == 1 else baseline_bytes + workers * per_worker
+
+    best = None
+    for dtype, depth in (
+        (np.float64, prefetch_depth),
+        (np.float64, 0),
+        (np.float32, prefetch_depth),
+        (np.float32, 0),
+    ):
+        per_worker = worker_bytes(dtype, depth, None)
+        workers = fitting_processes(per_worker)
+        if best is None or workers > best.processes:
+            best = ExecutionPlan(
+                workers,
+                depth,
+                dtype,
+                None,
+                total_bytes(workers, per_worker),
+                max_bytes,
+                per_worker,
+            )
+        if workers == processes:
+            return best
+    if best.processes > 0:
+        return best
+
+    # Not even one worker fits whole files: cut the A-format files to the longest
+    # window that fits, which only shrinks what LF_late integrates
+    longest_seconds = max(
+        (frames / sample_rate for frames, _, sample_rate in capsule_files), default=0
+    )
+    low, high = minimum_window_seconds, longest_seconds
+    if high < low or worker_bytes(np.float32, 0, low) > usable_bytes:
+        raise ValueError(
+            "A memory budget of {:.0f} MB is too small: one process needs {:.0f} MB "
+            "even reading {} s of each file in float32".format(
+                max_bytes / 2**20,
+                worker_bytes(np.float32, 0, min(low, high)) / 2**20,
+                minimum_window_seconds,
+            )
+        )
+    while high - low > 0.01:
+        middle = (low + high) / 2
+        if worker_bytes(np.float32, 0, middle) <= usable_bytes:
+            low = middle
+        else:
+            high = middle
+    per_worker = worker_bytes(np.float32, 0, low)
+    return ExecutionPlan(1, 0, np.float32, low, per_worker, max_bytes, per_worker)
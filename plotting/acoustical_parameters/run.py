@@ -1,21 +1,45 @@
 """Apply acoustical parameters to recorded RIR."""
+from argparse import ArgumentParser
+import hashlib
 import json
+from multiprocessing import Pool, Queue, cpu_count
 import os
 from pathlib import Path
-import re
-from typing import Dict, List, Union
+from queue import Empty
+from time import perf_counter, sleep
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import zlib
 
 import numpy as np
 import pandas as pd
-from soundfile import read as sf_read
 
+import plotting.acoustical_parameters
+import plotting.acoustical_parameters.uncertainty
+from plotting import tracing
+import plotting.utils
 from plotting.acoustical_parameters import (
+    RIRAnalysis,
     direct_reverberant_ratio,
     get_direct_sound_arrival,
     lateral_fraction_early,
     lateral_fraction_late,
+    read_rir_from_onset,
+    rir_from_onset,
+    samples_to_ms,
 )
-from plotting.utils import read_aformat, convert_ambisonics_a_to_b
+from plotting.acoustical_parameters.catalog import (
+    MeasurementCatalog,
+    parse_recording_name,
+    soundfield_capsules,
+)
+from plotting.acoustical_parameters.decoded_cache import DecodedCache
+from plotting.acoustical_parameters.planner import ExecutionPlan, plan_execution
+from plotting.acoustical_parameters.uncertainty import (
+    analysis_lf_and_dr_uncertainty,
+    file_noise_power,
+)
+from plotting.acoustical_parameters.work_queue import WorkQueue
+from plotting.utils import read_aformat, convert_ambisonics_a_to_b_batch, prefetch
 
 # default_directory = (
 #     "/mnt/Ivan'sDrive/Documents/untref/materias/ima/final/RIRs/subjetivadas"
@@ -23,29 +47,33 @@ from plotting.utils import read_aformat, convert_ambisonics_a_to_b
 default_directory = (
     "/mnt/Ivan'sDrive/Documents/untref/materias/ima/final/RIRs/objetivas"
 )
-input_directory = input(
-    f"Input directory? [{default_directory}]: "
-)
-input_directory = Path(
-    input_directory if input_directory != "" else default_directory
-).resolve()
-
-results_df = pd.DataFrame(
-    {
-        "measurement": [],
-        "processing_type": [],
-        "filename": [],
-        "filepath": [],
-        "direct_sound_arrival_ms": [],
-        "lf_early": [],
-        "lf_late": [],
-        "dr_ratio": [],
-    }
-)
+default_processes = max(1, cpu_count() - 2)
+default_prefetch_depth = 2
 
-from multiprocessing import cpu_count, Pool
+# Keys of the capsule paths in an A-format dict, in the order read_aformat expects
+aformat_capsules = tuple(soundfield_capsules.values())
 
-processing_pool = Pool(cpu_count() - 2)
+# Column of results.tsv -> dtype
+results_dtypes = {
+    "measurement": object,
+    "processing_type": object,
+    "filename": object,
+    "filepath": object,
+    "direct_sound_arrival_ms": np.float64,
+    "lf_early": np.float64,
+    "lf_late": np.float64,
+    "dr_ratio": np.float64,
+    "integration_time": "Int64",
+}
+# Columns of results.tsv added by --uncertainty -> dtype
+interval_dtypes = {
+    "lf_early_low": np.float64,
+    "lf_early_high": np.float64,
+    "lf_late_low": np.float64,
+    "lf_late_high": np.float64,
+    "dr_ratio_low": np.float64,
+    "dr_ratio_high": np.float64,
+}
 
 
 def resolve_paths(base_directory: str, files: List[str]) -> List[Path]:
@@ -55,10 +83,81 @@ def resolve_paths(base_directory: str, files: List[str]) -> List[Path]:
     return merged_paths
 
 
-def extract_acoustical_parameters_omni(file_path: Path):
-    audio, sample_rate = sf_read(str(file_path))
-    dr_ratio = direct_reverberant_ratio(audio, sample_rate)
-    arrival_ms = get_direct_sound_arrival(audio, sample_rate, as_milliseconds=True)
+def read_recording(
+    recording: Union[Path, dict],
+    dtype: type = np.float64,
+    max_seconds: Optional[float] = None,
+    decoded_cache: Optional[DecodedCache] = None,
+) -> Union[RIRAnalysis, Tuple[np.ndarray, float]]:
+    """Decode what the parameters of a recording need, and nothing else.
+
+    Args:
+        recording (Path | dict): a file path or a dict of capsule paths.
+        dtype (type): the dtype samples are decoded to, np.float64 or np.float32.
+        max_seconds (float, optional): how much of the start of each A-format file to
+            read; whole files are read when omitted.
+        decoded_cache (DecodedCache, optional): where to memory-map the float32
+            samples of the recording from, instead of decoding it; `dtype` is then
+            ignored.
+
+    Returns:
+        RIRAnalysis | Tuple[np.ndarray, float]: for a file, its analysis from the
+            direct sound on; for an A-format group, its (4, n) capsule signals and
+            sample rate, or the analysis of its B-format signals when they come from
+            `decoded_cache`.
+    """
+    with tracing.span("read_recording", file=recording_name(recording)) as counters:
+        if decoded_cache is not None and isinstance(recording, dict):
+            signals, sample_rate = decoded_cache.bformat(
+                [recording[capsule] for capsule in aformat_capsules]
+            )
+            if max_seconds is not None:
+                signals = signals[:, : round(max_seconds * sample_rate)]
+            decoded = RIRAnalysis(signals, sample_rate)
+        elif decoded_cache is not None:
+            signals, sample_rate = decoded_cache.recording(recording)
+            decoded = rir_from_onset(signals, sample_rate, seconds_after_onset=2)
+            signals = decoded.rir
+        elif isinstance(recording, dict):
+            decoded = read_aformat(
+                [recording[capsule] for capsule in aformat_capsules],
+                dtype=dtype,
+                max_seconds=max_seconds,
+            )
+            signals, sample_rate = decoded
+        else:
+            # DR integrates up to 2 s after the direct sound, so nothing later is read
+            decoded = read_rir_from_onset(recording, seconds_after_onset=2, dtype=dtype)
+            signals, sample_rate = decoded.rir, decoded.sample_rate
+        counters["samples"] = signals.size
+        counters["audio_seconds"] = signals.shape[-1] / sample_rate
+    return decoded
+
+
+def recording_name(recording: Union[Path, dict]) -> str:
+    """Name a recording in traces: its path, or the path of its first capsule."""
+    if isinstance(recording, dict):
+        return str(recording[aformat_capsules[0]])
+    return str(recording)
+
+
+def _decoded_nbytes(decoded: Union[RIRAnalysis, Tuple[np.ndarray, float]]) -> int:
+    if isinstance(decoded, RIRAnalysis):
+        return decoded.rir.nbytes
+    return decoded[0].nbytes
+
+
+def extract_acoustical_parameters_omni(
+    file_path: Path,
+    analysis: Optional[RIRAnalysis] = None,
+    uncertainty_draws: int = 0,
+):
+    if analysis is None:
+        analysis = read_recording(file_path)
+    dr_ratio = direct_reverberant_ratio(analysis)
+    arrival_ms = samples_to_ms(
+        analysis.file_onset + analysis.direct_sound_arrival, analysis.sample_rate
+    )
     file_name = str(file_path).split("/")[-1]
     return {
         "position_id": extract_mic_number(file_name),
@@ -67,35 +166,46 @@ def extract_acoustical_parameters_omni(file_path: Path):
         "file_name": file_name,
         "dr_ratio": dr_ratio,
         "direct_sound_arrival_ms": arrival_ms,
+        **intervals(
+            analysis,
+            file_name,
+            uncertainty_draws,
+            lateral_channel=None,
+            noise_source=file_path,
+        ),
     }
 
 
-def extract_acoustical_parameters_ambi(aformat_dict: dict):
+def extract_acoustical_parameters_ambi(
+    aformat_dict: dict,
+    decoded: Optional[Union[RIRAnalysis, Tuple[np.ndarray, float]]] = None,
+    uncertainty_draws: int = 0,
+):
     """_summary_
 
     Args:
         aformat_dict (dict): a dictionary with A-format capsule names as keys and filepath as value
+        decoded (RIRAnalysis | Tuple[np.ndarray, float], optional): the output of
+            `read_recording` for `aformat_dict`, read here when omitted.
+        uncertainty_draws (int): how many perturbations of the RIR to draw for the
+            confidence intervals of LF and DR, see `intervals`; 0 skips them.
 
     Returns
         No sé
     """
-    aformat_rirs, sample_rate = read_aformat(
-        [
-            # 1. front left up
-            # 2. front right down
-            # 3. back left down
-            # 4. back right up
-            aformat_dict["front_left_up"],
-            aformat_dict["front_right_down"],
-            aformat_dict["back_left_down"],
-            aformat_dict["back_right_up"],
-        ]
-    )
-    bformat_rir = convert_ambisonics_a_to_b(*[aformat_rirs[i, :] for i in range(4)])
-    lf_early = lateral_fraction_early(bformat_rir, sample_rate)
-    lf_late = lateral_fraction_late(bformat_rir, sample_rate)
-    dr_ratio = direct_reverberant_ratio(bformat_rir[0, :], sample_rate)
-    direct_sound_arrival_ms = get_direct_sound_arrival(bformat_rir[0, :], sample_rate)
+    if decoded is None:
+        decoded = read_recording(aformat_dict)
+    if isinstance(decoded, RIRAnalysis):
+        # Already converted to B-format by the decoded cache
+        analysis = decoded
+    else:
+        aformat_rirs, sample_rate = decoded
+        bformat_rir = convert_ambisonics_a_to_b_batch(aformat_rirs, out=aformat_rirs)
+        analysis = RIRAnalysis(bformat_rir, sample_rate)
+    lf_early = lateral_fraction_early(analysis)
+    lf_late = lateral_fraction_late(analysis)
+    dr_ratio = direct_reverberant_ratio(analysis)
+    direct_sound_arrival_ms = get_direct_sound_arrival(analysis, as_milliseconds=True)
     return {
         "measurement_id": aformat_dict["measurement_id"],
         "processing_type": "ambi",
@@ -104,90 +214,278 @@ def extract_acoustical_parameters_ambi(aformat_dict: dict):
         "lf_late": lf_late,
         "dr_ratio": dr_ratio,
         "direct_sound_arrival_ms": direct_sound_arrival_ms,
+        **intervals(
+            analysis, ",".join(sorted(aformat_dict["files"])), uncertainty_draws
+        ),
     }
 
 
-def merge_soundfield_mics(file_list: List[str], base_directory: Path = None):
-    pattern = r"^(?P<mic_type>[a-zA-Z]+)\s(?P<mic_number>[1-4])+-(?P<position_id>[0-9]{1,2})[a-zA-Z0-9_-]*.wav"
-    aformat_files = dict()
-    mic_number_to_direction = {
-        "1": "front_left_up",
-        "2": "front_right_down",
-        "3": "back_left_down",
-        "4": "back_right_up",
-    }
-    for filename in file_list:
-        match = re.match(pattern, filename)
-        if match:
-            match_group_dict = match.groupdict()
-            mic_type = match_group_dict["mic_type"]
-            position_id = match_group_dict["position_id"]
-            if mic_type.lower() != "soundfield":
-                continue
-            mic_capsule = mic_number_to_direction[match_group_dict["mic_number"]]
-            if position_id not in set(aformat_files.keys()):
-                aformat_files[position_id] = {
-                    "measurement_id": position_id,
-                    "files": [filename],
-                }
-            aformat_files[position_id].update(
-                {
-                    mic_capsule: filename
-                    if not base_directory
-                    else base_directory / filename,
-                    "files": set(
-                        list(aformat_files[position_id]["files"]) + [filename]
-                    ),
-                }
-            )
-    return aformat_files
+def intervals(
+    analysis: RIRAnalysis,
+    name: str,
+    draws: int,
+    lateral_channel: Optional[int] = 2,
+    noise_source: Optional[Path] = None,
+) -> Dict[str, float]:
+    """Compute the confidence intervals of the parameters of a recording.
+
+    The draws are seeded by the name of the recording, so its intervals do not depend
+    on which worker computes them or in which order. Earthworks files are read from
+    their onset on, so no draw can move it earlier and their DR intervals mostly widen
+    upwards. As only 2 s after the onset are read, their noise floor is measured on
+    the tail of the file, given as `noise_source`.
+
+    Args:
+        analysis (RIRAnalysis): the analysis the parameters were computed on.
+        name (str): the file name of the recording.
+        draws (int): how many perturbations to draw; 0 computes nothing.
+        lateral_channel (int, optional): see `analysis_lf_and_dr_uncertainty`.
+        noise_source (Path, optional): the file to measure the noise floor of the omni
+            channel on, see `file_noise_power`. The tail of the analysis when omitted.
+
+    Returns:
+        Dict[str, float]: the limits of the intervals under the keys of
+            `interval_dtypes`, or nothing when `draws` is 0.
+    """
+    if draws == 0:
+        return {}
+    with tracing.span("uncertainty", draws=draws):
+        results = analysis_lf_and_dr_uncertainty(
+            analysis,
+            draws,
+            lateral_channel=lateral_channel,
+            seed=zlib.crc32(name.encode()),
+            omni_noise_power=None
+            if noise_source is None
+            else file_noise_power(noise_source),
+        )
+    return {key: value for key, value in results.items() if key in interval_dtypes}
 
 
 def extract_mic_number(file_name: str) -> str:
-    pattern = r"Earthworks\s(?P<mic_number>[0-9])+-[a-zA-Z0-9_-]+.wav"
-    match = re.match(pattern, file_name)
-    if match:
-        match_group_dict = match.groupdict()
-        mic_number = match_group_dict["mic_number"]
-        return mic_number
+    parsed = parse_recording_name(file_name)
+    if parsed["mic_type"] == "earthworks":
+        return str(parsed["mic_number"])
+
+
+def map_omni_result_to_row(omni_result: dict, measurement_id: str) -> dict:
+    return {
+        "measurement": measurement_id,
+        "processing_type": "omni",
+        "filename": omni_result["file_name"],
+        "filepath": str(omni_result["file_path"]),
+        "direct_sound_arrival_ms": omni_result["direct_sound_arrival_ms"],
+        "lf_early": None,
+        "lf_late": None,
+        "dr_ratio": omni_result["dr_ratio"],
+        **interval_columns(omni_result),
+    }
+
+
+def map_ambi_result_to_row(ambi_result: dict, measurement_id: str) -> dict:
+    return {
+        "measurement": measurement_id,
+        "processing_type": "ambi",
+        "filename": ",".join(sorted(ambi_result["files"])),
+        "filepath": ",".join(sorted(ambi_result["files"])),
+        "direct_sound_arrival_ms": ambi_result["direct_sound_arrival_ms"],
+        "lf_early": ambi_result["lf_early"],
+        "lf_late": ambi_result["lf_late"],
+        "dr_ratio": ambi_result["dr_ratio"],
+        **interval_columns(ambi_result),
+    }
+
+
+def interval_columns(result: dict) -> dict:
+    return {name: result[name] for name in interval_dtypes if name in result}
+
+
+# Version of the published results, bumped whenever they change on purpose (see the
+# README). 2: onsets are detected as in ISO 3382-1 instead of at the first peak.
+parameters_version = 2
+
+
+def parameters_code_version() -> str:
+    """Hash the code the parameters come from, so cached results expire when it changes.
+
+    Returns:
+        str: a hex digest of `parameters_version`, this script and the modules it
+            computes parameters with.
+    """
+    digest = hashlib.sha256(str(parameters_version).encode())
+    for module_file in (
+        __file__,
+        plotting.acoustical_parameters.__file__,
+        plotting.acoustical_parameters.uncertainty.__file__,
+        plotting.utils.__file__,
+    ):
+        digest.update(Path(module_file).read_bytes())
+    return digest.hexdigest()
+
+
+def _json_default(value):
+    if isinstance(value, Path):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError("Cannot store {} in the result cache".format(type(value)))
+
 
+class ResultCache:
+    """Results of past runs, stored in a JSON-lines file as they are computed.
 
-def map_omni_result_to_row(omni_result: dict, measurement_id: str) -> pd.Series:
-    return pd.Series(
+    Each line holds the key of one recording (one file or one A-format group) and its
+    parameters. A key covers the path of every file of the recording, its size and
+    modification time or its content hash, and `parameters_code_version`, so editing a
+    recording or the code makes its entry miss. Lines are appended and flushed one at a
+    time, which makes an interrupted run resumable; a truncated last line is ignored.
+
+    Args:
+        path (Path): the cache file, created when missing.
+        hash_contents (bool): whether to key files by a hash of their content instead
+            of their size and modification time.
+    """
+
+    def __init__(self, path: Path, hash_contents: bool = False):
+        self.path = Path(path)
+        self.hash_contents = hash_contents
+        self.code_version = parameters_code_version()
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path) as cache_file:
+                for line in cache_file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.entries[entry["key"]] = entry["result"]
+
+    def _file_key(self, file_path: Path) -> str:
+        file_path = Path(file_path).resolve()
+        if self.hash_contents:
+            digest = hashlib.sha256()
+            with open(file_path, "rb") as audio_file:
+                for block in iter(lambda: audio_file.read(1 << 20), b""):
+                    digest.update(block)
+            return "{}:{}".format(file_path, digest.hexdigest())
+        stat = file_path.stat()
+        return "{}:{}:{}".format(file_path, stat.st_size, stat.st_mtime_ns)
+
+    def key(
+        self,
+        recording: Union[Path, dict],
+        dtype: type = np.float64,
+        max_seconds: Optional[float] = None,
+        uncertainty_draws: int = 0,
+    ) -> str:
+        """Compute the cache key of a recording.
+
+        Args:
+            recording (Path | dict): a file path or a dict of capsule paths.
+            dtype (type): the precision the recording is decoded in.
+            max_seconds (float, optional): how much of each A-format file is read.
+            uncertainty_draws (int): how many draws its confidence intervals take.
+
+        Returns:
+            str: a hex digest identifying the recording and the parameter code.
+        """
+        if isinstance(recording, dict):
+            file_paths = [recording[capsule] for capsule in aformat_capsules]
+        else:
+            file_paths = [recording]
+        digest = hashlib.sha256(self.code_version.encode())
+        for file_path in file_paths:
+            digest.update(self._file_key(file_path).encode())
+        if np.dtype(dtype) != np.float64 or max_seconds is not None:
+            # Reduced-precision or truncated reads give other results than the
+            # default, exact whole-file ones, which need no extra field
+            digest.update("{}:{}".format(np.dtype(dtype), max_seconds).encode())
+        if uncertainty_draws:
+            digest.update("uncertainty:{}".format(uncertainty_draws).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        return self.entries.get(key)
+
+    def put(self, key: str, result: dict):
+        """Store a result and append it to the cache file right away."""
+        line = json.dumps({"key": key, "result": result}, default=_json_default)
+        self.entries[key] = json.loads(line)["result"]
+        with open(self.path, "a") as cache_file:
+            cache_file.write(line + "\n")
+            cache_file.flush()
+            os.fsync(cache_file.fileno())
+
+
+def results_to_dataframe(rows: Iterable[dict]) -> pd.DataFrame:
+    """Gather result rows column by column and build the results table once.
+
+    Appending to per-column lists is amortised O(1), and every column gets its dtype in
+    `results_dtypes` only when the table is built, with None becoming NaN.
+
+    Args:
+        rows (Iterable[dict]): outputs of `map_acoustical_parameters_to_row`.
+
+    Returns:
+        pd.DataFrame: one row per recording, with the columns of `results_dtypes`,
+            followed by those of `interval_dtypes` when some row has them.
+    """
+    dtypes = {**results_dtypes, **interval_dtypes}
+    columns = {name: [] for name in dtypes}
+    for row in rows:
+        for name, values in columns.items():
+            values.append(row.get(name))
+    return pd.DataFrame(
         {
-            "measurement": measurement_id,
-            "processing_type": "omni",
-            "filename": omni_result["file_name"],
-            "filepath": omni_result["file_path"],
-            "direct_sound_arrival_ms": omni_result["direct_sound_arrival_ms"],
-            "lf_early": None,
-            "lf_late": None,
-            "dr_ratio": omni_result["dr_ratio"],
+            name: pd.Series(values, dtype=dtypes[name])
+            for name, values in columns.items()
+            if name in results_dtypes or any(value is not None for value in values)
         }
     )
 
 
-def map_ambi_result_to_row(ambi_result: dict, measurement_id: str) -> pd.Series:
-    return pd.Series(
-        {
-            "measurement": measurement_id,
-            "processing_type": "ambi",
-            "filename": ",".join(ambi_result["files"]),
-            "filepath": ",".join(ambi_result["files"]),
-            "direct_sound_arrival_ms": ambi_result["direct_sound_arrival_ms"],
-            "lf_early": ambi_result["lf_early"],
-            "lf_late": ambi_result["lf_late"],
-            "dr_ratio": ambi_result["dr_ratio"],
-        }
+def recordings_to_dataframe(
+    recordings: List[Tuple[str, Union[Path, dict], Optional[int]]],
+    all_acoustical_parameters: List[dict],
+) -> pd.DataFrame:
+    """Build the results table of the output of `collect_recordings`.
+
+    Args:
+        recordings (List[Tuple[str, Path | dict, int | None]]): the recordings, as
+            `collect_recordings` returns them.
+        all_acoustical_parameters (List[dict]): the parameters of each recording.
+
+    Returns:
+        pd.DataFrame: one row per recording, with the columns of `results_dtypes`.
+    """
+    return results_to_dataframe(
+        dict(
+            map_acoustical_parameters_to_row(acoustical_parameters, measurement_id),
+            integration_time=integration_time,
+        )
+        for (measurement_id, _, integration_time), acoustical_parameters in zip(
+            recordings, all_acoustical_parameters
+        )
     )
 
 
-def extract_acoustical_parameters(recording: Union[Path, dict]) -> pd.Series:
-    print("Processing {}".format(recording))
+def extract_acoustical_parameters(
+    recording: Union[Path, dict],
+    decoded: Optional[Union[RIRAnalysis, Tuple[np.ndarray, float]]] = None,
+    uncertainty_draws: int = 0,
+) -> dict:
     if isinstance(recording, dict):
-        return extract_acoustical_parameters_ambi(recording)
+        with tracing.span("analyse", file=recording_name(recording)):
+            return extract_acoustical_parameters_ambi(
+                recording, decoded, uncertainty_draws
+            )
     elif isinstance(recording, Path):
-        return extract_acoustical_parameters_omni(recording)
+        with tracing.span("analyse", file=recording_name(recording)):
+            return extract_acoustical_parameters_omni(
+                recording, decoded, uncertainty_draws
+            )
     else:
         raise ValueError(
             "Expected an argument of type dict or Path, not {}".format(type(recording))
@@ -196,7 +494,7 @@ def extract_acoustical_parameters(recording: Union[Path, dict]) -> pd.Series:
 
 def map_acoustical_parameters_to_row(
     acoustical_parameters: dict, measurement_id: str
-) -> pd.Series:
+) -> dict:
     if acoustical_parameters["processing_type"] == "ambi":
         dataframe_row = map_ambi_result_to_row(acoustical_parameters, measurement_id)
         return dataframe_row
@@ -205,50 +503,724 @@ def map_acoustical_parameters_to_row(
         return dataframe_row
 
 
-def extract_measurement_number(string: str) -> str:
-    pattern = r".*medicion([0-9]+)"
-    match = re.match(pattern, string)
-    if match is None:
-        print("WARNING: could not find numbers in string {}".format(string))
-        return string
-    return match.groups()[0]
+def collect_recordings(
+    input_directory: Path, catalog_path: Optional[Path] = None
+) -> List[Tuple[str, Union[Path, dict], Optional[int]]]:
+    """Find every Earthworks file and SoundField A-format group under a campaign.
 
+    The campaign is indexed into a `MeasurementCatalog`, which only opens new or changed
+    files, and the recordings are queried from it.
 
-for i, walk_tuple in enumerate(os.walk(input_directory)):
-    if i == 0:
-        measurements = walk_tuple[1]
-        print(f"Measurements:\n{measurements}")
-        continue
-
-    if len(walk_tuple[-1]) > 0:
-        measurement_id = extract_measurement_number(walk_tuple[0])
+    Args:
+        input_directory (Path): the campaign, with one subdirectory per measurement.
+        catalog_path (Path, optional): the catalog database. Defaults to catalog.sqlite
+            in `input_directory`.
 
-        soundfield_mics = [
-            capsules_dict
-            for capsules_dict in merge_soundfield_mics(
-                walk_tuple[-1],
-                Path(walk_tuple[0]),
-            ).values()
+    Returns:
+        List[Tuple[str, Path | dict, int | None]]: the measurement id, the recording (a
+            file path or a dict of capsule paths) and its integration-time variant, in
+            directory order with the Earthworks files of a directory first.
+    """
+    with MeasurementCatalog(
+        catalog_path or Path(input_directory) / "catalog.sqlite"
+    ) as catalog:
+        indexed, unchanged, removed = catalog.update(input_directory)
+        print(
+            "Catalog: {} files indexed, {} unchanged, {} removed".format(
+                indexed, unchanged, removed
+            )
+        )
+        recordings = [
+            (
+                row["directory"],
+                0,
+                row["measurement_id"],
+                Path(row["path"]),
+                row["integration_time"],
+            )
+            for row in catalog.recordings(input_directory, mic_type="earthworks")
         ]
-        other_mics = [
-            Path(walk_tuple[0]) / filename
-            for filename in walk_tuple[-1]
-            if "Earthworks" in filename
+        directory_measurements = {
+            row["directory"]: row["measurement_id"]
+            for row in catalog.recordings(input_directory, mic_type="soundfield")
+        }
+        recordings += [
+            (
+                group["directory"],
+                1,
+                directory_measurements[group["directory"]],
+                group,
+                group["integration_time"],
+            )
+            for group in catalog.aformat_groups(input_directory)
         ]
-        all_mics: list = other_mics + soundfield_mics
-        # print("All mics:")
-        # [print("{}".format(str(mic))) for mic in all_mics]
-
-        # results_awaitable = processing_pool.map_async(extract_acoustical_parameters, all_mics)
-        # for mic_parameters_result in results_awaitable.get():
-        #     results_df = pd.concat(results_df, mic_parameters_result)
-        for mic in all_mics:
-            acoustical_parameters = extract_acoustical_parameters(mic)
-            row = map_acoustical_parameters_to_row(
-                acoustical_parameters, measurement_id
+    recordings.sort(key=lambda recording: recording[:2])
+    return [recording[2:] for recording in recordings]
+
+
+def extract_prefetched(
+    indexed_recordings: List[Tuple[int, Union[Path, dict]]],
+    prefetch_depth: int = default_prefetch_depth,
+    max_buffered_bytes: Optional[int] = None,
+    stats: Optional[Dict[str, float]] = None,
+    dtype: type = np.float64,
+    max_seconds: Optional[float] = None,
+    decoded_cache: Optional[DecodedCache] = None,
+    uncertainty_draws: int = 0,
+) -> Iterator[Tuple[int, dict]]:
+    """Extract the parameters of recordings while the next ones are read in background.
+
+    Args:
+        indexed_recordings (List[Tuple[int, Path | dict]]): recordings and their index.
+        prefetch_depth (int): how many recordings to read ahead; 0 reads each one only
+            when it is analysed.
+        max_buffered_bytes (int, optional): memory budget for recordings read ahead.
+        stats (Dict[str, float], optional): accumulates the "read_seconds" and
+            "stall_seconds" of `prefetch` and the "compute_seconds" of the analysis.
+        dtype (type): see `read_recording`.
+        max_seconds (float, optional): see `read_recording`.
+        decoded_cache (DecodedCache, optional): see `read_recording`.
+        uncertainty_draws (int): see `extract_acoustical_parameters_ambi`.
+
+    Yields:
+        Tuple[int, dict]: the index of each recording and its parameters, in order.
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault("compute_seconds", 0.0)
+    for (index, recording), decoded in prefetch(
+        indexed_recordings,
+        lambda indexed_recording: read_recording(
+            indexed_recording[1], dtype, max_seconds, decoded_cache
+        ),
+        prefetch_depth,
+        max_buffered_bytes,
+        _decoded_nbytes,
+        stats,
+    ):
+        start = perf_counter()
+        acoustical_parameters = extract_acoustical_parameters(
+            recording, decoded, uncertainty_draws
+        )
+        stats["compute_seconds"] += perf_counter() - start
+        # Free the recording before the next one is read
+        del decoded
+        yield index, acoustical_parameters
+
+
+# Where pool workers send each result as soon as it is computed, set by
+# `_share_result_queue` when the pool starts
+_result_queue: Optional[Queue] = None
+
+
+def _share_result_queue(result_queue: Queue):
+    global _result_queue
+    _result_queue = result_queue
+
+
+def _extract_chunk(
+    task: Tuple[
+        List[Tuple[int, Union[Path, dict]]],
+        int,
+        Optional[int],
+        type,
+        Optional[float],
+        Optional[DecodedCache],
+        int,
+        bool,
+        bool,
+    ]
+) -> Tuple[Dict[str, float], List[dict]]:
+    (
+        indexed_recordings,
+        prefetch_depth,
+        max_buffered_bytes,
+        dtype,
+        max_seconds,
+        decoded_cache,
+        uncertainty_draws,
+        trace,
+        trace_memory,
+    ) = task
+    tracing.enable(trace, trace_memory)
+    stats = {}
+    for indexed_result in extract_prefetched(
+        indexed_recordings,
+        prefetch_depth,
+        max_buffered_bytes,
+        stats,
+        dtype,
+        max_seconds,
+        decoded_cache,
+        uncertainty_draws,
+    ):
+        _result_queue.put(indexed_result)
+    return stats, tracing.collect_events()
+
+
+def plan_for_campaign(
+    input_directory: Path,
+    max_bytes: int,
+    processes: int,
+    prefetch_depth: int,
+    catalog_path: Optional[Path] = None,
+) -> ExecutionPlan:
+    """Plan the run of an indexed campaign within a memory budget.
+
+    Args:
+        input_directory (Path): the campaign, already indexed by `collect_recordings`.
+        max_bytes (int): the budget for the peak RSS of all processes together.
+        processes (int): the most worker processes to use.
+        prefetch_depth (int): how many recordings each worker should read ahead.
+        catalog_path (Path, optional): see `collect_recordings`.
+
+    Returns:
+        ExecutionPlan: the output of `plan_execution` for the files of the campaign.
+    """
+    with MeasurementCatalog(
+        catalog_path or Path(input_directory) / "catalog.sqlite"
+    ) as catalog:
+        rows = catalog.recordings(input_directory)
+    return plan_execution(rows, max_bytes, processes, prefetch_depth)
+
+
+def print_memory_report(plan: ExecutionPlan):
+    """Compare the peak RSS of the run with what its plan expected."""
+    main_peak = tracing.peak_rss_bytes()
+    if main_peak is None:
+        print("Peak RSS is not available on this platform")
+        return
+    worker_peak = 0 if plan.processes == 1 else tracing.peak_rss_bytes(children=True)
+    # Worker peaks need not coincide, so this is an upper bound of the real total
+    total_peak = main_peak + plan.processes * worker_peak
+    print(
+        "Peak RSS: {:.0f} MB in this process, {:.0f} MB in the largest worker, "
+        "at most {:.0f} MB together; planned {:.0f} MB of a {:.0f} MB budget".format(
+            main_peak / 2**20,
+            worker_peak / 2**20,
+            total_peak / 2**20,
+            plan.estimated_bytes / 2**20,
+            plan.max_bytes / 2**20,
+        )
+    )
+    if total_peak > plan.max_bytes:
+        print("WARNING: the run may have gone over its memory budget")
+
+
+def print_timings(stats: Dict[str, float]):
+    """Report how much time went to reading, waiting for reads and computing."""
+    print(
+        "Decoding took {:.2f} s, of which {:.2f} s stalled the analysis; "
+        "computing took {:.2f} s".format(
+            stats.get("read_seconds", 0.0),
+            stats.get("stall_seconds", 0.0),
+            stats.get("compute_seconds", 0.0),
+        )
+    )
+
+
+def extract_all_acoustical_parameters(
+    recordings: List[Union[Path, dict]],
+    processes: int = default_processes,
+    chunksize: Optional[int] = None,
+    cache: Optional[ResultCache] = None,
+    prefetch_depth: int = default_prefetch_depth,
+    max_buffered_bytes: Optional[int] = None,
+    dtype: type = np.float64,
+    max_seconds: Optional[float] = None,
+    decoded_cache: Optional[DecodedCache] = None,
+    uncertainty_draws: int = 0,
+) -> List[dict]:
+    """Extract the parameters of many recordings on a process pool.
+
+    Workers receive file paths only and decode the audio themselves, reading the next
+    recordings of their chunk on background threads while they analyse the current
+    one. Results arrive in completion order and are put back in the order of
+    `recordings`. The time spent decoding, stalled on decoding and computing, summed
+    over workers, is printed at the end. When tracing is enabled, the spans recorded
+    by the workers are gathered into this process.
+
+    Args:
+        recordings (List[Path | dict]): file paths or dicts of capsule paths.
+        processes (int): how many worker processes to use; 1 runs in this process.
+        chunksize (int, optional): how many recordings each worker takes at a time.
+            Defaults to spreading them in about 4 chunks per worker.
+        cache (ResultCache, optional): where to look up results of past runs and to
+            checkpoint new ones as soon as each is computed.
+        prefetch_depth (int): how many recordings each worker reads ahead.
+        max_buffered_bytes (int, optional): memory budget of each worker for
+            recordings read ahead.
+        dtype (type): the precision recordings are decoded in, see `read_recording`.
+        max_seconds (float, optional): how much of each A-format file is read.
+        decoded_cache (DecodedCache, optional): where to memory-map decoded recordings
+            from, see `read_recording`.
+        uncertainty_draws (int): how many perturbations of each RIR to draw for the
+            confidence intervals of its parameters; 0 skips them.
+
+    Returns:
+        List[dict]: the parameters of each recording, in the order of `recordings`.
+    """
+    results = [None] * len(recordings)
+    keys = [None] * len(recordings)
+    pending = []
+    for index, recording in enumerate(recordings):
+        if cache is not None:
+            keys[index] = cache.key(recording, dtype, max_seconds, uncertainty_draws)
+            results[index] = cache.get(keys[index])
+        if results[index] is None:
+            pending.append((index, recording))
+    if cache is not None:
+        print(
+            "Reusing {} cached results, processing {} recordings".format(
+                len(recordings) - len(pending), len(pending)
+            )
+        )
+    else:
+        print("Processing {} recordings".format(len(pending)))
+
+    def store(index: int, acoustical_parameters: dict):
+        results[index] = acoustical_parameters
+        if cache is not None:
+            cache.put(keys[index], acoustical_parameters)
+
+    stats = {}
+    if processes == 1 or len(pending) <= 1:
+        for index, acoustical_parameters in extract_prefetched(
+            pending,
+            prefetch_depth,
+            max_buffered_bytes,
+            stats,
+            dtype,
+            max_seconds,
+            decoded_cache,
+            uncertainty_draws,
+        ):
+            store(index, acoustical_parameters)
+        print_timings(stats)
+        return results
+    if chunksize is None:
+        chunksize = max(1, -(-len(pending) // (4 * processes)))
+
+    tasks = [
+        (
+            pending[start : start + chunksize],
+            prefetch_depth,
+            max_buffered_bytes,
+            dtype,
+            max_seconds,
+            decoded_cache,
+            uncertainty_draws,
+            tracing.is_enabled(),
+            tracing.is_tracing_memory(),
+        )
+        for start in range(0, len(pending), chunksize)
+    ]
+    # Workers send every result back as soon as it is computed, so it is stored (and
+    # checkpointed) without waiting for the rest of its chunk
+    result_queue = Queue()
+    with Pool(processes, _share_result_queue, (result_queue,)) as pool:
+        chunks = pool.map_async(_extract_chunk, tasks, chunksize=1)
+        for _ in range(len(pending)):
+            while True:
+                try:
+                    store(*result_queue.get(timeout=1))
+                    break
+                except Empty:
+                    if chunks.ready() and not chunks.successful():
+                        chunks.get()
+        for chunk_stats, chunk_events in chunks.get():
+            for name, seconds in chunk_stats.items():
+                stats[name] = stats.get(name, 0.0) + seconds
+            tracing.record_events(chunk_events)
+    print_timings(stats)
+    return results
+
+
+def recording_to_json(recording: Union[Path, dict]) -> Union[str, dict]:
+    """Describe a recording with JSON types, for a work unit."""
+    if isinstance(recording, dict):
+        return {
+            "measurement_id": recording["measurement_id"],
+            "files": sorted(recording["files"]),
+            **{capsule: str(recording[capsule]) for capsule in aformat_capsules},
+        }
+    return str(recording)
+
+
+def recording_from_json(description: Union[str, dict]) -> Union[Path, dict]:
+    """Rebuild a recording from the output of `recording_to_json`."""
+    if isinstance(description, dict):
+        return {
+            "measurement_id": description["measurement_id"],
+            "files": set(description["files"]),
+            **{capsule: Path(description[capsule]) for capsule in aformat_capsules},
+        }
+    return Path(description)
+
+
+def enqueue_campaign(
+    input_directory: Path, queue: WorkQueue, catalog_path: Optional[Path] = None
+) -> int:
+    """Fill a work queue with one unit per Earthworks file or A-format group.
+
+    Args:
+        input_directory (Path): the campaign, with one subdirectory per measurement.
+        queue (WorkQueue): an empty queue.
+        catalog_path (Path, optional): see `collect_recordings`.
+
+    Returns:
+        int: how many units were enqueued.
+    """
+    recordings = collect_recordings(input_directory, catalog_path)
+    return queue.enqueue(
+        (
+            "{:06d}".format(index),
+            {
+                "measurement_id": measurement_id,
+                "integration_time": integration_time,
+                "recording": recording_to_json(recording),
+            },
+        )
+        for index, (measurement_id, recording, integration_time) in enumerate(
+            recordings
+        )
+    )
+
+
+def work_on_queue(
+    queue_directory: Path,
+    lease_seconds: float = 600,
+    prefetch_depth: int = default_prefetch_depth,
+    max_buffered_bytes: Optional[int] = None,
+    decoded_cache: Optional[DecodedCache] = None,
+    uncertainty_draws: int = 0,
+    poll_seconds: float = 5,
+) -> int:
+    """Process units from a shared queue until it is drained, as one node.
+
+    Once nothing is pending, the node waits for the units other nodes hold, and
+    takes over those whose lease expires, so the work of a crashed node gets done.
+
+    Args:
+        queue_directory (Path): the directory of the `WorkQueue`.
+        lease_seconds (float): how long a claimed unit is held before other nodes may
+            take it over.
+        prefetch_depth (int): how many units to claim and read ahead.
+        max_buffered_bytes (int, optional): memory budget for units read ahead.
+        decoded_cache (DecodedCache, optional): where to memory-map decoded
+            recordings from, see `read_recording`.
+        uncertainty_draws (int): see `extract_all_acoustical_parameters`.
+        poll_seconds (float): how often to look at the units other nodes hold.
+
+    Returns:
+        int: how many units this node processed.
+    """
+    queue = WorkQueue(queue_directory, lease_seconds)
+    node_id = queue.node_id
+    stats = {}
+    processed = 0
+    while True:
+        units = (
+            (unit_id, recording_from_json(unit["recording"]))
+            for unit_id, unit in queue.drain()
+        )
+        for unit_id, acoustical_parameters in extract_prefetched(
+            units,
+            prefetch_depth,
+            max_buffered_bytes,
+            stats,
+            np.float32 if decoded_cache is not None else np.float64,
+            None,
+            decoded_cache,
+            uncertainty_draws,
+        ):
+            queue.complete(unit_id, acoustical_parameters, node_id, _json_default)
+            processed += 1
+        if queue.is_done():
+            break
+        print("{} waiting for units held by other nodes".format(node_id))
+        sleep(poll_seconds)
+    print("{} processed {} units".format(node_id, processed))
+    print_timings(stats)
+    return processed
+
+
+def _work_on_queue_task(arguments: tuple) -> int:
+    return work_on_queue(*arguments)
+
+
+def merge_queue_results(queue: WorkQueue) -> pd.DataFrame:
+    """Combine the shard outputs of a drained queue into the results table.
+
+    Args:
+        queue (WorkQueue): a queue filled by `enqueue_campaign`.
+
+    Returns:
+        pd.DataFrame: the same table a single-machine run writes, in enqueue order.
+    """
+    results = queue.results()
+    rows = []
+    missing = 0
+    for unit_id, unit in queue.units():
+        if unit_id not in results:
+            missing += 1
+            continue
+        rows.append(
+            dict(
+                map_acoustical_parameters_to_row(
+                    results[unit_id], unit["measurement_id"]
+                ),
+                integration_time=unit["integration_time"],
             )
-            results_df = pd.concat(
-                [results_df, row.to_frame().T], axis=0, ignore_index=True
+        )
+    if missing:
+        print("WARNING: {} units have no result yet".format(missing))
+    return results_to_dataframe(rows)
+
+
+def main():
+    argument_parser = ArgumentParser(description=__doc__)
+    argument_parser.add_argument("input_directory", nargs="?")
+    argument_parser.add_argument(
+        "--processes",
+        type=int,
+        default=default_processes,
+        help=f"worker processes to use (default: {default_processes})",
+    )
+    argument_parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=None,
+        help="recordings handed to a worker at a time",
+    )
+    argument_parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=default_prefetch_depth,
+        help="recordings each worker reads ahead (default: {}, 0 disables it)".format(
+            default_prefetch_depth
+        ),
+    )
+    argument_parser.add_argument(
+        "--prefetch-memory",
+        type=float,
+        default=None,
+        help="MB each worker may hold in recordings read ahead (default: unbounded)",
+    )
+    argument_parser.add_argument(
+        "--max-memory",
+        type=float,
+        default=None,
+        help="MB the whole run may take; lowers --processes and --prefetch, then the "
+        "sample precision, to fit it, and reports peak memory per stage",
+    )
+    argument_parser.add_argument(
+        "--catalog",
+        type=Path,
+        default=None,
+        help="catalog database (default: catalog.sqlite in the input directory)",
+    )
+    argument_parser.add_argument(
+        "--cache",
+        type=Path,
+        default=None,
+        help="result cache file (default: results_cache.jsonl in the input directory)",
+    )
+    argument_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="recompute every recording and leave the cache untouched",
+    )
+    argument_parser.add_argument(
+        "--hash-contents",
+        action="store_true",
+        help="key the cache by file content instead of size and modification time",
+    )
+    argument_parser.add_argument(
+        "--decoded-cache",
+        type=Path,
+        default=None,
+        help="directory of float32 .npy copies of the decoded recordings, filled on "
+        "first use and memory-mapped afterwards (default: decode every run)",
+    )
+    argument_parser.add_argument(
+        "--uncertainty",
+        type=int,
+        default=0,
+        metavar="DRAWS",
+        help="add confidence intervals of LF and DR to results.tsv, from this many "
+        "noise and onset perturbations of each RIR (default: 0, none)",
+    )
+    argument_parser.add_argument(
+        "--trace",
+        type=Path,
+        default=None,
+        help="record per-stage timings and write them as a Chrome trace here",
+    )
+    argument_parser.add_argument(
+        "--queue",
+        type=Path,
+        default=None,
+        help="shared work-queue directory for sharded runs",
+    )
+    queue_mode = argument_parser.add_mutually_exclusive_group()
+    queue_mode.add_argument(
+        "--enqueue",
+        action="store_true",
+        help="fill --queue with the recordings of the input directory",
+    )
+    queue_mode.add_argument(
+        "--work",
+        action="store_true",
+        help="drain --queue with --processes local nodes",
+    )
+    queue_mode.add_argument(
+        "--merge",
+        action="store_true",
+        help="write results.tsv from the shard outputs in --queue",
+    )
+    argument_parser.add_argument(
+        "--lease",
+        type=float,
+        default=600,
+        help="seconds a claimed unit is held before others take it over",
+    )
+    arguments = argument_parser.parse_args()
+    queue_mode_used = arguments.enqueue or arguments.work or arguments.merge
+    if queue_mode_used and arguments.queue is None:
+        argument_parser.error("--enqueue, --work and --merge need --queue")
+    if queue_mode_used and arguments.max_memory is not None:
+        argument_parser.error("--max-memory only plans runs on a single machine")
+    max_buffered_bytes = (
+        None
+        if arguments.prefetch_memory is None
+        else int(arguments.prefetch_memory * 2**20)
+    )
+    decoded_cache = (
+        None
+        if arguments.decoded_cache is None
+        else DecodedCache(arguments.decoded_cache)
+    )
+
+    if arguments.work:
+        node_arguments = (
+            arguments.queue,
+            arguments.lease,
+            arguments.prefetch,
+            max_buffered_bytes,
+            decoded_cache,
+            arguments.uncertainty,
+        )
+        if arguments.processes == 1:
+            work_on_queue(*node_arguments)
+        else:
+            with Pool(arguments.processes) as pool:
+                pool.map(_work_on_queue_task, [node_arguments] * arguments.processes, 1)
+        return
+
+    input_directory = arguments.input_directory
+    if input_directory is None:
+        input_directory = input(f"Input directory? [{default_directory}]: ")
+    input_directory = Path(
+        input_directory if input_directory != "" else default_directory
+    ).resolve()
+
+    if arguments.enqueue:
+        enqueued = enqueue_campaign(
+            input_directory, WorkQueue(arguments.queue), arguments.catalog
+        )
+        print("Enqueued {} units in {}".format(enqueued, arguments.queue))
+        return
+    if arguments.merge:
+        results_df = merge_queue_results(WorkQueue(arguments.queue))
+        results_df.to_csv(input_directory / "results.tsv", sep="\t", index=False)
+        return
+
+    cache = None
+    if not arguments.no_cache:
+        cache = ResultCache(
+            arguments.cache or input_directory / "results_cache.jsonl",
+            arguments.hash_contents,
+        )
+
+    tracing.enable(
+        arguments.trace is not None or arguments.max_memory is not None,
+        memory=arguments.max_memory is not None,
+    )
+    start = perf_counter()
+    recordings = collect_recordings(input_directory, arguments.catalog)
+    plan = None
+    processes, prefetch_depth = arguments.processes, arguments.prefetch
+    dtype, max_seconds = np.float64, None
+    if arguments.max_memory is not None:
+        try:
+            plan = plan_for_campaign(
+                input_directory,
+                int(arguments.max_memory * 2**20),
+                processes,
+                prefetch_depth,
+                arguments.catalog,
             )
+        except ValueError as error:
+            argument_parser.error(str(error))
+        print(plan.describe())
+        processes, prefetch_depth = plan.processes, plan.prefetch_depth
+        dtype, max_seconds = plan.dtype, plan.max_seconds
+    if decoded_cache is not None:
+        # The cache holds float32 samples, and results are cached as such
+        dtype = np.float32
+    all_acoustical_parameters = extract_all_acoustical_parameters(
+        [recording for _, recording, _ in recordings],
+        processes,
+        arguments.chunksize,
+        cache,
+        prefetch_depth,
+        max_buffered_bytes,
+        dtype,
+        max_seconds,
+        decoded_cache,
+        arguments.uncertainty,
+    )
+    results_df = recordings_to_dataframe(recordings, all_acoustical_parameters)
+    results_df.to_csv(input_directory / "results.tsv", sep="\t", index=False)
+    wall_seconds = perf_counter() - start
+    if arguments.trace is not None:
+        write_trace_report(arguments.trace, wall_seconds)
+    elif arguments.max_memory is not None:
+        print_stage_summary(tracing.collect_events(), wall_seconds)
+    if plan is not None:
+        print_memory_report(plan)
+
+
+def write_trace_report(trace_path: Path, wall_seconds: float):
+    """Export the spans of a traced run and print how each stage did.
+
+    The Chrome trace goes to `trace_path` and the per-file totals next to it, with a
+    _files.tsv suffix.
+
+    Args:
+        trace_path (Path): where to write the Chrome trace.
+        wall_seconds (float): how long the run took.
+    """
+    events = tracing.collect_events()
+    tracing.write_chrome_trace(trace_path, events)
+    tracing.summarize(
+        events, wall_seconds, by="file", stages=("read_recording", "analyse")
+    ).to_csv(
+        trace_path.with_name(trace_path.stem + "_files.tsv"),
+        sep="\t",
+        index_label="file",
+    )
+    print_stage_summary(events, wall_seconds)
+    print("Trace written to {}".format(trace_path))
+
+
+def print_stage_summary(events: List[dict], wall_seconds: float):
+    """Print the totals of every stage of a traced run."""
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(tracing.summarize(events, wall_seconds).round(4).to_string())
+    print("Wall time: {:.2f} s".format(wall_seconds))
+
 
-results_df.to_csv(input_directory / "results.tsv", sep="\t", index=False)
+if __name__ == "__main__":
+    main()
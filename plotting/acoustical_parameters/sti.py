@@ -0,0 +1,176 @@
+"""Speech Transmission Index (IEC 60268-16) computed from RIRs."""
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from plotting.acoustical_parameters import (
+    get_direct_sound_arrival,
+    ms_to_samples,
+    onset_indices,
+    read_rir_from_onset,
+)
+from plotting.acoustical_parameters.filterbank import filter_bands
+
+sti_bands = (125, 250, 500, 1000, 2000, 4000, 8000)
+modulation_frequencies = (
+    0.63,
+    0.8,
+    1,
+    1.25,
+    1.6,
+    2,
+    2.5,
+    3.15,
+    4,
+    5,
+    6.3,
+    8,
+    10,
+    12.5,
+)
+
+# Gender -> (alpha, beta) octave weighting factors of IEC 60268-16
+sti_weights = {
+    "male": (
+        (0.085, 0.127, 0.230, 0.233, 0.309, 0.224, 0.173),
+        (0.085, 0.078, 0.065, 0.011, 0.047, 0.095),
+    ),
+    "female": (
+        (0.0, 0.117, 0.223, 0.216, 0.328, 0.250, 0.194),
+        (0.0, 0.099, 0.066, 0.062, 0.025, 0.076),
+    ),
+}
+
+
+def modulation_transfer_function(
+    rirs: np.ndarray,
+    sample_rate: int,
+    direct_sound_arrivals: Optional[Sequence[int]] = None,
+    envelope_resolution_ms: float = 1,
+) -> np.ndarray:
+    """Compute the MTF of many RIRs for the 7 STI octaves and 14 modulation frequencies.
+
+    The squared band envelopes are summed into `envelope_resolution_ms` bins, which
+    attenuates a 12.5 Hz modulation by less than 0.03% at the default 1 ms, and their
+    spectra at the 14 modulation frequencies come out of one batched matrix product per
+    band.
+
+    Args:
+        rirs (np.ndarray): omnidirectional RIRs, an array of shape (N, n).
+        sample_rate (int): the sampling rate of the recordings.
+        direct_sound_arrivals (Sequence[int], optional): the onset index of each RIR.
+            Detected with `get_direct_sound_arrival` when omitted.
+        envelope_resolution_ms (float): the bin width of the squared envelopes.
+
+    Returns:
+        np.ndarray: the modulation transfer values, of shape (N, 7, 14).
+    """
+    if direct_sound_arrivals is None:
+        direct_sound_arrivals = get_direct_sound_arrival(rirs, sample_rate)
+    onsets = onset_indices(direct_sound_arrivals)
+    bin_length = ms_to_samples(envelope_resolution_ms, sample_rate)
+    bin_count = -(-rirs.shape[-1] // bin_length)
+    after_onset = np.arange(rirs.shape[-1]) >= onsets[:, None]
+
+    bin_centres = (np.arange(bin_count) + 0.5) * bin_length / sample_rate
+    kernel = np.exp(
+        -2j * np.pi * bin_centres[:, None] * np.asarray(modulation_frequencies)
+    )
+
+    band_rirs = filter_bands(rirs, sample_rate, sti_bands, fraction=1)
+    mtf = np.empty((rirs.shape[0], len(sti_bands), len(modulation_frequencies)))
+    envelope = np.zeros((rirs.shape[0], bin_count * bin_length))
+    for i in range(len(sti_bands)):
+        np.multiply(
+            np.square(band_rirs[:, i, :]),
+            after_onset,
+            out=envelope[:, : rirs.shape[-1]],
+        )
+        binned = envelope.reshape(rirs.shape[0], bin_count, bin_length).sum(axis=-1)
+        mtf[:, i, :] = np.abs(binned @ kernel) / binned.sum(axis=-1, keepdims=True)
+    return mtf
+
+
+def speech_transmission_index(mtf: np.ndarray, gender: str = "male") -> np.ndarray:
+    """Turn modulation transfer values into the STI.
+
+    Args:
+        mtf (np.ndarray): an output of `modulation_transfer_function`, of shape
+            (N, 7, 14).
+        gender (str): which weighting of `sti_weights` to apply.
+
+    Returns:
+        np.ndarray: the STI of each RIR, of shape (N,).
+    """
+    alpha, beta = (np.asarray(weights) for weights in sti_weights[gender])
+    # The apparent SNR is clipped to +-15 dB anyway, so values of 0 or 1 (or above,
+    # from rounding) only need to stay finite
+    eps = np.finfo(float).eps
+    mtf = np.clip(mtf, eps, 1 - eps)
+    effective_snr = np.clip(10 * np.log10(mtf / (1 - mtf)), -15, 15)
+    modulation_transfer_index = ((effective_snr + 15) / 30).mean(axis=-1)
+    redundancy = np.sqrt(
+        modulation_transfer_index[:, :-1] * modulation_transfer_index[:, 1:]
+    )
+    return modulation_transfer_index @ alpha - redundancy @ beta
+
+
+def sti(
+    rirs: np.ndarray,
+    sample_rate: int,
+    direct_sound_arrivals: Optional[Sequence[int]] = None,
+) -> Dict[str, np.ndarray]:
+    """Compute the male and female STI of many RIRs.
+
+    Args:
+        rirs (np.ndarray): omnidirectional RIRs, an array of shape (N, n).
+        sample_rate (int): the sampling rate of the recordings.
+        direct_sound_arrivals (Sequence[int], optional): the onset index of each RIR.
+
+    Returns:
+        Dict[str, np.ndarray]: arrays of shape (N,) under the keys of `sti_weights`.
+    """
+    mtf = modulation_transfer_function(rirs, sample_rate, direct_sound_arrivals)
+    return {gender: speech_transmission_index(mtf, gender) for gender in sti_weights}
+
+
+def _sti_for_file(file_path: Path) -> dict:
+    analysis = read_rir_from_onset(file_path)
+    result = sti(analysis.rir[:1], analysis.sample_rate, direct_sound_arrivals=[0])
+    return {
+        "filename": file_path.name,
+        "filepath": str(file_path),
+        **{
+            "sti_{}".format(gender): values[0].item()
+            for gender, values in result.items()
+        },
+    }
+
+
+def sti_for_directory(
+    directory: Path, pattern: str = "*.wav", processes: Optional[int] = None
+) -> pd.DataFrame:
+    """Compute the STI of every recording under a directory, in parallel.
+
+    Every recording is read from its onset on, like for the other parameters, and
+    multichannel recordings are evaluated on their first channel.
+
+    Args:
+        directory (Path): where to look for recordings, recursively.
+        pattern (str): which file names to process.
+        processes (int, optional): how many worker processes to use. Defaults to the
+            number of CPUs.
+
+    Returns:
+        pd.DataFrame: one row per recording, sorted by path, with its name, path and
+            male and female STI.
+    """
+    file_paths = sorted(Path(directory).rglob(pattern))
+    with Pool(processes) as pool:
+        rows = pool.map(_sti_for_file, file_paths)
+    return pd.DataFrame(
+        rows, columns=["filename", "filepath", "sti_male", "sti_female"]
+    )
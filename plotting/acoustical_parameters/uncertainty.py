@@ -0,0 +1,635 @@
+"""Confidence intervals of LF, DR and the decay parameters from Monte-Carlo
+perturbations of the noise and the onset of each RIR."""
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Union
+import warnings
+
+import numpy as np
+import soundfile as sf
+
+from plotting.acoustical_parameters import (
+    RIRAnalysis,
+    cumulative_energy,
+    get_direct_sound_arrival,
+    ms_to_samples,
+    onset_indices,
+    samples_to_ms,
+    seconds_to_samples,
+    stack_rirs,
+)
+from plotting.acoustical_parameters.decay import (
+    decay_parameter_names,
+    decay_parameters,
+    decay_time_ranges,
+    fit_decay_time,
+    noise_floor_truncation,
+    noise_tail_fraction,
+    regression_sums,
+)
+from plotting.acoustical_parameters.filterbank import (
+    band_edges,
+    filter_bands,
+    filter_bands_multirate,
+    third_octave_bands,
+)
+
+default_draws = 200
+default_confidence = 0.95
+# Standard deviation of the onset of a draw around the detected one
+default_onset_jitter_ms = 0.1
+# Points of the decay curve of a draw, from its onset to the end of the RIR
+default_decay_blocks = 500
+# numpy's non-central chi-square sampler breaks down beyond this non-centrality when
+# a segment has less than one degree of freedom; the noise is negligible there anyway
+max_noncentrality = 1e15
+
+
+def noise_power(energy: np.ndarray, tail_fraction: float = noise_tail_fraction):
+    """Estimate the noise floor of signals as the mean square of their tail.
+
+    Where the tail still holds some decay, the noise, and so the intervals, come out
+    larger than they are.
+
+    Args:
+        energy (np.ndarray): an output of `cumulative_energy`, of shape (M, n + 1).
+        tail_fraction (float): how much of the end of each signal is noise.
+
+    Returns:
+        np.ndarray: the noise power of each signal, of shape (M,).
+    """
+    tail = max(1, int((energy.shape[-1] - 1) * tail_fraction))
+    return (energy[:, -1] - energy[:, -1 - tail]) / tail
+
+
+def file_noise_power(
+    file_path: Union[str, Path], tail_fraction: float = noise_tail_fraction
+) -> float:
+    """Estimate the noise floor of a recording as the mean square of the tail of its
+    first channel, decoding the tail only.
+
+    Recordings analysed from a cut of their start, like Earthworks files read 2 s past
+    their onset, still hold decay at the end of the cut; their noise is measured on
+    the file instead.
+
+    Args:
+        file_path (str | Path): the recording.
+        tail_fraction (float): how much of the end of the file is noise.
+
+    Returns:
+        float: the noise power of the first channel.
+    """
+    with sf.SoundFile(str(file_path)) as sound_file:
+        tail = max(1, int(sound_file.frames * tail_fraction))
+        sound_file.seek(sound_file.frames - tail)
+        samples = sound_file.read(tail, always_2d=True)[:, 0]
+    return float(np.mean(np.square(samples)))
+
+
+def onset_jitter(
+    count: int, draws: int, onset_jitter_ms: float, rng: np.random.Generator
+) -> np.ndarray:
+    """Draw how far the onset of each draw is from the detected one.
+
+    Args:
+        count (int): how many RIRs.
+        draws (int): how many draws per RIR.
+        onset_jitter_ms (float): the standard deviation of the offsets.
+        rng (np.random.Generator): the random generator.
+
+    Returns:
+        np.ndarray: the offsets in milliseconds, of shape (count, draws).
+    """
+    return rng.normal(0.0, onset_jitter_ms, (count, draws))
+
+
+def jittered_onsets(
+    onsets: np.ndarray, jitter_ms: np.ndarray, sample_rate: float
+) -> np.ndarray:
+    """Move the onsets of many RIRs by the offsets of their draws.
+
+    Args:
+        onsets (np.ndarray): the onset index of each RIR, of shape (M,).
+        jitter_ms (np.ndarray): an output of `onset_jitter`, of shape (M, K).
+        sample_rate (float): the sampling rate of the RIRs.
+
+    Returns:
+        np.ndarray: the onset index of every draw, of shape (M, K), never before the
+            start of its RIR.
+    """
+    offsets = np.round(jitter_ms * sample_rate / 1000).astype(int)
+    return np.maximum(np.asarray(onsets, dtype=int)[:, None] + offsets, 0)
+
+
+def perturbed_energy(
+    energy: np.ndarray,
+    boundaries: np.ndarray,
+    noise_powers: np.ndarray,
+    rng: np.random.Generator,
+    bandwidth_ratio: Union[float, np.ndarray] = 1.0,
+) -> np.ndarray:
+    """Sample the cumulative energy of noisy copies of signals at some boundaries.
+
+    Each draw adds its own Gaussian noise of power `noise_powers` to its signal. Over a
+    segment of L samples holding the energy E, the energy of a noisy copy is σ² times a
+    non-central chi-square with L degrees of freedom and non-centrality E / σ², so the
+    boundaries of a draw are sorted and one such value is sampled per segment between
+    them. A draw then costs as much as its boundaries, whatever the length of the
+    signal, and windows sharing segments see the same noise.
+
+    Noise limited to a band of width B holds 2B / fs independent values per sample,
+    which `bandwidth_ratio` scales the degrees of freedom by, keeping the mean energy.
+
+    Args:
+        energy (np.ndarray): an output of `cumulative_energy`, of shape (M, n + 1).
+        boundaries (np.ndarray): sample indices in any order, of shape (M, K, B),
+            clipped to the signal like a slice would be.
+        noise_powers (np.ndarray): the noise power of each signal, of shape (M,).
+        rng (np.random.Generator): the random generator.
+        bandwidth_ratio (float | np.ndarray): 2B / fs of the noise, 1 for white noise,
+            or one per signal, of shape (M,).
+
+    Returns:
+        np.ndarray: the energy of every draw up to each boundary, of shape (M, K, B).
+    """
+    boundaries = np.clip(boundaries, 0, energy.shape[-1] - 1)
+    order = np.argsort(boundaries, axis=-1)
+    sorted_boundaries = np.take_along_axis(boundaries, order, axis=-1)
+    rows = np.arange(energy.shape[0])[:, None, None]
+    signal_steps = np.diff(energy[rows, sorted_boundaries], axis=-1, prepend=0.0)
+    lengths = np.diff(sorted_boundaries, axis=-1, prepend=0)
+
+    power = np.broadcast_to(noise_powers, energy.shape[:1])[:, None, None]
+    ratio = np.broadcast_to(bandwidth_ratio, energy.shape[:1])[:, None, None]
+    degrees = lengths * ratio
+    noisy = (power > 0) & (degrees > 0)
+    scale = np.where(noisy, power / ratio, 1.0)
+    noncentrality = np.minimum(
+        np.where(noisy, signal_steps / scale, 0.0), max_noncentrality
+    )
+    steps = np.where(
+        noisy,
+        scale * rng.noncentral_chisquare(np.where(noisy, degrees, 1.0), noncentrality),
+        signal_steps,
+    )
+
+    perturbed = np.empty_like(steps)
+    np.put_along_axis(perturbed, order, np.cumsum(steps, axis=-1), axis=-1)
+    return perturbed
+
+
+def confidence_interval(
+    nominal: np.ndarray, draws: np.ndarray, confidence: float = default_confidence
+):
+    """Centre the spread of the draws of a parameter on its unperturbed value.
+
+    Draws add noise on top of the noise already in the recording, which biases them,
+    so the interval is the quantiles of how far the draws are from their median, added
+    to the unperturbed value.
+
+    Args:
+        nominal (np.ndarray): the unperturbed values, of shape (M,).
+        draws (np.ndarray): the values of the draws, of shape (M, K).
+        confidence (float): the probability the interval covers.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: the lower and upper limits, of shape (M,). NaN
+            where no draw is finite.
+    """
+    tail = (1 - confidence) / 2
+    with warnings.catch_warnings(), np.errstate(invalid="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        draws = np.where(np.isfinite(draws), draws, np.nan)
+        deviations = draws - np.nanmedian(draws, axis=-1, keepdims=True)
+        low, high = np.nanquantile(deviations, [tail, 1 - tail], axis=-1)
+    return nominal + low, nominal + high
+
+
+def _lf_and_dr(
+    omni: np.ndarray, lateral: Optional[np.ndarray]
+) -> Dict[str, np.ndarray]:
+    # Energies up to the onset and 2 ms, 80 ms, the DR limit and the end after it for
+    # W, and up to 5 ms, 80 ms and the end for Y
+    with np.errstate(divide="ignore", invalid="ignore"):
+        results = {}
+        if lateral is not None:
+            results["lf_early"] = (lateral[..., 1] - lateral[..., 0]) / (
+                omni[..., 2] - omni[..., 0]
+            )
+            results["lf_late"] = (lateral[..., 2] - lateral[..., 1]) / (
+                omni[..., 4] - omni[..., 0]
+            )
+        results["dr_ratio"] = 10 * np.log10(
+            (omni[..., 1] - omni[..., 0]) / (omni[..., 3] - omni[..., 1])
+        )
+    return results
+
+
+def lf_and_dr_draws(
+    omni_energy: np.ndarray,
+    lateral_energy: Optional[np.ndarray],
+    onsets: np.ndarray,
+    sample_rate: int,
+    rng: Optional[np.random.Generator] = None,
+    limit_integration_to_seconds: Optional[float] = 2,
+    omni_noise_powers: Optional[np.ndarray] = None,
+) -> Dict[str, np.ndarray]:
+    """Evaluate LF_early, LF_late and DR for every draw of many RIRs at once.
+
+    Args:
+        omni_energy (np.ndarray): the `cumulative_energy` of the W channels, of shape
+            (N, n + 1).
+        lateral_energy (np.ndarray, optional): that of the Y channels; None only
+            computes DR.
+        onsets (np.ndarray): the onset index of every draw, of shape (N, K).
+        sample_rate (int): the sampling rate of the recordings.
+        rng (np.random.Generator, optional): draws noisy copies of the channels with
+            `perturbed_energy`. Without it, the energies are looked up as they are.
+        limit_integration_to_seconds (float, optional): see
+            `lateral_fraction_and_dr_batch`.
+        omni_noise_powers (np.ndarray, optional): the noise power of each W channel,
+            of shape (N,). Measured with `noise_power` on `omni_energy` when omitted,
+            like that of the Y channels.
+
+    Returns:
+        Dict[str, np.ndarray]: arrays of shape (N, K) under the keys "lf_early",
+            "lf_late" (unless `lateral_energy` is None) and "dr_ratio". Draws whose
+            denominator is 0 give inf or NaN.
+    """
+    end = omni_energy.shape[-1] - 1
+    reverberant_end = (
+        np.full(onsets.shape, end)
+        if limit_integration_to_seconds is None
+        else onsets + seconds_to_samples(limit_integration_to_seconds, sample_rate)
+    )
+    omni_boundaries = np.stack(
+        [
+            onsets,
+            onsets + ms_to_samples(2, sample_rate),
+            onsets + ms_to_samples(80, sample_rate),
+            np.minimum(reverberant_end, end),
+            np.full(onsets.shape, end),
+        ],
+        axis=-1,
+    )
+    lateral_boundaries = np.stack(
+        [
+            onsets + ms_to_samples(5, sample_rate),
+            onsets + ms_to_samples(80, sample_rate),
+            np.full(onsets.shape, end),
+        ],
+        axis=-1,
+    )
+
+    def energies(
+        energy: np.ndarray,
+        boundaries: np.ndarray,
+        noise_powers: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        if rng is None:
+            rows = np.arange(energy.shape[0])[:, None, None]
+            return energy[rows, np.clip(boundaries, 0, end)]
+        if noise_powers is None:
+            noise_powers = noise_power(energy)
+        return perturbed_energy(energy, boundaries, noise_powers, rng)
+
+    return _lf_and_dr(
+        energies(omni_energy, omni_boundaries, omni_noise_powers),
+        None
+        if lateral_energy is None
+        else energies(lateral_energy, lateral_boundaries),
+    )
+
+
+def _lf_and_dr_intervals(
+    omni_energy: np.ndarray,
+    lateral_energy: Optional[np.ndarray],
+    onsets: np.ndarray,
+    sample_rate: int,
+    draws: int,
+    confidence: float,
+    onset_jitter_ms: float,
+    rng: np.random.Generator,
+    omni_noise_powers: Optional[np.ndarray] = None,
+) -> Dict[str, np.ndarray]:
+    nominal = lf_and_dr_draws(omni_energy, lateral_energy, onsets[:, None], sample_rate)
+    jitter_ms = onset_jitter(onsets.shape[0], draws, onset_jitter_ms, rng)
+    perturbed = lf_and_dr_draws(
+        omni_energy,
+        lateral_energy,
+        jittered_onsets(onsets, jitter_ms, sample_rate),
+        sample_rate,
+        rng,
+        omni_noise_powers=omni_noise_powers,
+    )
+    results = {}
+    for name, values in nominal.items():
+        results[name] = values[:, 0]
+        results[name + "_low"], results[name + "_high"] = confidence_interval(
+            values[:, 0], perturbed[name], confidence
+        )
+    return results
+
+
+def lf_and_dr_uncertainty(
+    bformat_rirs: Union[np.ndarray, Sequence[np.ndarray]],
+    sample_rate: int,
+    draws: int = default_draws,
+    confidence: float = default_confidence,
+    onset_jitter_ms: float = default_onset_jitter_ms,
+    direct_sound_arrivals: Optional[Sequence[int]] = None,
+    lateral_channel: Optional[int] = 2,
+    seed: Optional[Union[int, Sequence[int]]] = None,
+) -> Dict[str, np.ndarray]:
+    """Compute LF_early, LF_late and DR of many B-Format RIRs with confidence intervals.
+
+    Every draw moves the onset of its RIR by a Gaussian offset and adds Gaussian noise
+    at the noise floor of each channel, measured with `noise_power`. The W and Y
+    channels are squared and summed once; the draws of all RIRs then take a handful of
+    lookups and random samples each (see `perturbed_energy`), in single array
+    operations.
+
+    Args:
+        bformat_rirs (np.ndarray | Sequence[np.ndarray]): an array of shape (N, 4, n) or
+            a list of N arrays of shape (4, n_i); channels must be ordered as
+            {W, X, Y, Z}. Omnidirectional RIRs of shape (N, 1, n) are enough when
+            `lateral_channel` is None.
+        sample_rate (int): the sampling rate of the recordings.
+        draws (int): how many perturbations of each RIR to evaluate.
+        confidence (float): the probability the intervals cover.
+        onset_jitter_ms (float): the standard deviation of the onset of the draws.
+        direct_sound_arrivals (Sequence[int], optional): the onset index of each RIR.
+            Detected on the W channel with `get_direct_sound_arrival` when omitted.
+        lateral_channel (int, optional): which channel holds Y, see
+            `lateral_fraction_early`; None only computes DR.
+        seed (int | Sequence[int], optional): seeds the draws, for repeatable
+            intervals.
+
+    Returns:
+        Dict[str, np.ndarray]: arrays of shape (N,) under "lf_early", "lf_late" (unless
+            `lateral_channel` is None) and "dr_ratio", which match
+            `lateral_fraction_and_dr_batch`, and the limits of their intervals under
+            the same names with a "_low" and a "_high" suffix.
+    """
+    bformat_rirs = stack_rirs(bformat_rirs)
+    if direct_sound_arrivals is None:
+        direct_sound_arrivals = get_direct_sound_arrival(
+            bformat_rirs[:, 0, :], sample_rate
+        )
+    return _lf_and_dr_intervals(
+        cumulative_energy(bformat_rirs[:, 0, :]),
+        None
+        if lateral_channel is None
+        else cumulative_energy(bformat_rirs[:, lateral_channel, :]),
+        np.atleast_1d(onset_indices(direct_sound_arrivals)),
+        sample_rate,
+        draws,
+        confidence,
+        onset_jitter_ms,
+        np.random.default_rng(seed),
+    )
+
+
+def analysis_lf_and_dr_uncertainty(
+    analysis: RIRAnalysis,
+    draws: int = default_draws,
+    confidence: float = default_confidence,
+    onset_jitter_ms: float = default_onset_jitter_ms,
+    lateral_channel: Optional[int] = 2,
+    seed: Optional[Union[int, Sequence[int]]] = None,
+    omni_noise_power: Optional[float] = None,
+) -> Dict[str, float]:
+    """Compute the confidence intervals of LF and DR for one `RIRAnalysis`.
+
+    The onset and the cumulative energies of the analysis are reused, so the intervals
+    cost no squaring on top of the parameters themselves.
+
+    Args:
+        analysis (RIRAnalysis): a B-Format or, when `lateral_channel` is None,
+            omnidirectional RIR.
+        draws (int): see `lf_and_dr_uncertainty`.
+        confidence (float): see `lf_and_dr_uncertainty`.
+        onset_jitter_ms (float): see `lf_and_dr_uncertainty`.
+        lateral_channel (int, optional): see `lf_and_dr_uncertainty`.
+        seed (int | Sequence[int], optional): see `lf_and_dr_uncertainty`.
+        omni_noise_power (float, optional): the noise power of the omni channel, e.g.
+            from `file_noise_power` when the analysis only holds the start of the
+            recording. Measured on the tail of the analysis when omitted.
+
+    Returns:
+        Dict[str, float]: the keys of `lf_and_dr_uncertainty`, for this RIR.
+    """
+    results = _lf_and_dr_intervals(
+        analysis.channel_energy(0)[None, :],
+        None
+        if lateral_channel is None
+        else analysis.channel_energy(lateral_channel)[None, :],
+        np.array([analysis.direct_sound_arrival]),
+        analysis.sample_rate,
+        draws,
+        confidence,
+        onset_jitter_ms,
+        np.random.default_rng(seed),
+        None if omni_noise_power is None else np.array([omni_noise_power]),
+    )
+    return {name: values[0].item() for name, values in results.items()}
+
+
+def decay_draws(
+    energy: np.ndarray,
+    onsets: np.ndarray,
+    sample_rate: float,
+    rng: np.random.Generator,
+    bandwidth_ratio: Union[float, np.ndarray] = 1.0,
+    blocks: int = default_decay_blocks,
+    truncation: Optional[np.ndarray] = None,
+    compensation: Optional[np.ndarray] = None,
+) -> Dict[str, np.ndarray]:
+    """Evaluate Ts, EDT, T20, T30, C50 and C80 for every draw of many RIRs at once.
+
+    The Schroeder curve of a draw is sampled on `blocks` + 1 evenly spaced points from
+    its onset on, and decay times are fitted at that rate, so draws cost the same
+    whatever the length of the RIRs. Ts weighs the energy of each block by its centre.
+
+    Args:
+        energy (np.ndarray): the `cumulative_energy` of band-filtered RIRs, of shape
+            (M, n + 1).
+        onsets (np.ndarray): the onset index of every draw, of shape (M, K).
+        sample_rate (float): the sampling rate of the RIRs.
+        rng (np.random.Generator): the random generator.
+        bandwidth_ratio (float | np.ndarray): see `perturbed_energy`.
+        blocks (int): how many segments the decay curves are sampled in.
+        truncation (np.ndarray, optional): where the Schroeder integration of each RIR
+            starts, of shape (M,), as in `schroeder_decay`. The end of the RIRs when
+            omitted.
+        compensation (np.ndarray, optional): the energy the integration of each RIR
+            starts from, of shape (M,).
+
+    Returns:
+        Dict[str, np.ndarray]: arrays of shape (M, K) under the keys of
+            `decay_parameter_names`, in the units of `decay_parameters`.
+    """
+    last = energy.shape[-1] - 1
+    step = max(1, -(-(last - int(onsets.min())) // blocks))
+    if truncation is None:
+        truncation = np.full(onsets.shape[:1], last)
+    if compensation is None:
+        compensation = np.zeros(onsets.shape[:1])
+    truncation = np.broadcast_to(
+        np.asarray(truncation)[:, None, None], onsets.shape + (1,)
+    )
+    boundaries = np.concatenate(
+        [
+            onsets[..., None] + step * np.arange(blocks + 1),
+            truncation,
+            onsets[..., None] + ms_to_samples(50, sample_rate),
+            onsets[..., None] + ms_to_samples(80, sample_rate),
+            np.full(onsets.shape + (1,), last),
+        ],
+        axis=-1,
+    )
+    energies = perturbed_energy(
+        energy, boundaries, noise_power(energy), rng, bandwidth_ratio
+    )
+    curve = energies[..., : blocks + 1]
+    total = energies[..., -1]
+    remaining = np.where(
+        boundaries[..., : blocks + 1] < truncation,
+        energies[..., blocks + 1, None]
+        - curve
+        + np.asarray(compensation)[:, None, None],
+        np.nan,
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        decay_db = 10 * np.log10(remaining / remaining[..., :1])
+        flat_decay_db = decay_db.reshape(-1, blocks + 1)
+        sums = regression_sums(flat_decay_db)
+        results = {
+            name: fit_decay_time(
+                flat_decay_db, sample_rate / step, *levels, sums=sums
+            ).reshape(onsets.shape)
+            for name, levels in decay_time_ranges.items()
+        }
+        centres = (np.arange(blocks) + 0.5) * step
+        results["Ts"] = samples_to_ms(
+            np.diff(curve, axis=-1) @ centres / (total - curve[..., 0]), sample_rate
+        )
+        for name, boundary in (("C50", -3), ("C80", -2)):
+            results[name] = 10 * np.log10(
+                (energies[..., boundary] - curve[..., 0])
+                / (total - energies[..., boundary])
+            )
+    return {name: results[name] for name in decay_parameter_names}
+
+
+def band_decay_uncertainty(
+    rirs: np.ndarray,
+    sample_rate: int,
+    bands: Sequence[int] = third_octave_bands,
+    fraction: int = 3,
+    direct_sound_arrivals: Optional[Sequence[int]] = None,
+    draws: int = default_draws,
+    confidence: float = default_confidence,
+    onset_jitter_ms: float = default_onset_jitter_ms,
+    multirate: bool = True,
+    oversampling: float = 8,
+    seed: Optional[Union[int, Sequence[int]]] = None,
+    truncate_noise: bool = True,
+) -> Dict[str, np.ndarray]:
+    """Compute the decay parameters of every band of many RIRs with confidence
+    intervals.
+
+    Every draw moves the onset of its RIR, the same for all its bands, and adds noise
+    at the noise floor of each band (see `perturbed_energy`, with the bandwidth of the
+    band). All the draws of the bands filtered at one rate are evaluated at once by
+    `decay_draws`, which holds a few arrays of N x bands x draws x blocks values: about
+    100 MB per RIR for third octaves with the defaults.
+
+    `decay_parameters_to_sheets` lays the results out as sheets, whose "_low" and
+    "_high" ones `plot_lines_with_integration_time` and `plot_lines_with_distance`
+    average over each group of recordings and draw as bands around the group means.
+
+    Args:
+        rirs (np.ndarray): omnidirectional RIRs, an array of shape (N, n).
+        sample_rate (int): the sampling rate of the recordings.
+        bands (Sequence[int]): see `band_decay_parameters`.
+        fraction (int): see `band_decay_parameters`.
+        direct_sound_arrivals (Sequence[int], optional): see `band_decay_parameters`.
+        draws (int): how many perturbations of each RIR to evaluate.
+        confidence (float): the probability the intervals cover.
+        onset_jitter_ms (float): the standard deviation of the onset of the draws.
+        multirate (bool): see `band_decay_parameters`.
+        oversampling (float): see `band_decay_parameters`.
+        seed (int | Sequence[int], optional): seeds the draws, for repeatable
+            intervals.
+        truncate_noise (bool): see `decay_parameters`. The draws are truncated where
+            their unperturbed RIR is.
+
+    Returns:
+        Dict[str, np.ndarray]: arrays of shape (N, bands) under the keys of
+            `decay_parameter_names`, which match `band_decay_parameters`, and the
+            limits of their intervals under the same names with a "_low" and a
+            "_high" suffix.
+    """
+    rirs = np.atleast_2d(rirs)
+    rng = np.random.default_rng(seed)
+    if direct_sound_arrivals is None:
+        direct_sound_arrivals = get_direct_sound_arrival(rirs, sample_rate)
+    onsets = np.atleast_1d(onset_indices(direct_sound_arrivals))
+    jitter_ms = onset_jitter(rirs.shape[0], draws, onset_jitter_ms, rng)
+
+    bands = list(bands)
+    results = {
+        name + suffix: np.empty((rirs.shape[0], len(bands)))
+        for name in decay_parameter_names
+        for suffix in ("", "_low", "_high")
+    }
+    stages = (
+        filter_bands_multirate(rirs, sample_rate, bands, fraction, oversampling)
+        if multirate
+        else [(bands, sample_rate, filter_bands(rirs, sample_rate, bands, fraction))]
+    )
+    for stage_bands, stage_rate, band_rirs in stages:
+        stage_onsets = np.round(onsets * stage_rate / sample_rate).astype(int)
+        columns = [bands.index(band) for band in stage_bands]
+        nominal = decay_parameters(band_rirs, stage_rate, stage_onsets, truncate_noise)
+
+        # One row per RIR and band, the bands of a RIR sharing its onset draws
+        rows = band_rirs.reshape(-1, band_rirs.shape[-1])
+        row_onsets = np.repeat(
+            jittered_onsets(stage_onsets, jitter_ms, stage_rate),
+            len(stage_bands),
+            axis=0,
+        )
+        bandwidth_ratio = np.tile(
+            [
+                min(
+                    1.0, 2 * np.subtract(*band_edges(band, fraction)[::-1]) / stage_rate
+                )
+                for band in stage_bands
+            ],
+            rirs.shape[0],
+        )
+        energy = cumulative_energy(rows)
+        truncation, compensation = (
+            noise_floor_truncation(
+                energy, np.repeat(stage_onsets, len(stage_bands)), stage_rate
+            )
+            if truncate_noise
+            else (None, None)
+        )
+        perturbed = decay_draws(
+            energy,
+            row_onsets,
+            stage_rate,
+            rng,
+            bandwidth_ratio,
+            truncation=truncation,
+            compensation=compensation,
+        )
+        for name in decay_parameter_names:
+            values = nominal[name].reshape(-1)
+            low, high = confidence_interval(values, perturbed[name], confidence)
+            results[name][:, columns] = nominal[name]
+            results[name + "_low"][:, columns] = low.reshape(nominal[name].shape)
+            results[name + "_high"][:, columns] = high.reshape(nominal[name].shape)
+    return results
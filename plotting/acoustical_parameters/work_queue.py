@@ -0,0 +1,206 @@
+"""A work queue in a shared directory, drained by processes on one or more machines."""
+import json
+import os
+from pathlib import Path
+import socket
+import time
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+
+def default_node_id() -> str:
+    """Name this process uniquely across machines, as "<host>-<pid>"."""
+    return "{}-{}".format(socket.gethostname(), os.getpid())
+
+
+class WorkQueue:
+    """Work units as JSON files, claimed by atomic renames with a lease.
+
+    The queue directory, typically on the NAS every node mounts, holds:
+
+    - units.jsonl: every unit ever enqueued, in order, for the merge step;
+    - pending/: units nobody holds;
+    - claimed/: units being worked on, as "<unit id>@<node id>.json"; a claim is
+      renamed in from pending/ (only one node wins the rename) and expires
+      `lease_seconds` after it was made, after which any node may put it back in
+      pending/;
+    - results/: one JSON-lines file per node with the results it produced.
+
+    A unit whose lease expired while its node was still working on it may be done
+    twice; `results` keeps one result per unit. Leases compare modification times
+    written by one node with the clock of another, so node clocks must agree to well
+    within `lease_seconds`. Unit ids must not contain "@".
+
+    Args:
+        directory (Path): the queue directory, created when missing.
+        lease_seconds (float): how long a claim lasts.
+        node_id (str, optional): the name claims are made under. Defaults to
+            `default_node_id`.
+    """
+
+    def __init__(
+        self, directory: Path, lease_seconds: float = 600, node_id: Optional[str] = None
+    ):
+        self.directory = Path(directory)
+        self.lease_seconds = lease_seconds
+        self.node_id = node_id or default_node_id()
+        self.manifest = self.directory / "units.jsonl"
+        self.pending = self.directory / "pending"
+        self.claimed = self.directory / "claimed"
+        self.results_directory = self.directory / "results"
+        for directory in (self.pending, self.claimed, self.results_directory):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def enqueue(self, units: Iterable[Tuple[str, dict]]) -> int:
+        """Add units to an empty queue.
+
+        Args:
+            units (Iterable[Tuple[str, dict]]): the id of each unit, usable as a file
+                name, and its JSON-serialisable description.
+
+        Returns:
+            int: how many units were enqueued.
+        """
+        if self.manifest.exists():
+            raise ValueError(
+                "The queue in {} was already filled".format(self.directory)
+            )
+        count = 0
+        with open(self.manifest.with_suffix(".tmp"), "w") as manifest:
+            for unit_id, unit in units:
+                line = json.dumps({"unit_id": unit_id, "unit": unit})
+                manifest.write(line + "\n")
+                self._write_atomically(self.pending / (unit_id + ".json"), line)
+                count += 1
+        os.replace(self.manifest.with_suffix(".tmp"), self.manifest)
+        return count
+
+    @staticmethod
+    def _write_atomically(path: Path, text: str):
+        temporary_path = path.with_name("." + path.name + ".tmp")
+        with open(temporary_path, "w") as temporary_file:
+            temporary_file.write(text)
+        os.replace(temporary_path, path)
+
+    def units(self) -> Iterator[Tuple[str, dict]]:
+        """Iterate over every unit enqueued, done or not, in order."""
+        with open(self.manifest) as manifest:
+            for line in manifest:
+                entry = json.loads(line)
+                yield entry["unit_id"], entry["unit"]
+
+    def claim(self) -> Optional[Tuple[str, dict]]:
+        """Take a pending unit, if any is left.
+
+        Returns:
+            Tuple[str, dict] | None: the id and description of the unit, or None when
+                nothing is pending.
+        """
+        for pending_path in sorted(self.pending.glob("*.json")):
+            claimed_path = self._claimed_path(pending_path.stem, self.node_id)
+            try:
+                # The lease starts before the claim shows up in claimed/, so no node
+                # can take it for expired because of when it was enqueued
+                os.utime(pending_path)
+                os.rename(pending_path, claimed_path)
+            except FileNotFoundError:
+                # Another node won this one
+                continue
+            with open(claimed_path) as claimed_file:
+                entry = json.load(claimed_file)
+            return entry["unit_id"], entry["unit"]
+        return None
+
+    def _claimed_path(self, unit_id: str, node_id: str) -> Path:
+        return self.claimed / "{}@{}.json".format(unit_id, node_id)
+
+    def requeue_expired(self) -> int:
+        """Put the units whose lease expired back in pending/.
+
+        Returns:
+            int: how many units were put back.
+        """
+        requeued = 0
+        now = time.time()
+        for claimed_path in self.claimed.glob("*.json"):
+            try:
+                if now - claimed_path.stat().st_mtime < self.lease_seconds:
+                    continue
+                unit_id = claimed_path.stem.partition("@")[0]
+                os.rename(claimed_path, self.pending / (unit_id + ".json"))
+            except FileNotFoundError:
+                continue
+            requeued += 1
+        return requeued
+
+    def complete(
+        self,
+        unit_id: str,
+        result: dict,
+        node_id: str,
+        default: Optional[Callable] = None,
+    ) -> bool:
+        """Record the result of a unit and release its claim.
+
+        The result is recorded even when the claim expired meanwhile, but then the
+        claim is left alone: the unit may have been claimed again by another node,
+        which still holds it.
+
+        Args:
+            unit_id (str): the unit that was processed.
+            result (dict): its result.
+            node_id (str): which node produced it, the `node_id` it was claimed under;
+                names the shard file written to.
+            default (Callable, optional): passed to `json.dumps` for values JSON cannot
+                store.
+
+        Returns:
+            bool: whether the node still held the claim it released.
+        """
+        line = json.dumps({"unit_id": unit_id, "result": result}, default=default)
+        with open(self.results_directory / (node_id + ".jsonl"), "a") as shard:
+            shard.write(line + "\n")
+            shard.flush()
+            os.fsync(shard.fileno())
+        try:
+            os.remove(self._claimed_path(unit_id, node_id))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def drain(self) -> Iterator[Tuple[str, dict]]:
+        """Claim units until none is pending, taking over expired claims on the way.
+
+        Yields:
+            Tuple[str, dict]: the id and description of each unit claimed.
+        """
+        while True:
+            claimed = self.claim()
+            if claimed is not None:
+                yield claimed
+            elif not self.requeue_expired():
+                return
+
+    def is_done(self) -> bool:
+        """Whether no unit is pending or claimed any more."""
+        return not any(self.pending.glob("*.json")) and not any(
+            self.claimed.glob("*.json")
+        )
+
+    def results(self) -> Dict[str, dict]:
+        """Gather the results of every shard, one per unit.
+
+        A truncated last line, left by a node that died while writing, is skipped.
+
+        Returns:
+            Dict[str, dict]: the result of each completed unit, by unit id.
+        """
+        results = {}
+        for shard_path in sorted(self.results_directory.glob("*.jsonl")):
+            with open(shard_path) as shard:
+                for line in shard:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    results.setdefault(entry["unit_id"], entry["result"])
+        return results
@@ -0,0 +1,322 @@
+"""Benchmarks of the acoustical-parameter hot paths on synthetic RIRs.
+
+Run `python plotting/benchmark.py --output benchmark.json` to time every case, and add
+`--baseline` with the JSON of an earlier run to fail when a case got slower than
+`--threshold` allows.
+"""
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+import io
+import json
+from pathlib import Path
+import platform
+import sys
+from tempfile import TemporaryDirectory
+from timeit import repeat
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+import scipy
+import soundfile as sf
+
+from plotting.acoustical_parameters import (
+    direct_reverberant_ratio,
+    get_direct_sound_arrival,
+    lateral_fraction_early,
+    lateral_fraction_late,
+)
+from plotting.acoustical_parameters import run
+from plotting.acoustical_parameters.uncertainty import lf_and_dr_uncertainty
+from plotting.utils import (
+    aformat_to_bformat_matrix,
+    convert_ambisonics_a_to_b,
+    convert_ambisonics_a_to_b_batch,
+    read_aformat,
+)
+
+sample_rates = (44100, 48000, 96000)
+durations = (1, 5, 20)
+quick_sample_rates = (48000,)
+quick_durations = (1,)
+
+
+def synthesize_rir(
+    duration: float,
+    sample_rate: int,
+    reverberation_time: float = 1.5,
+    delay_ms: float = 10,
+    channels: int = 1,
+    seed: int = 0,
+) -> np.ndarray:
+    """Make RIRs of exponentially decaying noise after a direct impulse.
+
+    Every channel gets its own noise tail, 20 dB below the direct sound, and a noise
+    floor 80 dB below it before the impulse.
+
+    Args:
+        duration (float): the length of the RIRs, in seconds.
+        sample_rate (int): the sampling rate.
+        reverberation_time (float): the time the tail takes to decay 60 dB, in seconds.
+        delay_ms (float): when the direct impulse arrives.
+        channels (int): how many RIRs to make.
+        seed (int): the seed of the noise.
+
+    Returns:
+        np.ndarray: the RIRs, of shape (channels, duration * sample_rate).
+    """
+    rng = np.random.default_rng(seed)
+    length = int(duration * sample_rate)
+    delay = int(delay_ms * sample_rate / 1000)
+    time = np.arange(length - delay) / sample_rate
+    rirs = 1e-4 * rng.standard_normal((channels, length))
+    rirs[:, delay:] = (
+        0.1
+        * rng.standard_normal((channels, length - delay))
+        * np.exp(-3 * np.log(10) * time / reverberation_time)
+    )
+    rirs[:, delay] += 1.0
+    return rirs
+
+
+def synthesize_aformat_rir(
+    duration: float,
+    sample_rate: int,
+    reverberation_time: float = 1.5,
+    delay_ms: float = 10,
+    seed: int = 0,
+) -> np.ndarray:
+    """Make the four capsule RIRs of a SoundField microphone.
+
+    The diffuse tail is drawn in B-format and encoded to A-format, and the direct
+    impulse arrives from the front left.
+
+    Args:
+        duration (float): the length of the RIRs, in seconds.
+        sample_rate (int): the sampling rate.
+        reverberation_time (float): the time the tail takes to decay 60 dB, in seconds.
+        delay_ms (float): when the direct impulse arrives.
+        seed (int): the seed of the noise.
+
+    Returns:
+        np.ndarray: the A-format RIRs, of shape (4, duration * sample_rate), in the
+            order front left up, front right down, back left down, back right up.
+    """
+    bformat = synthesize_rir(
+        duration, sample_rate, reverberation_time, delay_ms, channels=4, seed=seed
+    )
+    direction = np.array([1, 1, 0.3]) / np.linalg.norm([1, 1, 0.3])
+    delay = int(delay_ms * sample_rate / 1000)
+    bformat[:, delay] = np.concatenate(([1.0], direction))
+    return np.linalg.solve(aformat_to_bformat_matrix, bformat)
+
+
+def write_campaign(
+    directory: Path, duration: float, sample_rate: int, positions: int = 2
+) -> Path:
+    """Write a campaign the way run.py expects one, with synthetic recordings.
+
+    Args:
+        directory (Path): where to create the campaign.
+        duration (float): the length of every recording, in seconds.
+        sample_rate (int): the sampling rate of every recording.
+        positions (int): how many Earthworks files and A-format groups to write.
+
+    Returns:
+        Path: the campaign directory.
+    """
+    measurement_directory = Path(directory) / "medicion1"
+    measurement_directory.mkdir(parents=True, exist_ok=True)
+    for position in range(1, positions + 1):
+        (omni_rir,) = synthesize_rir(duration, sample_rate, seed=position)
+        sf.write(
+            measurement_directory
+            / "Earthworks {}-{:02d}.wav".format(position, position),
+            omni_rir,
+            sample_rate,
+            subtype="FLOAT",
+        )
+        aformat_rir = synthesize_aformat_rir(duration, sample_rate, seed=position)
+        for capsule, capsule_rir in enumerate(aformat_rir, start=1):
+            sf.write(
+                measurement_directory
+                / "Soundfield {}-{:02d}.wav".format(capsule, position),
+                capsule_rir,
+                sample_rate,
+                subtype="FLOAT",
+            )
+    return Path(directory)
+
+
+def time_call(function: Callable[[], object], repetitions: int = 5) -> Dict:
+    """Time a call, keeping the best and the median of several runs.
+
+    Args:
+        function (Callable[[], object]): what to time.
+        repetitions (int): how many times to run it.
+
+    Returns:
+        Dict: "min_seconds", "median_seconds" and "repetitions".
+    """
+    with redirect_stdout(io.StringIO()):
+        seconds = repeat(function, number=1, repeat=repetitions)
+    return {
+        "min_seconds": min(seconds),
+        "median_seconds": float(np.median(seconds)),
+        "repetitions": repetitions,
+    }
+
+
+def run_pipeline(campaign_directory: Path):
+    recordings = run.collect_recordings(
+        campaign_directory, Path(campaign_directory) / "benchmark_catalog.sqlite"
+    )
+    all_acoustical_parameters = run.extract_all_acoustical_parameters(
+        [recording for _, recording, _ in recordings], processes=1
+    )
+    return run.recordings_to_dataframe(recordings, all_acoustical_parameters)
+
+
+def run_benchmarks(
+    rates: Sequence[int] = sample_rates,
+    lengths: Sequence[float] = durations,
+    repetitions: int = 5,
+) -> Dict[str, Dict]:
+    """Time every hot path for every sampling rate and duration.
+
+    Args:
+        rates (Sequence[int]): the sampling rates to try.
+        lengths (Sequence[float]): the RIR durations to try, in seconds.
+        repetitions (int): how many times to run each case.
+
+    Returns:
+        Dict[str, Dict]: the `time_call` output of each case, under names like
+            "read_aformat/48000Hz/5s".
+    """
+    results = {}
+    for sample_rate in rates:
+        for duration in lengths:
+            suffix = "/{}Hz/{}s".format(sample_rate, duration)
+            print("Benchmarking{}".format(suffix.replace("/", " ")))
+            omni_rir = synthesize_rir(duration, sample_rate)
+            aformat_rir = synthesize_aformat_rir(duration, sample_rate)
+            bformat_rir = convert_ambisonics_a_to_b_batch(aformat_rir)
+            with TemporaryDirectory() as directory:
+                campaign_directory = write_campaign(directory, duration, sample_rate)
+                capsule_paths = sorted(
+                    (campaign_directory / "medicion1").glob("Soundfield *-01.wav")
+                )
+                cases = {
+                    "read_aformat": lambda: read_aformat(capsule_paths),
+                    "convert_ambisonics_a_to_b": lambda: convert_ambisonics_a_to_b(
+                        *aformat_rir
+                    ),
+                    "convert_ambisonics_a_to_b_batch": lambda: (
+                        convert_ambisonics_a_to_b_batch(aformat_rir)
+                    ),
+                    "get_direct_sound_arrival": lambda: get_direct_sound_arrival(
+                        omni_rir, sample_rate
+                    ),
+                    "lateral_fraction_early": lambda: lateral_fraction_early(
+                        bformat_rir, sample_rate
+                    ),
+                    "lateral_fraction_late": lambda: lateral_fraction_late(
+                        bformat_rir, sample_rate
+                    ),
+                    "direct_reverberant_ratio": lambda: direct_reverberant_ratio(
+                        omni_rir, sample_rate
+                    ),
+                    "lf_and_dr_uncertainty": lambda: lf_and_dr_uncertainty(
+                        bformat_rir[None], sample_rate, seed=0
+                    ),
+                    "run_pipeline": lambda: run_pipeline(campaign_directory),
+                }
+                for name, function in cases.items():
+                    results[name + suffix] = time_call(function, repetitions)
+    return results
+
+
+def find_regressions(
+    results: Dict[str, Dict],
+    baseline: Dict[str, Dict],
+    threshold: float = 0.25,
+    tolerance_seconds: float = 5e-4,
+) -> Dict[str, float]:
+    """Compare the best times of a run with those of a baseline run.
+
+    Args:
+        results (Dict[str, Dict]): an output of `run_benchmarks`.
+        baseline (Dict[str, Dict]): the same for the baseline; cases missing from it
+            are not compared.
+        threshold (float): how much slower, relative to the baseline, a case may get.
+        tolerance_seconds (float): slowdowns below this are timer noise, not
+            regressions.
+
+    Returns:
+        Dict[str, float]: the ratio of current to baseline time of every case that
+            regressed.
+    """
+    regressions = {}
+    for name, timing in results.items():
+        if name not in baseline:
+            continue
+        current = timing["min_seconds"]
+        previous = baseline[name]["min_seconds"]
+        if current - previous > max(threshold * previous, tolerance_seconds):
+            regressions[name] = current / previous
+    return regressions
+
+
+def main(arguments: Optional[Sequence[str]] = None) -> int:
+    argument_parser = ArgumentParser(description=__doc__)
+    argument_parser.add_argument("--output", type=Path, default=None)
+    argument_parser.add_argument(
+        "--baseline", type=Path, default=None, help="JSON of an earlier run"
+    )
+    argument_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="allowed slowdown relative to the baseline (default: 0.25)",
+    )
+    argument_parser.add_argument("--repetitions", type=int, default=5)
+    argument_parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="only time 1 s RIRs at 48 kHz",
+    )
+    arguments = argument_parser.parse_args(arguments)
+
+    results = run_benchmarks(
+        quick_sample_rates if arguments.quick else sample_rates,
+        quick_durations if arguments.quick else durations,
+        arguments.repetitions,
+    )
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "soundfile": sf.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+        },
+        "results": results,
+    }
+    for name, timing in results.items():
+        print("{:<55} {:10.4f} s".format(name, timing["min_seconds"]))
+    if arguments.output is not None:
+        with open(arguments.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if arguments.baseline is None:
+        return 0
+    with open(arguments.baseline) as baseline_file:
+        baseline = json.load(baseline_file)["results"]
+    regressions = find_regressions(results, baseline, arguments.threshold)
+    for name, ratio in regressions.items():
+        print("REGRESSION: {} is {:.2f}x slower than the baseline".format(name, ratio))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
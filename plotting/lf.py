@@ -1,19 +1,8 @@
-import re
-from traceback import print_exc
-
 import plotly.express as px
 import plotly.graph_objects as go
 import polars as pl
 
-
-def filter_integration_time(string: str):
-    pattern = r".*((?P<integration_time>(350|100|10){1})ms)+.*"
-    match = re.match(pattern, string, re.MULTILINE)
-    try:
-        return match.groupdict()["integration_time"]
-    except:
-        print_exc()
-        raise ValueError(f"No match for integration time in {string}")
+from plotting.acoustical_parameters.catalog import MeasurementCatalog
 
 
 df_objective = pl.read_csv(
@@ -36,17 +25,21 @@ print(
     )
 )
 
-df_subjective = (
-    pl.read_csv("./data/results_LF-DR_subjective.tsv", has_header=True, separator="\t")
-    .filter(
-        pl.col("lf_early").is_not_nan()
-        & pl.col("lf_early").is_not_null()
-        & pl.col("lf_late").is_not_nan()
-        & pl.col("lf_late").is_not_null()
-    )
-    .with_columns(
-        pl.col("filename").apply(filter_integration_time).alias("integration_time")
-    )
+df_subjective = pl.read_csv(
+    "./data/results_LF-DR_subjective.tsv", has_header=True, separator="\t"
+).filter(
+    pl.col("lf_early").is_not_nan()
+    & pl.col("lf_early").is_not_null()
+    & pl.col("lf_late").is_not_nan()
+    & pl.col("lf_late").is_not_null()
+)
+# The catalog run.py indexed the subjective campaign into (its --catalog option)
+with MeasurementCatalog("./data/catalog.sqlite") as catalog:
+    integration_times = {
+        row["path"]: row["integration_time"] for row in catalog.recordings()
+    }
+df_subjective = df_subjective.with_columns(
+    pl.col("filepath").map_dict(integration_times).alias("integration_time")
 )
 
 print(
@@ -1,4 +1,5 @@
 from random import random
+from typing import Optional
 
 import pandas as pd
 from plotly import graph_objects as go
@@ -48,6 +49,40 @@ zones = (zone1, zone2, zone3, zone4)
 integration_times = (10, 100, 350)
 
 
+def integrating(df: pd.DataFrame, integration_time: int) -> pd.DataFrame:
+    # Sheets preprocessed by main.py hold the integration time as a str, results.tsv
+    # and the catalog as an int
+    return df[df["integration_time"].astype(str) == str(integration_time)]
+
+
+# Line colours of the groups, which their error bands are filled with
+group_colors = px.colors.qualitative.Plotly
+
+
+def add_error_band(
+    fig: go.Figure,
+    name: str,
+    bands: list,
+    lower: list,
+    upper: list,
+    color: str,
+):
+    # A closed polygon along the upper limit and back along the lower one, so the
+    # band does not depend on the order the traces are added in
+    fig.add_trace(
+        go.Scatter(
+            name=name,
+            x=list(bands) + list(reversed(bands)),
+            y=list(upper) + list(reversed(lower)),
+            mode="lines",
+            line=dict(width=0, color=color),
+            fillcolor="rgba({}, {}, {}, 0.15)".format(*px.colors.hex_to_rgb(color)),
+            fill="toself",
+            hoverinfo="skip",
+        )
+    )
+
+
 def plot_iacc_with_integration_time(
     df: pd.DataFrame,
     parameter_name: str,
@@ -73,10 +108,7 @@ def plot_iacc_with_integration_time(
     # Plot mean for each integration time group
     fig = go.Figure().update_layout(template="plotly_white")
     for integration_time in df["integration_time"].unique().squeeze().tolist():
-        means = [
-            df[df["integration_time"] == integration_time][freq].mean()
-            for freq in bands
-        ]
+        means = [integrating(df, integration_time)[freq].mean() for freq in bands]
         fig.add_trace(
             go.Scatter(
                 name="Mean integrating {} ms".format(integration_time),
@@ -141,7 +173,13 @@ def plot_lines_with_integration_time(
     frequency_column_start: int,
     show: bool = True,
     save: bool = False,
+    lower: Optional[pd.DataFrame] = None,
+    upper: Optional[pd.DataFrame] = None,
 ):
+    # lower and upper are sheets laid out like df with the limits of the confidence
+    # interval of every value, e.g. the "_low" and "_high" sheets of
+    # band_decay_uncertainty. Each group gets the average of the limits of its
+    # recordings as band, which is not a confidence interval of the group mean
     # Compute global statistics first
     bands = [
         column_name
@@ -158,11 +196,9 @@ def plot_lines_with_integration_time(
 
     # Plot mean for each integration time group
     fig = go.Figure().update_layout(template="plotly_white")
-    for integration_time in integration_times:
-        means = [
-            df[df["integration_time"] == integration_time][freq].mean()
-            for freq in bands
-        ]
+    for i, integration_time in enumerate(integration_times):
+        color = group_colors[i % len(group_colors)]
+        means = [integrating(df, integration_time)[freq].mean() for freq in bands]
         fig.add_trace(
             go.Scatter(
                 name="Mean integrating {} ms".format(integration_time),
@@ -170,9 +206,18 @@ def plot_lines_with_integration_time(
                 y=means,
                 mode="lines",
                 # marker=dict(color="#000"),
-                line=dict(width=1.5),
+                line=dict(width=1.5, color=color),
             )
         )
+        if lower is not None and upper is not None:
+            add_error_band(
+                fig,
+                "Average per-recording interval, {} ms".format(integration_time),
+                bands,
+                [integrating(lower, integration_time)[freq].mean() for freq in bands],
+                [integrating(upper, integration_time)[freq].mean() for freq in bands],
+                color,
+            )
 
     # Add top and bottom rails, and fill the area inbetween
     fig.add_trace(
@@ -227,7 +272,13 @@ def plot_lines_with_distance(
     frequency_column_start: int,
     show: bool = True,
     save: bool = False,
+    lower: Optional[pd.DataFrame] = None,
+    upper: Optional[pd.DataFrame] = None,
 ):
+    # lower and upper are sheets laid out like df with the limits of the confidence
+    # interval of every value, e.g. the "_low" and "_high" sheets of
+    # band_decay_uncertainty. Each group gets the average of the limits of its
+    # recordings as band, which is not a confidence interval of the group mean
     # Compute global statistics first
     bands = [
         column_name
@@ -246,6 +297,7 @@ def plot_lines_with_distance(
     last_distance = 0
     fig = go.Figure().update_layout(template="plotly_white")
     for i, zone in enumerate(zones):
+        color = group_colors[i % len(group_colors)]
         means = [
             df[df["microphone_position"].isin(zone)][freq].mean() for freq in bands
         ]
@@ -256,9 +308,24 @@ def plot_lines_with_distance(
                 y=means,
                 mode="lines",
                 # marker=dict(color="#000"),
-                line=dict(width=1.5),
+                line=dict(width=1.5, color=color),
             )
         )
+        if lower is not None and upper is not None:
+            add_error_band(
+                fig,
+                "Average per-recording interval, zone {}".format(i + 1),
+                bands,
+                [
+                    lower[lower["microphone_position"].isin(zone)][freq].mean()
+                    for freq in bands
+                ],
+                [
+                    upper[upper["microphone_position"].isin(zone)][freq].mean()
+                    for freq in bands
+                ],
+                color,
+            )
 
     # Add top and bottom rails, and fill the area inbetween
     fig.add_trace(
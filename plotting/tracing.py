@@ -0,0 +1,272 @@
+"""Per-stage timing of the analysis pipeline, exportable as a Chrome trace.
+
+Tracing is off by default, and then `span` hands out a shared do-nothing context and
+`traced` functions call straight through, so the instrumentation costs a flag check.
+Once `enable` is called, every span records its wall and CPU time, the process and
+thread it ran in, and whatever counters the code attaches to it ("file", "samples",
+"audio_seconds", "bytes_read"...). With `memory=True`, spans also record the peak
+memory of the process while they ran, from tracemalloc (which sees numpy buffers) and
+from sampling the resident set size on a background thread.
+"""
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+import json
+import os
+from pathlib import Path
+import threading
+from time import perf_counter_ns, sleep, thread_time_ns
+import tracemalloc
+from typing import Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_enabled = False
+_events: List[dict] = []
+_disabled_span = nullcontext({})
+
+_memory = False
+# Memory peaks of the spans open in any thread: [traced at start, traced peak, RSS peak]
+_open_peaks: Dict[int, List[int]] = {}
+_peaks_lock = threading.Lock()
+_rss_sampler: Optional[threading.Thread] = None
+rss_sampling_seconds = 0.005
+
+
+def enable(enabled: bool = True, memory: bool = False):
+    """Switch tracing on or off for this process.
+
+    Args:
+        enabled (bool): whether spans are recorded.
+        memory (bool): whether spans also record peak memory, which starts tracemalloc
+            and the RSS sampling thread.
+    """
+    global _enabled, _memory, _rss_sampler
+    _enabled = enabled
+    _memory = enabled and memory
+    if not _memory:
+        return
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if _rss_sampler is None and rss_bytes() is not None:
+        _rss_sampler = threading.Thread(target=_sample_rss, daemon=True)
+        _rss_sampler.start()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def is_tracing_memory() -> bool:
+    return _memory
+
+
+def rss_bytes() -> Optional[int]:
+    """The resident set size of this process, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_bytes(children: bool = False) -> Optional[int]:
+    """The peak resident set size of this process, or of its largest waited-for child.
+
+    Args:
+        children (bool): report the largest child process instead, e.g. of the
+            workers of a pool that was closed.
+
+    Returns:
+        int | None: the peak in bytes, or None where `resource` is unavailable.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(
+        resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    )
+    # Linux reports kilobytes, macOS bytes
+    return usage.ru_maxrss * (1 if os.uname().sysname == "Darwin" else 1024)
+
+
+def _sample_rss():
+    while True:
+        rss = rss_bytes()
+        with _peaks_lock:
+            for peaks in _open_peaks.values():
+                peaks[2] = max(peaks[2], rss)
+        sleep(rss_sampling_seconds)
+
+
+def _fold_traced_peak():
+    # The traced peak since the last reset happened while the same spans were open
+    _, traced_peak = tracemalloc.get_traced_memory()
+    for peaks in _open_peaks.values():
+        peaks[1] = max(peaks[1], traced_peak)
+    tracemalloc.reset_peak()
+
+
+def collect_events() -> List[dict]:
+    """Take the events recorded so far in this process, leaving none behind."""
+    events = _events[:]
+    del _events[: len(events)]
+    return events
+
+
+@contextmanager
+def _span(name: str, counters: dict):
+    peaks = None
+    if _memory:
+        with _peaks_lock:
+            _fold_traced_peak()
+            traced, _ = tracemalloc.get_traced_memory()
+            peaks = [traced, traced, rss_bytes() or 0]
+            _open_peaks[id(peaks)] = peaks
+    start = perf_counter_ns()
+    cpu_start = thread_time_ns()
+    try:
+        yield counters
+    finally:
+        counters["cpu_ms"] = (thread_time_ns() - cpu_start) / 1e6
+        if peaks is not None:
+            with _peaks_lock:
+                _fold_traced_peak()
+                peaks[2] = max(peaks[2], rss_bytes() or 0)
+                del _open_peaks[id(peaks)]
+            counters["peak_bytes"] = peaks[1] - peaks[0]
+            counters["peak_rss_bytes"] = peaks[2]
+        _events.append(
+            {
+                "name": name,
+                "ph": "X",
+                "ts": start / 1e3,
+                "dur": (perf_counter_ns() - start) / 1e3,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": counters,
+            }
+        )
+
+
+def span(name: str, **counters):
+    """Time a block of code as one stage.
+
+    Counters known only inside the block can be added to the dict the context
+    returns, e.g. `with span("read") as counters: counters["bytes_read"] = ...`.
+
+    Args:
+        name (str): the stage.
+        **counters: values to attach to the span.
+
+    Returns:
+        A context manager yielding the counters of the span.
+    """
+    if not _enabled:
+        return _disabled_span
+    return _span(name, counters)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorate a function so each call is a span named after it."""
+
+    def decorator(function: Callable) -> Callable:
+        span_name = name or function.__name__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _span(span_name, {}):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def record_events(events: Iterable[dict]):
+    """Add events recorded elsewhere, e.g. in worker processes, to this process."""
+    _events.extend(events)
+
+
+def write_chrome_trace(path: Path, events: Iterable[dict]):
+    """Write events in the Trace Event Format of chrome://tracing and Perfetto."""
+    with open(path, "w") as trace_file:
+        json.dump({"traceEvents": list(events), "displayTimeUnit": "ms"}, trace_file)
+
+
+def summarize(
+    events: Iterable[dict],
+    wall_seconds: float,
+    by: str = "stage",
+    stages: Optional[Iterable[str]] = None,
+) -> pd.DataFrame:
+    """Sum the events of a run per stage or per file, with their throughput.
+
+    Args:
+        events (Iterable[dict]): the recorded spans, from any number of processes.
+        wall_seconds (float): how long the whole run took.
+        by (str): "stage" to group spans by name, "file" to group the spans that
+            carry a "file" counter by it.
+        stages (Iterable[str], optional): only count the spans of these stages, e.g.
+            the outermost ones per file so nested spans are not counted twice.
+
+    Returns:
+        pd.DataFrame: per group, how many spans and files it has, their total wall
+            and CPU seconds, the bytes and samples they counted, and files and audio
+            seconds per wall second of the run. Spans nest and overlap across threads
+            and processes, so wall times may add up to more than `wall_seconds`. When
+            memory was traced, "peak_mb" is the most memory tracemalloc saw allocated
+            during one span beyond what was allocated when it started, and
+            "peak_rss_mb" the largest resident set size of its process during one.
+    """
+    if by not in ("stage", "file"):
+        raise ValueError("Expected by to be 'stage' or 'file', not {}".format(by))
+    if stages is not None:
+        stages = set(stages)
+    groups: Dict[str, dict] = {}
+    for event in events:
+        if stages is not None and event["name"] not in stages:
+            continue
+        args = event["args"]
+        key = event["name"] if by == "stage" else args.get("file")
+        if key is None:
+            continue
+        group = groups.setdefault(
+            key,
+            {
+                "calls": 0,
+                "files": set(),
+                "wall_s": 0.0,
+                "cpu_s": 0.0,
+                "bytes_read": 0,
+                "samples": 0,
+                "audio_s": 0.0,
+            },
+        )
+        group["calls"] += 1
+        if "file" in args:
+            group["files"].add(args["file"])
+        group["wall_s"] += event["dur"] / 1e6
+        group["cpu_s"] += args.get("cpu_ms", 0.0) / 1e3
+        group["bytes_read"] += args.get("bytes_read", 0)
+        group["samples"] += args.get("samples", 0)
+        group["audio_s"] += args.get("audio_seconds", 0.0)
+        if "peak_bytes" in args:
+            group["peak_mb"] = max(
+                group.get("peak_mb", 0.0), args["peak_bytes"] / 2**20
+            )
+            group["peak_rss_mb"] = max(
+                group.get("peak_rss_mb", 0.0), args["peak_rss_bytes"] / 2**20
+            )
+    summary = pd.DataFrame.from_dict(groups, orient="index")
+    if summary.empty:
+        return summary
+    summary["files"] = summary["files"].map(len)
+    summary["files_per_s"] = summary["files"] / wall_seconds
+    summary["audio_s_per_s"] = summary["audio_s"] / wall_seconds
+    return summary.sort_values("wall_s", ascending=False)
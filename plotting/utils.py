@@ -1,17 +1,79 @@
 """Audio IO and Ambisonics formatting utilities"""
 
-from functools import singledispatch
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, singledispatch
+from math import factorial
 from pathlib import Path
+from time import perf_counter
 from traceback import print_exc
-from typing import Dict, List, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 import numpy as np
+from scipy.fft import irfft, next_fast_len, rfft
+from scipy.special import lpmv
 import soundfile as sf
 
+from plotting.tracing import span, traced
+
+# Bytes per sample of the soundfile subtypes our recordings come in
+subtype_sample_bytes = {
+    "PCM_S8": 1,
+    "PCM_U8": 1,
+    "PCM_16": 2,
+    "PCM_24": 3,
+    "PCM_32": 4,
+    "FLOAT": 4,
+    "DOUBLE": 8,
+}
+
+# Order of the A-format capsules expected by `aformat_to_bformat_matrix`
+aformat_capsule_names = (
+    "front_left_up",
+    "front_right_down",
+    "back_left_down",
+    "back_right_up",
+)
+
+
+def encoded_bytes(sound_file: sf.SoundFile, frames: int) -> int:
+    """Estimate how many bytes of a file decoding `frames` frames reads.
+
+    Parameters
+    ----------
+    sound_file : sf.SoundFile
+        The open file
+    frames : int
+        How many frames were decoded
+
+    Returns
+    -------
+    int
+        The encoded size of the frames, 0 for compressed subtypes
+    """
+    return (
+        frames * sound_file.channels * subtype_sample_bytes.get(sound_file.subtype, 0)
+    )
+
 
 def read_signals_dict(signals_dict: dict) -> dict:
     """Read the signals contained in signals_dict and overwrites the paths with the arrays.
 
+    When every channel comes in its own file, the channels are decoded straight into
+    the rows of a single buffer, kept under "stacked_signals", and each channel key
+    gets a view of its row.
+
     Parameters
     ----------
     signals_dict : dict
@@ -22,30 +84,29 @@ def read_signals_dict(signals_dict: dict) -> dict:
     dict
         Same signals_dict dictionary with the signals array overwritting signals path.
     """
+    stacked_keys = []
+    if signals_dict["channels_per_file"] == 1:
+        if signals_dict["input_mode"] == "bformat":
+            stacked_keys = ["w_channel", "x_channel", "y_channel", "z_channel"]
+        else:
+            stacked_keys = list(aformat_capsule_names)
+
     for key_i, path_i in signals_dict.items():
+        if key_i in stacked_keys or not isinstance(path_i, (str, Path)):
+            continue
         try:  # a puro huevo
             signal_i, sample_rate = sf.read(path_i)
             signals_dict[key_i] = signal_i.T
         except:
             pass
-    signals_dict["sample_rate"] = sample_rate
 
-    if signals_dict["channels_per_file"] == 1:
-        if signals_dict["input_mode"] == "bformat":
-            bformat_keys = ["w_channel", "x_channel", "y_channel", "z_channel"]
-            signals_dict["stacked_signals"] = stack_dict_arrays(
-                signals_dict, bformat_keys
-            )
-        else:
-            aformat_keys = [
-                "front_left_up",
-                "front_right_down",
-                "back_right_up",
-                "back_left_down",
-            ]
-            signals_dict["stacked_signals"] = stack_dict_arrays(
-                signals_dict, aformat_keys
-            )
+    if stacked_keys:
+        stacked_signals, sample_rate = read_aformat_into(
+            [signals_dict[key] for key in stacked_keys]
+        )
+        signals_dict.update(zip(stacked_keys, stacked_signals))
+        signals_dict["stacked_signals"] = stacked_signals
+    signals_dict["sample_rate"] = sample_rate
 
     return signals_dict
 
@@ -66,11 +127,222 @@ def stack_dict_arrays(signals_dict_array: dict, keys: List[str]) -> np.ndarray:
     np.ndarray
         Stacked arrays into single numpy.ndarray object
     """
-    audio_array = []
-    for key_i in keys:
-        audio_array.append(signals_dict_array[key_i])
+    return np.stack([signals_dict_array[key_i] for key_i in keys])
+
+
+def read_aformat_into(
+    audio_paths: List[Union[str, Path]],
+    out: Optional[np.ndarray] = None,
+    dtype: type = np.float64,
+    max_seconds: Optional[float] = None,
+) -> Tuple[np.ndarray, float]:
+    """Decode one mono file per channel straight into the rows of a single buffer.
+
+    Sample rates and lengths are checked from the file headers before anything is
+    decoded, and every file is decoded in place into its row, so no intermediate copy
+    is made. Passing the buffer of a previous call reuses it for the next group of
+    files as long as it is long enough.
+
+    Parameters
+    ----------
+    audio_paths : List[str | Path]
+        One mono file per channel, in the order the rows should have
+    out : np.ndarray, optional
+        A C-contiguous buffer of shape (channels, m) to decode into, with m at least
+        the length of the files. A new one is allocated when omitted
+    dtype : type
+        Data type of the allocated buffer, np.float64 or np.float32
+    max_seconds : float, optional
+        Decode at most this much of the start of every file. Decodes them whole when
+        omitted
+
+    Returns
+    -------
+    Tuple[np.ndarray, float]
+        A (channels, n) view of the buffer holding the signals, and their sample rate
+    """
+    sound_files = [sf.SoundFile(str(audio_path)) for audio_path in audio_paths]
+    try:
+        sample_rates = {sound_file.samplerate for sound_file in sound_files}
+        lengths = {sound_file.frames for sound_file in sound_files}
+        assert len(sample_rates) == 1, "Multiple different sample rates were found"
+        assert len(lengths) == 1, "Multiple different signal lengths were found"
+        assert all(
+            sound_file.channels == 1 for sound_file in sound_files
+        ), "One mono file per channel is expected"
+        length = lengths.pop()
+        if max_seconds is not None:
+            length = min(length, round(max_seconds * next(iter(sample_rates))))
+
+        if out is None:
+            out = np.empty((len(sound_files), length), dtype=dtype)
+        assert out.shape[0] == len(sound_files) and out.shape[1] >= length, (
+            f"Buffer of shape {out.shape} cannot hold {len(sound_files)} signals "
+            f"of {length} samples"
+        )
+        signals = out[:, :length]
+        with span(
+            "read_aformat",
+            file=str(audio_paths[0]),
+            samples=signals.size,
+            audio_seconds=length / next(iter(sample_rates)),
+            bytes_read=sum(
+                encoded_bytes(sound_file, length) for sound_file in sound_files
+            ),
+        ):
+            for sound_file, row in zip(sound_files, signals):
+                sound_file.read(out=row)
+    finally:
+        for sound_file in sound_files:
+            sound_file.close()
+    return signals, sample_rates.pop()
+
+
+def read_from_onset(
+    audio_path: Union[str, Path],
+    find_onset: Callable[[np.ndarray, int], int],
+    seconds_after_onset: Optional[float] = None,
+    head_seconds: float = 1.0,
+    dtype: type = np.float64,
+) -> Tuple[np.ndarray, float, int]:
+    """Read a recording from its onset on, without decoding more than needed.
+
+    Only the first `head_seconds` are decoded to find the onset, which must therefore
+    fall inside them; then the file is sought to the onset and only
+    `seconds_after_onset` are decoded from there.
 
-    return audio_array
+    Parameters
+    ----------
+    audio_path : str | Path
+        Path of the recording
+    find_onset : Callable[[np.ndarray, int], int]
+        Receives the first channel of the head and the sample rate, and returns the
+        onset index, rounded to the nearest sample when it is fractional
+    seconds_after_onset : float, optional
+        How much to read from the onset on. Reads to the end when omitted
+    head_seconds : float
+        How much of the recording is decoded to search the onset
+    dtype : type
+        Data type of the decoded audio, np.float64 or np.float32
+
+    Returns
+    -------
+    Tuple[np.ndarray, float, int]
+        The audio from the onset on (channels as rows for multichannel recordings),
+        its sample rate and the onset index within the file
+    """
+    with sf.SoundFile(str(audio_path)) as sound_file:
+        sample_rate = sound_file.samplerate
+        with span("read_head", file=str(audio_path)) as counters:
+            head = sound_file.read(
+                round(head_seconds * sample_rate), dtype=dtype, always_2d=True
+            )
+            counters["bytes_read"] = encoded_bytes(sound_file, len(head))
+        onset = round(find_onset(head[:, 0], sample_rate))
+        sound_file.seek(onset)
+        with span("read_from_onset", file=str(audio_path)) as counters:
+            signal = sound_file.read(
+                -1
+                if seconds_after_onset is None
+                else round(seconds_after_onset * sample_rate),
+                dtype=dtype,
+            )
+            counters["samples"] = signal.size
+            counters["audio_seconds"] = len(signal) / sample_rate
+            counters["bytes_read"] = encoded_bytes(sound_file, len(signal))
+    return signal.T, sample_rate, onset
+
+
+def prefetch(
+    items: Iterable[Any],
+    read: Callable[[Any], Any],
+    depth: int = 2,
+    max_buffered_bytes: Optional[int] = None,
+    nbytes: Callable[[Any], int] = lambda decoded: decoded.nbytes,
+    stats: Optional[Dict[str, float]] = None,
+) -> Iterator[Tuple[Any, Any]]:
+    """Read items on background threads while the caller works on earlier ones.
+
+    Up to `depth` reads are kept in flight, in order, and a new one is only started
+    while the decoded items waiting to be consumed take less than `max_buffered_bytes`.
+    libsndfile runs without the GIL, so decoding overlaps with numpy work.
+
+    Parameters
+    ----------
+    items : Iterable[Any]
+        What to read, e.g. file paths
+    read : Callable[[Any], Any]
+        Decodes one item
+    depth : int
+        How many items may be read ahead of the one being consumed; 0 reads each item
+        only when it is needed
+    max_buffered_bytes : int, optional
+        Memory budget for decoded items waiting to be consumed. Unbounded when omitted
+    nbytes : Callable[[Any], int]
+        Measures a decoded item against `max_buffered_bytes`
+    stats : Dict[str, float], optional
+        Accumulates "read_seconds", the time spent decoding, and "stall_seconds", the
+        time the caller waited for a decoded item
+
+    Yields
+    ------
+    Tuple[Any, Any]
+        Each item and its decoded value, in the order of `items`
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault("read_seconds", 0.0)
+    stats.setdefault("stall_seconds", 0.0)
+
+    def timed_read(item):
+        start = perf_counter()
+        decoded = read(item)
+        return decoded, perf_counter() - start
+
+    if depth <= 0:
+        for item in items:
+            decoded, read_seconds = timed_read(item)
+            stats["read_seconds"] += read_seconds
+            stats["stall_seconds"] += read_seconds
+            yield item, decoded
+            # Let the caller free each item before the next one is decoded
+            del decoded
+        return
+
+    items = iter(items)
+    in_flight = deque()
+
+    def buffered_bytes() -> int:
+        return sum(
+            nbytes(future.result()[0]) for _, future in in_flight if future.done()
+        )
+
+    with ThreadPoolExecutor(depth) as executor:
+
+        def fill():
+            while len(in_flight) < depth:
+                if (
+                    in_flight
+                    and max_buffered_bytes is not None
+                    and buffered_bytes() >= max_buffered_bytes
+                ):
+                    return
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                in_flight.append((item, executor.submit(timed_read, item)))
+
+        fill()
+        while in_flight:
+            item, future = in_flight.popleft()
+            start = perf_counter()
+            decoded, read_seconds = future.result()
+            stats["stall_seconds"] += perf_counter() - start
+            stats["read_seconds"] += read_seconds
+            fill()
+            yield item, decoded
+            del decoded, future
 
 
 @singledispatch
@@ -86,7 +358,7 @@ def read_aformat(audio_path: Union[str, Path]) -> Tuple[np.ndarray, float]:
     Returns
     -------
     Tuple[np.ndarray, float]
-        Sample rate of the audios and audios loaded as rows of a np.ndarray
+        Audios loaded as rows of a np.ndarray and their sample rate
     """
     signal, sample_rate = sf.read(audio_path)
     signal = signal.T
@@ -98,85 +370,88 @@ def read_aformat(audio_path: Union[str, Path]) -> Tuple[np.ndarray, float]:
 
 
 @read_aformat.register(list)
-def _(audio_paths: List[str]) -> Tuple[np.ndarray, float]:
+def _(
+    audio_paths: List[str],
+    out: Optional[np.ndarray] = None,
+    dtype: type = np.float64,
+    max_seconds: Optional[float] = None,
+) -> Tuple[np.ndarray, float]:
     """Read an A-format Ambisonics signal from audio paths. 4 paths are expected,
     one for each cardioid signal, in the following order:
         1. front left up
         2. front right down
-        3. back right up
-        4. back left down
+        3. back left down
+        4. back right up
 
     Parameters
     ----------
     audio_paths : List[str]
         Strings containing the audio paths to be loaded
+    out : np.ndarray, optional
+        Buffer to decode into, see `read_aformat_into`
+    dtype : type
+        Data type of the buffer when one is allocated
+    max_seconds : float, optional
+        Decode at most this much of every file, see `read_aformat_into`
 
     Returns
     -------
     Tuple[np.ndarray, float]
-        Sample rate of the audios and audios loaded as rows of a np.ndarray
+        Audios loaded as rows of a np.ndarray and their sample rate
     """
     assert (isinstance(audio_paths, (str, Path, list))) or (
         len(audio_paths) in (1, 4)
     ), "One wave file with 4 channels or a list of 4 wave files is expected"
 
-    audio_array = []
-    for audio_i in audio_paths:
-        try:
-            audio_array_i, sample_rate = sf.read(audio_i)
-            audio_array.append(audio_array_i)
-        except sf.SoundFileError:
-            print_exc()
-
-    return np.array(audio_array), sample_rate
+    try:
+        return read_aformat_into(
+            audio_paths, out=out, dtype=dtype, max_seconds=max_seconds
+        )
+    except sf.SoundFileError:
+        print_exc()
+        raise
 
 
 @read_aformat.register(dict)
-def _(audio_paths: Dict[str, str]) -> Tuple[np.ndarray, float]:
+def _(
+    audio_paths: Dict[str, str],
+    out: Optional[np.ndarray] = None,
+    dtype: type = np.float64,
+    max_seconds: Optional[float] = None,
+) -> Tuple[np.ndarray, float]:
     """Read an A-format Ambisonics signal from a dictionary with audio paths. 4 keys are expected,
-    one for each cardioid signal:
+    one for each cardioid signal, which are read in the order of `aformat_capsule_names`:
         1. front_left_up
         2. front_right_down
-        3. back_right_up
-        4. back_left_down
+        3. back_left_down
+        4. back_right_up
 
     Parameters
     ----------
     audio_paths : Dict[str]
-        Key-value pair containing the audio paths to be loaded for each FLU/FRD/BRU/BLD channel
+        Key-value pair containing the audio paths to be loaded for each FLU/FRD/BLD/BRU channel
+    out : np.ndarray, optional
+        Buffer to decode into, see `read_aformat_into`
+    dtype : type
+        Data type of the buffer when one is allocated
+    max_seconds : float, optional
+        Decode at most this much of every file, see `read_aformat_into`
 
     Returns
     -------
     Tuple[np.ndarray, float]
-        Sample rate of the audios and audios loaded as rows of a np.ndarray
+        Audios loaded as rows of a np.ndarray and their sample rate
     """
-    ordered_aformat_channels = (
-        "front_left_up",
-        "front_right_down",
-        "back_right_up",
-        "back_left_down",
-    )  # Assert the ordering is standardized across the project
     try:
-        audio_data = {
-            cardioid_channel: dict(zip(("signal", "sample_rate"), sf.read(path)))
-            for cardioid_channel, path in audio_paths.items()
-        }
-
-        # refactor from here
-        audio_signals = [
-            audio_data[channel_name]["signal"]
-            for channel_name in ordered_aformat_channels
-        ]
-        sample_rates = [
-            audio_data[channel_name]["sample_rate"]
-            for channel_name in ordered_aformat_channels
-        ]
-        assert len(set(sample_rates)) == 1, "Multiple different sample rates were found"
-
-        signals_array = np.array(audio_signals)
-        return signals_array, sample_rates[0]
+        return read_aformat_into(
+            [audio_paths[channel_name] for channel_name in aformat_capsule_names],
+            out=out,
+            dtype=dtype,
+            max_seconds=max_seconds,
+        )
     except sf.SoundFileError:
         print_exc()
+        raise
 
 
 @singledispatch
@@ -249,6 +524,73 @@ def _(aformat_channels: List[np.ndarray]) -> np.ndarray:
     )
 
 
+# Rows give W, X, Y, Z; columns are the FLU, FRD, BLD, BRU capsules
+aformat_to_bformat_matrix = np.array(
+    [
+        [1, 1, 1, 1],
+        [1, 1, -1, -1],
+        [1, -1, 1, -1],
+        [1, -1, -1, 1],
+    ]
+)
+
+
+@traced("convert_ambisonics_a_to_b")
+def convert_ambisonics_a_to_b_batch(
+    aformat_signals: np.ndarray,
+    out: Optional[np.ndarray] = None,
+    capsule_filters: Optional[np.ndarray] = None,
+    block_size: int = 65536,
+) -> np.ndarray:
+    """Converts Ambisonics A-format to B-format for one or many recordings at once
+
+    The conversion is a single 4x4 matrix product applied block by block, so `out`
+    may be `aformat_signals` itself to convert in place. The dtype of the input
+    (float32 or float64) is kept.
+
+    Parameters
+    ----------
+    aformat_signals : np.ndarray
+        A-format signals of shape (..., 4, n), e.g. (N, 4, n), with the capsules in
+        the following order:
+            1. Front Left Up
+            2. Front Right Down
+            3. Back Left Down
+            4. Back Right Up
+    out : np.ndarray, optional
+        Where to write the B-format signals, of the same shape as `aformat_signals`.
+        A new array is allocated when omitted
+    capsule_filters : np.ndarray, optional
+        Equalisation FIR filters of shape (4, k), one per B-format channel (W, X, Y,
+        Z). When given, the matrix and the filters are applied together in the
+        frequency domain, and the output keeps the first n samples
+    block_size : int
+        How many samples are converted at a time when no filters are given
+
+    Returns
+    -------
+    np.ndarray
+        B-format outputs (W, X, Y, Z) of shape (..., 4, n)
+    """
+    matrix = aformat_to_bformat_matrix.astype(aformat_signals.dtype)
+    if out is None:
+        out = np.empty_like(aformat_signals)
+    length = aformat_signals.shape[-1]
+
+    if capsule_filters is None:
+        for start in range(0, length, block_size):
+            block = slice(start, start + block_size)
+            out[..., block] = matrix @ aformat_signals[..., block]
+        return out
+
+    fft_length = next_fast_len(length + capsule_filters.shape[-1] - 1)
+    spectra = rfft(aformat_signals, fft_length, axis=-1)
+    spectra = np.einsum("ij,...jf->...if", matrix, spectra)
+    spectra *= rfft(capsule_filters.astype(aformat_signals.dtype), fft_length, axis=-1)
+    out[...] = irfft(spectra, fft_length, axis=-1)[..., :length]
+    return out
+
+
 def convert_polar_to_cartesian(
     radius: Union[float, np.ndarray],
     azimuth: Union[float, np.ndarray],
@@ -269,3 +611,191 @@ def convert_polar_to_cartesian(
         radius * np.sin(azimuth) * np.sin(elevation),
         radius * np.cos(elevation),
     )
+
+
+# (azimuth, elevation) of the FLU, FRD, BLD and BRU capsules of a SoundField
+# microphone, in radians, with the elevation measured from the zenith as in
+# `convert_polar_to_cartesian`
+soundfield_capsule_directions = (
+    (np.pi / 4, np.arccos(1 / np.sqrt(3))),
+    (-np.pi / 4, np.pi - np.arccos(1 / np.sqrt(3))),
+    (3 * np.pi / 4, np.pi - np.arccos(1 / np.sqrt(3))),
+    (-3 * np.pi / 4, np.arccos(1 / np.sqrt(3))),
+)
+
+
+def real_spherical_harmonics(
+    x: np.ndarray,
+    y: np.ndarray,
+    z: np.ndarray,
+    order: int,
+    normalisation: str = "sn3d",
+) -> np.ndarray:
+    """Evaluate the real spherical harmonics used by Ambisonics, in ACN order
+
+    Parameters
+    ----------
+    x, y, z : np.ndarray
+        Cartesian coordinates of P directions on the unit sphere
+    order : int
+        Highest Ambisonics order
+    normalisation : str
+        "sn3d" (Schmidt semi-normalised, as in AmbiX) or "n3d"
+
+    Returns
+    -------
+    np.ndarray
+        Spherical harmonics of shape (P, (order + 1) ** 2), without the
+        Condon-Shortley phase
+    """
+    if normalisation not in ("sn3d", "n3d"):
+        raise ValueError("Unknown Ambisonics normalisation {}".format(normalisation))
+    azimuth = np.arctan2(y, x)
+    harmonics = np.empty((np.size(z), (order + 1) ** 2))
+    for degree in range(order + 1):
+        for index in range(-degree, degree + 1):
+            m = abs(index)
+            legendre = (-1) ** m * lpmv(m, degree, np.clip(z, -1, 1))
+            norm = np.sqrt(
+                (1 if m == 0 else 2) * factorial(degree - m) / factorial(degree + m)
+            )
+            if normalisation == "n3d":
+                norm *= np.sqrt(2 * degree + 1)
+            harmonics[:, degree * (degree + 1) + index] = (
+                norm
+                * legendre
+                * (np.sin(m * azimuth) if index < 0 else np.cos(m * azimuth))
+            )
+    return harmonics
+
+
+@lru_cache(maxsize=None)
+def ambisonics_encoding_matrix(
+    capsule_directions: Tuple[Tuple[float, float], ...],
+    order: int,
+    normalisation: str = "sn3d",
+) -> np.ndarray:
+    """Compute the matrix that encodes a microphone array into Ambisonics, once per
+    array geometry
+
+    The matrix is the pseudo-inverse of the spherical harmonics sampled at the
+    capsule directions (mode matching), so there must be at least (order + 1) ** 2
+    capsules.
+
+    Parameters
+    ----------
+    capsule_directions : Tuple[Tuple[float, float], ...]
+        (azimuth, elevation) of each capsule in radians, as in
+        `convert_polar_to_cartesian`
+    order : int
+        Ambisonics order
+    normalisation : str
+        "sn3d" or "n3d"
+
+    Returns
+    -------
+    np.ndarray
+        Encoding matrix of shape ((order + 1) ** 2, capsules)
+    """
+    assert len(capsule_directions) >= (order + 1) ** 2, (
+        f"{len(capsule_directions)} capsules cannot encode order {order}, "
+        f"which needs at least {(order + 1) ** 2}"
+    )
+    azimuths, elevations = np.array(capsule_directions).T
+    harmonics = real_spherical_harmonics(
+        *convert_polar_to_cartesian(1.0, azimuths, elevations), order, normalisation
+    )
+    return np.linalg.pinv(harmonics)
+
+
+def encode_ambisonics(
+    capsule_signals: np.ndarray,
+    capsule_directions: Sequence[Tuple[float, float]],
+    order: int = 1,
+    normalisation: str = "sn3d",
+    block_size: int = 65536,
+) -> np.ndarray:
+    """Encode the capsules of a microphone array into ACN-ordered Ambisonics
+
+    Radial (rigid-sphere) equalisation is not applied.
+
+    The output is not scaled like `convert_ambisonics_a_to_b`: for the SoundField
+    tetrahedron at order 1 in SN3D, the first-order channels relative to W are
+    sqrt(3) times those of the legacy B-format, so Y holds 3 times the energy
+    relative to W and LF comes out 3 times larger (in N3D, the ratios match but W is 4
+    times smaller). Pass the output through `ambisonics_to_bformat` before computing
+    LF, so that values from both paths can be compared.
+
+    Parameters
+    ----------
+    capsule_signals : np.ndarray
+        Capsule signals of shape (..., capsules, n), e.g. (N, 32, n)
+    capsule_directions : Sequence[Tuple[float, float]]
+        (azimuth, elevation) of each capsule in radians, as in
+        `convert_polar_to_cartesian`
+    order : int
+        Ambisonics order
+    normalisation : str
+        "sn3d" or "n3d"
+    block_size : int
+        How many samples are encoded at a time
+
+    Returns
+    -------
+    np.ndarray
+        Ambisonics signals of shape (..., (order + 1) ** 2, n), in ACN order (W, Y, Z,
+        X, ...)
+    """
+    matrix = ambisonics_encoding_matrix(
+        tuple(map(tuple, capsule_directions)), order, normalisation
+    ).astype(capsule_signals.dtype)
+    out = np.empty(
+        capsule_signals.shape[:-2] + (matrix.shape[0], capsule_signals.shape[-1]),
+        dtype=capsule_signals.dtype,
+    )
+    for start in range(0, capsule_signals.shape[-1], block_size):
+        block = slice(start, start + block_size)
+        out[..., block] = matrix @ capsule_signals[..., block]
+    return out
+
+
+# Gains that bring W and the first-order channels of `encode_ambisonics` output for
+# the SoundField tetrahedron to the scale of `convert_ambisonics_a_to_b`
+legacy_bformat_gains = {
+    "sn3d": np.array([4, 4 / np.sqrt(3), 4 / np.sqrt(3), 4 / np.sqrt(3)]),
+    "n3d": np.array([4, 4, 4, 4]),
+}
+
+
+def ambisonics_to_bformat(
+    ambisonics: np.ndarray, normalisation: str = "sn3d"
+) -> np.ndarray:
+    """Convert ACN-ordered Ambisonics to the B-format of `convert_ambisonics_a_to_b`
+
+    The first-order channels are reordered to (W, X, Y, Z) and scaled like the legacy
+    conversion of the SoundField A-format, and the higher orders are dropped. LF
+    computed on the output is comparable with that of the legacy B-format.
+
+    Parameters
+    ----------
+    ambisonics : np.ndarray
+        Ambisonics signals of shape (..., (order + 1) ** 2, n), in ACN order, as
+        returned by `encode_ambisonics`
+    normalisation : str
+        "sn3d" or "n3d", as passed to `encode_ambisonics`
+
+    Returns
+    -------
+    np.ndarray
+        B-format outputs (W, X, Y, Z) of shape (..., 4, n)
+    """
+    if normalisation not in legacy_bformat_gains:
+        raise ValueError("Unknown Ambisonics normalisation {}".format(normalisation))
+    if ambisonics.shape[-2] < 4:
+        raise ValueError(
+            "B-format needs first-order Ambisonics, got {} channels".format(
+                ambisonics.shape[-2]
+            )
+        )
+    gains = legacy_bformat_gains[normalisation].astype(ambisonics.dtype)
+    return ambisonics[..., [0, 3, 1, 2], :] * gains[:, None]
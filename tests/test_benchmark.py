@@ -0,0 +1,29 @@
+import pytest
+
+from plotting.benchmark import find_regressions
+
+
+def timings(**min_seconds):
+    return {
+        name: {"min_seconds": seconds, "median_seconds": seconds, "repetitions": 3}
+        for name, seconds in min_seconds.items()
+    }
+
+
+def test_find_regressions_against_a_baseline():
+    baseline = timings(steady=1.0, slower=1.0, faster=1.0, tiny=1e-4)
+    results = timings(steady=1.2, slower=1.5, faster=0.5, tiny=5e-4, new=9.0)
+
+    regressions = find_regressions(results, baseline)
+
+    assert regressions == {"slower": pytest.approx(1.5)}
+
+
+def test_threshold_sets_how_much_slower_a_case_may_get():
+    baseline = timings(case=1.0)
+    results = timings(case=1.2)
+
+    assert find_regressions(results, baseline, threshold=0.1) == {
+        "case": pytest.approx(1.2)
+    }
+    assert find_regressions(results, baseline, threshold=0.3) == {}
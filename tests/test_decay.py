@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from plotting.acoustical_parameters.decay import (
+    band_decay_parameters,
+    decay_parameters,
+    decay_parameters_sheet,
+)
+from plotting.benchmark import synthesize_rir
+
+# Largest difference between multirate and full-rate results, per parameter
+multirate_tolerances = {
+    "Ts": 1.0,
+    "EDT": 0.02,
+    "T20": 0.01,
+    "T30": 0.01,
+    "C50": 0.4,
+    "C80": 0.4,
+}
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_multirate_matches_full_rate(seed):
+    sample_rate = 48000
+    rirs = synthesize_rir(3, sample_rate, channels=4, seed=seed)
+
+    full_rate = band_decay_parameters(rirs, sample_rate, multirate=False)
+    multirate = band_decay_parameters(rirs, sample_rate)
+
+    for name, tolerance in multirate_tolerances.items():
+        np.testing.assert_allclose(
+            multirate[name], full_rate[name], rtol=0, atol=tolerance, err_msg=name
+        )
+
+
+def test_noise_floor_truncation_keeps_t30_unbiased():
+    sample_rate = 48000
+    rng = np.random.default_rng(0)
+    times = np.arange(3 * sample_rate) / sample_rate
+    decay = rng.standard_normal(times.size) * 10 ** (-3 * times / 1.2)
+    rir = decay + 3e-3 * rng.standard_normal(times.size)
+
+    truncated = decay_parameters(rir[None], sample_rate, [0])
+    integrated = decay_parameters(rir[None], sample_rate, [0], truncate_noise=False)
+
+    assert truncated["T30"][0] == pytest.approx(1.2, abs=0.04)
+    assert integrated["T30"][0] > 1.3
+
+
+def test_sheets_cover_every_integration_time(tmp_path):
+    sample_rate = 48000
+    directory = tmp_path / "medicion2"
+    directory.mkdir()
+    file_paths = []
+    for seed, (integration_time, duration) in enumerate(((350, 2.5), (10, 2))):
+        for position in ("01", "02"):
+            file_path = directory / "Earthworks 1-{}_Subj_{}ms.wav".format(
+                position, integration_time
+            )
+            rir = synthesize_rir(duration, sample_rate, seed=seed * 2 + int(position))
+            sf.write(file_path, rir[0], sample_rate, subtype="FLOAT")
+            file_paths.append(file_path)
+
+    bands = (500, 1000, 2000)
+    sheets = decay_parameters_sheet(file_paths, bands, fraction=1)
+
+    assert set(sheets) == {"Ts", "EDT", "T20", "T30", "C50", "C80"}
+    for sheet in sheets.values():
+        assert list(sheet["T de integ"]) == [10, 10, 350, 350]
+        assert list(sheet["Posición"]) == ["01", "02", "01", "02"]
+        assert set(sheet["Medición"]) == {"2"}
+    np.testing.assert_allclose(sheets["T30"][list(bands)], 1.5, atol=0.15)
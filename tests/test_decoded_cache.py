@@ -0,0 +1,25 @@
+import numpy as np
+
+from plotting.acoustical_parameters.catalog import soundfield_capsules
+from plotting.acoustical_parameters.decoded_cache import DecodedCache
+from plotting.benchmark import write_campaign
+from plotting.utils import convert_ambisonics_a_to_b_batch, read_aformat
+
+
+def test_decoded_bformat_matches_direct_conversion(tmp_path):
+    campaign = write_campaign(tmp_path / "campaign", 1.5, 48000)
+    capsule_paths = [
+        campaign / "medicion1" / "Soundfield {}-01.wav".format(capsule)
+        for capsule in soundfield_capsules
+    ]
+    aformat_signals, sample_rate = read_aformat(capsule_paths)
+    direct = convert_ambisonics_a_to_b_batch(aformat_signals)
+
+    cache = DecodedCache(tmp_path / "decoded")
+    stored, stored_sample_rate = cache.bformat(capsule_paths)
+    loaded, _ = DecodedCache(tmp_path / "decoded").bformat(capsule_paths)
+
+    assert stored_sample_rate == sample_rate
+    assert isinstance(loaded, np.memmap)
+    np.testing.assert_array_equal(loaded, stored)
+    np.testing.assert_allclose(loaded, direct, rtol=0, atol=1e-6)
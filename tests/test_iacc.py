@@ -0,0 +1,19 @@
+import numpy as np
+
+from plotting.acoustical_parameters.iacc import interaural_cross_correlation
+
+
+def test_fft_iacf_matches_direct_correlation():
+    rng = np.random.default_rng(0)
+    left, right = rng.standard_normal((2, 3, 500))
+    max_lag = 48
+
+    iacf = interaural_cross_correlation(left, right, max_lag)
+
+    for i in range(left.shape[0]):
+        full = np.correlate(right[i], left[i], mode="full")
+        centre = left.shape[-1] - 1
+        direct = full[centre - max_lag : centre + max_lag + 1] / np.sqrt(
+            np.sum(left[i] ** 2) * np.sum(right[i] ** 2)
+        )
+        np.testing.assert_allclose(iacf[i], direct, atol=1e-12)
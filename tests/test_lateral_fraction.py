@@ -0,0 +1,53 @@
+import numpy as np
+
+from plotting.acoustical_parameters import (
+    direct_reverberant_ratio,
+    lateral_fraction_and_dr_batch,
+    lateral_fraction_early,
+    lateral_fraction_late,
+    sweep_lf_and_dr,
+)
+from plotting.benchmark import synthesize_aformat_rir
+from plotting.utils import convert_ambisonics_a_to_b_batch
+
+sample_rate = 48000
+
+
+def bformat_rirs(count: int = 3) -> np.ndarray:
+    return convert_ambisonics_a_to_b_batch(
+        np.stack(
+            [
+                synthesize_aformat_rir(
+                    2.5, sample_rate, delay_ms=5 + 3 * seed, seed=seed
+                )
+                for seed in range(count)
+            ]
+        )
+    )
+
+
+def test_batch_matches_scalar_functions():
+    rirs = bformat_rirs()
+
+    batch = lateral_fraction_and_dr_batch(rirs, sample_rate)
+
+    for i, rir in enumerate(rirs):
+        np.testing.assert_allclose(
+            batch["lf_early"][i], lateral_fraction_early(rir, sample_rate)
+        )
+        np.testing.assert_allclose(
+            batch["lf_late"][i], lateral_fraction_late(rir, sample_rate)
+        )
+        np.testing.assert_allclose(
+            batch["dr_ratio"][i], direct_reverberant_ratio(rir[0], sample_rate)
+        )
+
+
+def test_sweep_at_default_windows_matches_batch():
+    rirs = bformat_rirs(2)
+
+    sweep = sweep_lf_and_dr(rirs, sample_rate, {})
+    batch = lateral_fraction_and_dr_batch(rirs, sample_rate)
+
+    for name, values in batch.items():
+        np.testing.assert_allclose(sweep[name].reshape(values.shape), values)
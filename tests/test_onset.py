@@ -0,0 +1,37 @@
+import numpy as np
+
+from plotting.acoustical_parameters import (
+    RIRAnalysis,
+    detect_onset_iso3382,
+    get_direct_sound_arrival,
+    lateral_fraction_and_dr_batch,
+)
+from plotting.benchmark import synthesize_aformat_rir, synthesize_rir
+from plotting.utils import convert_ambisonics_a_to_b_batch
+
+
+def test_onset_search_falls_back_when_the_direct_sound_is_late():
+    sample_rate = 48000
+    rir = synthesize_rir(3, sample_rate)[0]
+    # A second of the noise floor before the RIR puts its direct sound past the head
+    noise = rir[:480].std() * np.random.default_rng(0).standard_normal(sample_rate)
+    delayed = np.concatenate([noise, rir])
+
+    assert detect_onset_iso3382(rir, sample_rate) == 480 - 48
+    assert detect_onset_iso3382(delayed, sample_rate) == sample_rate + 480 - 48
+
+
+def test_subsample_onsets_are_rounded_where_used():
+    sample_rate = 48000
+    bformat_rirs = convert_ambisonics_a_to_b_batch(
+        synthesize_aformat_rir(1, sample_rate)
+    )[None]
+    onset = get_direct_sound_arrival(bformat_rirs[0, 0], sample_rate, subsample=True)
+    assert isinstance(onset, float)
+
+    analysis = RIRAnalysis(bformat_rirs[0], sample_rate, direct_sound_arrival=onset)
+    assert analysis.direct_sound_arrival == round(onset)
+    subsample = lateral_fraction_and_dr_batch(bformat_rirs, sample_rate, [onset])
+    rounded = lateral_fraction_and_dr_batch(bformat_rirs, sample_rate, [round(onset)])
+    for name, values in rounded.items():
+        np.testing.assert_array_equal(subsample[name], values)
@@ -0,0 +1,31 @@
+import pytest
+
+from plotting.acoustical_parameters import run
+from plotting.benchmark import write_campaign
+
+
+def test_pool_checkpoints_every_recording_before_its_chunk_ends(tmp_path, monkeypatch):
+    campaign = write_campaign(tmp_path / "campaign", 1, 48000, positions=3)
+    recordings = [
+        recording for _, recording, _ in run.collect_recordings(campaign, None)
+    ]
+    failing = recordings[-1]
+    extract = run.extract_acoustical_parameters
+
+    def extract_or_fail(recording, *arguments):
+        if recording == failing:
+            raise RuntimeError("worker died")
+        return extract(recording, *arguments)
+
+    # Pool workers are forked and inherit the patch
+    monkeypatch.setattr(run, "extract_acoustical_parameters", extract_or_fail)
+    cache = run.ResultCache(tmp_path / "cache.jsonl")
+    with pytest.raises(RuntimeError):
+        run.extract_all_acoustical_parameters(
+            recordings, processes=2, chunksize=len(recordings), cache=cache
+        )
+
+    reloaded = run.ResultCache(tmp_path / "cache.jsonl")
+    cached = [reloaded.get(reloaded.key(recording)) for recording in recordings]
+    assert all(result is not None for result in cached[:-1])
+    assert cached[-1] is None
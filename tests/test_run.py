@@ -0,0 +1,35 @@
+import sys
+
+import pytest
+
+from plotting.acoustical_parameters import run
+from plotting.benchmark import write_campaign
+
+
+@pytest.fixture(scope="module")
+def campaign(tmp_path_factory):
+    return write_campaign(tmp_path_factory.mktemp("campaign"), 1.5, 48000)
+
+
+def run_main(monkeypatch, *arguments):
+    monkeypatch.setattr(sys, "argv", ["run.py", *map(str, arguments)])
+    run.main()
+
+
+def results(campaign) -> bytes:
+    return (campaign / "results.tsv").read_bytes()
+
+
+def test_serial_pool_and_queue_runs_agree(campaign, tmp_path, monkeypatch):
+    run_main(monkeypatch, campaign, "--no-cache", "--processes", 1)
+    serial = results(campaign)
+    run_main(monkeypatch, campaign, "--no-cache", "--processes", 2)
+    pool = results(campaign)
+    queue = tmp_path / "queue"
+    run_main(monkeypatch, campaign, "--queue", queue, "--enqueue")
+    run_main(monkeypatch, "--queue", queue, "--work", "--processes", 2)
+    run_main(monkeypatch, campaign, "--queue", queue, "--merge")
+
+    assert serial.count(b"\n") == 1 + 2 * 2
+    assert pool == serial
+    assert results(campaign) == serial
@@ -0,0 +1,43 @@
+import numpy as np
+import soundfile as sf
+
+from plotting.acoustical_parameters import (
+    read_rir_from_onset,
+    stage_parameters,
+    stage_parameters_sheet,
+)
+from plotting.benchmark import synthesize_rir
+
+
+def test_sheet_covers_every_integration_time(tmp_path):
+    sample_rate = 48000
+    directory = tmp_path / "medicion3"
+    directory.mkdir()
+    file_paths = []
+    for seed, integration_time in enumerate((350, 10, 100)):
+        for position in ("01", "02"):
+            file_path = directory / "Earthworks 1-{}_Subj_{}ms.wav".format(
+                position, integration_time
+            )
+            rir = synthesize_rir(1.5, sample_rate, seed=seed * 2 + int(position))[0]
+            sf.write(file_path, rir, sample_rate, subtype="FLOAT")
+            file_paths.append(file_path)
+
+    bands = (500, 1000, 2000)
+    sheet = stage_parameters_sheet(file_paths, bands, fraction=1)
+
+    assert len(sheet) == 6 * 3
+    assert list(sheet["Integration time"].unique()) == [10, 100, 350]
+    assert set(sheet["Medición"]) == {"3"}
+    rows = sheet[sheet["Integration time"] == 100]
+    expected = stage_parameters(
+        [read_rir_from_onset(path, 1.0).rir[0] for path in file_paths[4:]],
+        sample_rate,
+        bands,
+        fraction=1,
+        direct_sound_arrivals=[0, 0],
+    )
+    for name, values in expected.items():
+        parameter_rows = rows[rows["Frq.band [Hz]"] == name]
+        assert list(parameter_rows["Posición"]) == ["01", "02"]
+        np.testing.assert_allclose(parameter_rows[list(bands)].to_numpy(), values)
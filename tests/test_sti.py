@@ -0,0 +1,36 @@
+import warnings
+
+import numpy as np
+import soundfile as sf
+
+from plotting.acoustical_parameters.sti import (
+    speech_transmission_index,
+    sti_for_directory,
+)
+from plotting.benchmark import synthesize_rir
+
+
+def test_sti_stays_finite_at_full_modulation():
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        perfect = speech_transmission_index(np.full((1, 7, 14), 1 + 1e-12))
+        silent = speech_transmission_index(np.zeros((1, 7, 14)))
+
+    np.testing.assert_allclose(perfect, 1)
+    np.testing.assert_allclose(silent, 0)
+
+
+def test_sti_is_measured_from_the_onset(tmp_path):
+    sample_rate = 48000
+    rir = synthesize_rir(1.5, sample_rate, reverberation_time=0.8)[0]
+    sf.write(tmp_path / "early.wav", rir, sample_rate, subtype="FLOAT")
+    late = np.concatenate((1e-4 * rir[: sample_rate // 2], rir))
+    sf.write(tmp_path / "late.wav", late, sample_rate, subtype="FLOAT")
+
+    results = sti_for_directory(tmp_path, processes=1).set_index("filename")
+
+    np.testing.assert_allclose(
+        results.loc["late.wav", ["sti_male", "sti_female"]].to_numpy(float),
+        results.loc["early.wav", ["sti_male", "sti_female"]].to_numpy(float),
+        atol=0.01,
+    )
@@ -0,0 +1,21 @@
+import numpy as np
+import soundfile as sf
+
+from plotting.acoustical_parameters import read_rir_from_onset
+from plotting.acoustical_parameters.uncertainty import file_noise_power, noise_power
+from plotting.benchmark import synthesize_rir
+
+
+def test_noise_floor_comes_from_the_file_tail(tmp_path):
+    sample_rate = 48000
+    rng = np.random.default_rng(0)
+    rir = synthesize_rir(6, sample_rate, reverberation_time=3.5)[0]
+    rir += 1e-3 * rng.standard_normal(rir.shape)
+    file_path = tmp_path / "Earthworks 1-01.wav"
+    sf.write(file_path, rir, sample_rate, subtype="FLOAT")
+
+    analysis = read_rir_from_onset(file_path, seconds_after_onset=2)
+    truncated = noise_power(analysis.channel_energy(0)[None, :])[0]
+
+    np.testing.assert_allclose(file_noise_power(file_path), 1e-6, rtol=0.05)
+    assert truncated > 2e-6
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from plotting.acoustical_parameters.catalog import soundfield_capsules
+from plotting.utils import (
+    aformat_capsule_names,
+    ambisonics_to_bformat,
+    convert_ambisonics_a_to_b_batch,
+    convert_polar_to_cartesian,
+    encode_ambisonics,
+    read_aformat,
+    soundfield_capsule_directions,
+)
+
+
+def test_capsule_order_matches_catalog():
+    assert aformat_capsule_names == tuple(soundfield_capsules.values())
+
+
+def test_read_aformat_dict_follows_capsule_order(tmp_path):
+    audio_paths = {}
+    for index, capsule in enumerate(soundfield_capsules.values()):
+        audio_paths[capsule] = str(tmp_path / f"{capsule}.wav")
+        sf.write(audio_paths[capsule], np.full(100, 0.1 * (index + 1)), 48000)
+
+    signals, sample_rate = read_aformat(dict(reversed(audio_paths.items())))
+
+    assert sample_rate == 48000
+    np.testing.assert_allclose(signals[:, 0], [0.1, 0.2, 0.3, 0.4], atol=1e-4)
+
+
+@pytest.mark.parametrize("normalisation", ["sn3d", "n3d"])
+def test_encoded_ambisonics_converts_to_legacy_bformat(normalisation):
+    rng = np.random.default_rng(0)
+    capsules = np.array(
+        [
+            convert_polar_to_cartesian(1.0, *direction)
+            for direction in soundfield_capsule_directions
+        ]
+    )
+    # Cardioid capsules picking up plane waves from random directions
+    directions = rng.standard_normal((3, 50))
+    directions /= np.linalg.norm(directions, axis=0)
+    aformat = 0.5 + 0.5 * capsules @ directions
+
+    encoded = encode_ambisonics(
+        aformat, soundfield_capsule_directions, normalisation=normalisation
+    )
+
+    np.testing.assert_allclose(
+        ambisonics_to_bformat(encoded, normalisation),
+        convert_ambisonics_a_to_b_batch(aformat),
+        atol=1e-12,
+    )
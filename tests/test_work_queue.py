@@ -0,0 +1,63 @@
+import json
+from multiprocessing import get_context
+import os
+import time
+
+from plotting.acoustical_parameters.work_queue import WorkQueue
+
+
+def _work(directory, node_id):
+    queue = WorkQueue(directory, lease_seconds=60, node_id=node_id)
+    processed = []
+    for unit_id, unit in queue.drain():
+        time.sleep(0.01)
+        queue.complete(unit_id, {"double": 2 * unit["value"]}, node_id)
+        processed.append(unit_id)
+    return processed
+
+
+def _enqueue(directory, count):
+    queue = WorkQueue(directory)
+    queue.enqueue(("{:06d}".format(index), {"value": index}) for index in range(count))
+    return queue
+
+
+def test_two_workers_share_a_queue(tmp_path):
+    queue = _enqueue(tmp_path, 40)
+    with get_context("spawn").Pool(2) as pool:
+        processed = pool.starmap(_work, [(tmp_path, "node-a"), (tmp_path, "node-b")])
+
+    assert all(processed)
+    assert sorted(processed[0] + processed[1]) == [
+        "{:06d}".format(index) for index in range(40)
+    ]
+    assert queue.is_done()
+    assert queue.results() == {
+        "{:06d}".format(index): {"double": 2 * index} for index in range(40)
+    }
+
+
+def test_claim_of_an_old_unit_is_not_expired(tmp_path):
+    queue = _enqueue(tmp_path, 1)
+    enqueued_long_ago = time.time() - 3600
+    os.utime(queue.pending / "000000.json", (enqueued_long_ago, enqueued_long_ago))
+
+    assert WorkQueue(tmp_path, lease_seconds=60, node_id="a").claim() is not None
+    assert WorkQueue(tmp_path, lease_seconds=60, node_id="b").requeue_expired() == 0
+
+
+def test_complete_leaves_the_claim_of_another_node(tmp_path):
+    _enqueue(tmp_path, 1)
+    slow = WorkQueue(tmp_path, lease_seconds=0, node_id="slow")
+    fast = WorkQueue(tmp_path, lease_seconds=0, node_id="fast")
+    slow.claim()
+    assert fast.requeue_expired() == 1
+    fast.claim()
+
+    assert not slow.complete("000000", {"done_by": "slow"}, "slow")
+    assert [path.name for path in fast.claimed.iterdir()] == ["000000@fast.json"]
+    assert fast.complete("000000", {"done_by": "fast"}, "fast")
+    assert fast.is_done()
+    assert json.loads((fast.results_directory / "slow.jsonl").read_text())[
+        "result"
+    ] == {"done_by": "slow"}